@@ -0,0 +1,59 @@
+import json
+import sys
+
+import click
+from frappe.commands import get_site, pass_context
+
+
+def _ints(value):
+    return tuple(int(one) for one in value.split(",") if one.strip())
+
+
+@click.command("dataq-benchmark")
+@click.option("--sizes", default="1,1000,100000,1000000", help="Comma separated row counts for gx_validate")
+@click.option("--rules", default="1,10,50", help="Comma separated rule counts for doctype_validate")
+@click.option("--engine", "engines", multiple=True, type=click.Choice(["native", "gx"]), help="Engines to run, both by default")
+@click.option("--import-rows", default=500, type=int, help="Rows per import run, 0 to skip the import benchmark")
+@click.option("--output", help="Write the JSON report to this file instead of stdout")
+@click.option("--baseline", help="Baseline to compare against, the one stored in the site folder by default")
+@click.option("--save-baseline", is_flag=True, default=False, help="Store this run as the new baseline")
+@click.option("--tolerance", default=0.2, type=float, help="Allowed slowdown of the median against the baseline")
+@pass_context
+def dataq_benchmark(context, sizes, rules, engines, import_rows, output, baseline, save_baseline, tolerance):
+    """Benchmark the validation and import hot paths, exit with 1 on a regression"""
+    import frappe
+
+    from dataq.data_quality_management import benchmark
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        report = benchmark.run_benchmarks(
+            sizes=_ints(sizes),
+            rule_counts=_ints(rules),
+            engines=engines or ("native", "gx"),
+            import_rows=import_rows,
+        )
+        previous = benchmark.load_baseline(baseline)
+        report["regressions"] = benchmark.compare(report, previous, tolerance) if previous else []
+
+        text = json.dumps(report, indent=1)
+        if output:
+            with open(output, "w") as f:
+                f.write(text)
+        else:
+            click.echo(text)
+
+        if save_baseline:
+            benchmark.save_baseline(report, baseline)
+    finally:
+        frappe.destroy()
+
+    if report["regressions"]:
+        for one in report["regressions"]:
+            click.secho(f"{one['benchmark']}: {one['ratio']}x the baseline", fg="red", err=True)
+        sys.exit(1)
+
+
+commands = [dataq_benchmark]
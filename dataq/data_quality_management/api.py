@@ -1,138 +1,403 @@
+from contextlib import contextmanager
+
 import frappe
 import pandas as pd
 from frappe import _
-from frappe.core.doctype.data_import.importer import get_df_for_column_header
-from ..util import (
-    snake_to_camel,
-    convert_str_to_standard,
-    is_label_return_field,
-    get_rules_cache,
+from frappe.model import table_fields
+from frappe.query_builder.functions import Sum
+from frappe.utils import cint
+
+from .coercion import coerce_frame, records_to_frame
+from .columns import rename_columns_to_fieldnames
+from .deferred import defer_validation
+from .engine import (
+    ValidationOutcome,
+    is_row_local,
+    iter_chunks,
+    merge_outcomes,
+    run_native,
 )
+from .gx_runtime import get_validation_definition, gx_outcome, run_gx
+from .membership import bind_member_sets
+from .parallel import validate_in_parallel
+from .plan import get_plan, has_rules
+from .pushdown import validate_table
+from .results import record_outcome
+from .sampling import SampledOutcome, sample_frame
+from .table_checks import is_table_scoped, probe_rules
+from .timing import get_timings, observe_rules, timed
 
 
 def doctype_validate(doctype, which_event):
-    if frappe.has_permission(doctype.doctype, which_event):
-        data = doctype.as_dict()
-        if doctype.doctype == "DocType":
-            return
-        gx_validate(doctype.doctype, data if isinstance(data, list) else [data], False)
-
-
-def gx_validate(doctype, collect, force=True):
+    # runs on every save of every doctype, so bail out before any permission check,
+    # serialization or GX import when the doctype has no enabled rules
+    if doctype.doctype == "DocType" or not has_rules(doctype.doctype):
+        return
+    with timed(doctype.doctype, "plan"):
+        rules = get_plan(doctype.doctype).rules_for_changes(doctype)
+    if not rules:
+        # none of the fields the rules read has changed
+        return
+    blocking = [rule for rule in rules if not rule.deferred]
+    if len(blocking) < len(rules):
+        defer_validation(doctype.doctype, doctype.name)
+    unresolved = (frappe.flags.dataq_prevalidated or {}).get(doctype.doctype)
+    if unresolved is not None:
+        # the frame only held the imported rows, see `validate_dataframe`, so uniqueness
+        # and aggregates are still probed against the stored ones, and the rules that
+        # failed the frame without naming rows are checked row by row
+        blocking = [
+            rule
+            for rule in blocking
+            if rule.name in unresolved or (is_table_scoped(rule) and not rule.source)
+        ]
+    if not blocking:
+        return
+    rules = blocking
+    with timed(doctype.doctype, "permission"):
+        permitted = frappe.has_permission(doctype.doctype, which_event)
+    if permitted:
+        with timed(doctype.doctype, "total"):
+            gx_validate(doctype.doctype, [doctype], False, rules=rules)
+
+
+def gx_validate(doctype, collect, force=True, workers=None, rules=None, sample=None):
     """
     Args:
         doctype: that needs to be checked
+        rules: subset of the compiled rules to evaluate, all of them by default
+        workers: with `force`, split frames of at least `dataq_parallel_min_rows` rows
+            (site config, default 50000) across this many processes. Defaults to the
+            `dataq_validation_workers` site config, 1 disables it
+        sample: with `force`, estimate the failure rates from a random sample and evaluate
+            in full only the rules whose estimate crosses their threshold, see `sampling.py`.
+            True, or a dict of `sample_frame` options: confidence, margin, stratify_by
     Returns:
         validate result
     """
-    from great_expectations import analytics
+    with timed(doctype, "plan"):
+        plan = get_plan(doctype)
 
-    analytics.config.ENV_CONFIG.gx_analytics_enabled = False
+    if not force and not plan:
+        return True, None
 
-    import great_expectations as gx
-    from great_expectations import expectations as gxe
-    import copy
+    with timed(doctype, "frame"):
+        if isinstance(collect, pd.DataFrame):
+            df = collect
+            if "doc" in df:
+                # data come from Drive
+                df = pd.DataFrame.from_records(df["doc"])
+            df = coerce_frame(doctype, df.copy(deep=False))
+        else:
+            # data from Drive carry the document under "doc"
+            records = [
+                record["doc"] if isinstance(record, dict) and "doc" in record else record
+                for record in collect
+            ]
+            # on save only the columns the rules read are taken, bulk callers get the whole frame back
+            reading = rules if rules and plan.engine == "native" else plan.rules
+            columns = None
+            if not force and all(rule.columns for rule in reading):
+                columns = list(dict.fromkeys(c for rule in reading for c in rule.columns))
+            df = records_to_frame(doctype, records, columns)
+
+    if not plan:
+        return True, df
 
-    # from collections import defaultdict
+    if rules is None:
+        rules = plan.rules
+    bind_member_sets(plan.rules)
+
+    probed = []
+    if not force and not isinstance(collect, pd.DataFrame):
+        # a one-row frame says nothing about uniqueness or membership, ask the tables instead
+        probed = [rule for rule in rules if is_table_scoped(rule)]
+        if probed:
+            rules = [rule for rule in rules if rule not in probed]
+
+    workers = cint(workers or frappe.conf.get("dataq_validation_workers", 1))
+    if force and sample:
+        with timed(doctype, "sample"):
+            options = sample if isinstance(sample, dict) else {}
+            outcome = validation_results = sample_frame(doctype, df, rules, **options)
+    elif force and workers > 1 and len(df) >= frappe.conf.get("dataq_parallel_min_rows", 50000):
+        with timed(doctype, "parallel"):
+            outcome = validation_results = validate_in_parallel(plan, df, workers, rules=rules)
+    elif not rules:
+        outcome = validation_results = ValidationOutcome([])
+    elif plan.engine == "native":
+        with timed(doctype, "native"):
+            outcome = validation_results = run_native(rules, df)
+    else:
+        outcome = validation_results = run_native([rule for rule in rules if rule.source], df)
+        if not all(rule.source for rule in rules):
+            with timed(doctype, "gx_context"):
+                # builds the suite of these rules on the first run of a plan version, cached afterwards
+                get_validation_definition(plan, rules)
+            with timed(doctype, "gx"):
+                validation_results = run_gx(plan, df, result_format="COMPLETE", rules=rules)
+            outcome = ValidationOutcome(gx_outcome(plan, validation_results).results + outcome.results)
+    if probed:
+        with timed(doctype, "probe"):
+            outcome = ValidationOutcome(outcome.results + probe_rules(doctype, probed, records).results)
+    observe_rules(doctype, outcome)
+
+    with timed(doctype, "record"):
+        if isinstance(collect, pd.DataFrame):
+            names = df["name"] if "name" in df else None
+        else:
+            names = [record.get("name") for record in records]
+        if isinstance(outcome, SampledOutcome):
+            sampled, full = outcome.split()
+            record_outcome(doctype, sampled, "Sample", names=names)
+            record_outcome(doctype, full, "Batch", names=names)
+        else:
+            record_outcome(doctype, outcome, "Batch" if force else "Save", names=names)
+
+    if not outcome.success:
+        throw_failures(outcome.failed_rules())
+    return validation_results, df
 
-    rules = get_rules_cache(doctype)
 
-    if not force and not rules:
-        return True, None
+def validate_dataframe(doctype, df, chunk_size=None, source=None, rules=None):
+    """
+    Validate a whole DataFrame against the rules of a doctype in one vectorized pass
 
-    df = copy.deepcopy(collect)
-    if not isinstance(df, pd.DataFrame):
-        convert_str_to_standard(df)
-        df = pd.DataFrame.from_records(df)
+    :param
+        doctype: which doctype the rows belong to
+        df: pd.DataFrame, headers may be labels or fieldnames
+        chunk_size: evaluate row-local rules in chunks of this many rows, whole frame by default
+        source: record the outcome in the results store under this source, e.g. "Import"
+        rules: subset of the compiled rules to evaluate, all of them by default
 
-    if "doc" in df:
-        # data come from Drive
-        df = pd.DataFrame.from_records(df["doc"])
+    :return
+        ValidationOutcome, `failures_by_row()` maps each failing row index to its Data Rules
+    """
+    plan = get_plan(doctype)
+    if not plan:
+        return ValidationOutcome([])
+
+    if rules is None:
+        rules = plan.rules
+    bind_member_sets(plan.rules)
+
+    frame = coerce_frame(doctype, rename_columns_to_fieldnames(doctype, df))
+
+    if plan.engine == "gx":
+        # a GX suite runs all its rules at once, so chunk only when none of them needs the whole column
+        if not all(map(is_row_local, rules)):
+            chunk_size = None
+        outcome = run_native([rule for rule in rules if rule.source], frame)
+        if not all(rule.source for rule in rules):
+            gx_results = merge_outcomes(
+                gx_outcome(plan, run_gx(plan, chunk, result_format="COMPLETE", rules=rules))
+                for chunk in iter_chunks(frame, chunk_size)
+            )
+            outcome = ValidationOutcome(gx_results.results + outcome.results)
+    else:
+        row_local = [rule for rule in rules if is_row_local(rule)]
+        whole_column = [rule for rule in rules if not is_row_local(rule)]
+        outcomes = [run_native(whole_column, frame)]
+        outcomes.extend(run_native(row_local, chunk) for chunk in iter_chunks(frame, chunk_size))
+        outcome = merge_outcomes(outcomes)
+
+    observe_rules(doctype, outcome)
+    if source:
+        record_outcome(doctype, outcome, source, names=frame["name"] if "name" in frame else None)
+    return outcome
+
+
+@contextmanager
+def prevalidated(doctype, outcome=None):
+    """
+    Skip the per-document `before_save` validation of a doctype whose rows were validated
+    as a frame against its blocking rules. Saved documents are still probed for the
+    table-scoped rules and queued for the deferred ones
 
-    if not rules:
-        return True, df
+    :param
+        outcome: ValidationOutcome of the frame, its rules that failed without naming the
+            failing rows, e.g. on a missing column, still run on every save
+    """
+    previous = frappe.flags.dataq_prevalidated
+    frappe.flags.dataq_prevalidated = {**(previous or {}), doctype: unresolved_rules(outcome)}
+    try:
+        yield
+    finally:
+        frappe.flags.dataq_prevalidated = previous
 
-    context = gx.get_context()
 
-    # Create an Expectation Suite
-    suite_name = "frappy_expectation_suite"
-    suite = gx.ExpectationSuite(name=suite_name)
-    # Add the Expectation Suite to the Data Context
-    suite = context.suites.add(suite)
+def unresolved_rules(outcome):
+    """Names of the rules of an outcome that failed without pointing at the failing rows"""
+    if outcome is None:
+        return set()
+    return {
+        one.rule.name
+        for one in outcome.results
+        if not one.success and (one.exception is not None or not one.unexpected_index)
+    }
 
-    data_source_name = "pandas"
-    data_source = context.data_sources.add_pandas(data_source_name)
 
-    data_asset_name = "df_data_asset"
-    data_asset = data_source.add_dataframe_asset(name=data_asset_name)
+def throw_failures(failed):
+    """
+    Throw the failed Data Rules as links
 
-    batch_definition_name = "df_batch_definition"
-    batch_definition = data_asset.add_batch_definition_whole_dataframe(
-        batch_definition_name
+    :param
+        failed: list of (data rule name or None, gx function name)
+    """
+    msg = []
+    for which_rule, gx_function in failed:
+        if which_rule:
+            msg.append(
+                f"<a href='/app/data-rules/{which_rule}' target='_blank'>{gx_function}</a>"
+            )
+        else:
+            msg.append(
+                f"<a href='/app/gx-function/{gx_function}' target='_blank'>{gx_function}</a>"
+            )
+
+    frappe.throw(
+        msg=msg, title=_("The following data rules did not pass"), as_list=True
     )
 
-    backup = copy.deepcopy(rules)
-    for which_gx, args in rules.items():
 
-        if "column" in args:
-            args["column"] = get_df_for_column_header(doctype, args["column"]).fieldname
+@frappe.whitelist()
+def get_child_table_data(
+    parent_doctype, parent_name, child_table_fieldname, fields=None, after_idx=None, start=0, page_length=None
+):
+    """
+    The rows of a child table, read straight from the child table
+
+    :param
+        fields: child fieldnames to return, every field by default
+        after_idx: keyset pagination, return the rows after this `idx`
+        start: offset pagination, ignored when `after_idx` is given
+        page_length: rows per page, at most 5000, 500 when paging with `after_idx` or `start`
+
+    :return
+        without any paging argument every row, as a list. Otherwise one page,
+        {"rows": [...], "next_idx": `after_idx` of the next page, None on the last page}
+    """
+    try:
+        meta = frappe.get_meta(parent_doctype)
+        table_field = meta.get_field(child_table_fieldname)
+        if not table_field or table_field.fieldtype not in table_fields:
+            frappe.throw(_("{0} is not a table of {1}").format(child_table_fieldname, parent_doctype))
+
+        # 检查父文档的权限, on the parent row alone: loading the document would load every child table
+        if not frappe.has_permission(parent_doctype, "read", get_parent_row(parent_doctype, parent_name)):
+            frappe.throw(_("No permission to read {0}").format(parent_doctype), frappe.PermissionError)
+
+        child_doctype = table_field.options
+        fields = frappe.parse_json(fields) if fields else None
+        if fields:
+            child_meta = frappe.get_meta(child_doctype)
+            fields = [
+                field for field in fields if field in ("name", "idx") or child_meta.has_field(field)
+            ]
+        fields = list(dict.fromkeys(["idx", *(fields or ["*"])]))
+
+        filters = {
+            "parent": parent_name,
+            "parenttype": parent_doctype,
+            "parentfield": child_table_fieldname,
+        }
+        if after_idx in (None, "") and not cint(start) and page_length in (None, ""):
+            # the unpaged response of callers written before pagination
+            return frappe.get_all(child_doctype, filters=filters, fields=fields, order_by="idx asc")
+
+        page_length = min(max(cint(page_length) or 500, 1), 5000)
+        if after_idx not in (None, ""):
+            filters["idx"] = (">", cint(after_idx))
+            start = 0
+
+        # 获取子表数据, one more row than asked tells whether there is a next page
+        rows = frappe.get_all(
+            child_doctype,
+            filters=filters,
+            fields=fields,
+            order_by="idx asc",
+            limit_start=cint(start),
+            limit_page_length=page_length + 1,
+        )
+        next_idx = None
+        if len(rows) > page_length:
+            rows = rows[:page_length]
+            next_idx = rows[-1].idx
+        return {"rows": rows, "next_idx": next_idx}
+    except frappe.PermissionError:
+        frappe.throw(("No permission to access this data"))
+    except frappe.ValidationError:
+        raise
+    except Exception as e:
+        frappe.log_error(f"Error in get_child_table_data: {str(e)}")
+
 
-        gx_function = getattr(gx.expectations, which_gx)
+def get_parent_row(doctype, name):
+    """The parent as a Document without its child tables, enough for permission checks"""
+    row = frappe.db.get_value(doctype, name, "*", as_dict=True)
+    if not row:
+        frappe.throw(_("{0} {1} not found").format(_(doctype), name), frappe.DoesNotExistError)
+    return frappe.get_doc({**row, "doctype": doctype})
 
-        args.pop("from")
-        expectation = gx_function(**args)
-        # Add the previously created Expectation to the Expectation Suite
-        suite.add_expectation(expectation)
 
-    definition_name = "my_validation_definition"
-    validation_definition = gx.ValidationDefinition(
-        data=batch_definition, suite=suite, name=definition_name
+@frappe.whitelist()
+def get_quality_metrics(doctype=None, from_date=None, to_date=None):
+    """Pass rate per doctype and rule from the daily rollups, for dashboards"""
+    frappe.has_permission("Data Quality Metric", "read", throw=True)
+    table = frappe.qb.DocType("Data Quality Metric")
+    query = (
+        frappe.qb.from_(table)
+        .select(
+            table.which_doctype,
+            table.data_rule,
+            Sum(table.evaluated).as_("evaluated"),
+            Sum(table.failed).as_("failed"),
+            Sum(table.failed_runs).as_("failed_runs"),
+        )
+        .groupby(table.which_doctype, table.data_rule)
     )
+    if doctype:
+        query = query.where(table.which_doctype == doctype)
+    if from_date:
+        query = query.where(table.date >= from_date)
+    if to_date:
+        query = query.where(table.date <= to_date)
 
-    # Add the Validation Definition to the Data Context
-    validation_definition = context.validation_definitions.add(validation_definition)
-
-    batch_parameters = {"dataframe": df}
-    validation_results = validation_definition.run(batch_parameters=batch_parameters)
-
-    if not validation_results.success:
-        msg = []
-        for one in validation_results.results:
-            if not one.success:
-                gx_function = snake_to_camel(one.expectation_config.type)
-
-                try:
-                    which_rule = backup[gx_function]["from"]
-                    msg.append(
-                        f"<a href='/app/data-rules/{which_rule}' target='_blank'>{gx_function}</a>"
-                    )
-                except:
-                    which_rule = gx_function
-                    msg.append(
-                        f"<a href='/app/gx-function/{gx_function}' target='_blank'>{gx_function}</a>"
-                    )
-
-        frappe.throw(
-            msg=msg, title=_("The following data rules did not pass"), as_list=True
-        )
-    return validation_results, df
+    metrics = query.run(as_dict=True)
+    for row in metrics:
+        row.pass_rate = 1 - row.failed / row.evaluated if row.evaluated else None
+    return metrics
 
 
 @frappe.whitelist()
-def get_child_table_data(parent_doctype, parent_name, child_table_fieldname):
-    try:
-        # 检查父文档的权限
-        if not frappe.has_permission(parent_doctype, "read", parent_name):
-            frappe.throw(("No permission to read {0}").format(parent_doctype))
+def get_validation_timings(doctype=None):
+    """
+    p50 / p95 / p99 in milliseconds and call counts of every validation stage and Data Rule
 
-        parent_doc = frappe.get_doc(parent_doctype, parent_name)
+    Collected while `dataq_timing` is set in site config, see `timing.py`.
+    """
+    frappe.only_for("System Manager")
+    return get_timings(doctype)
 
-        # 获取子表数据
-        child_data = parent_doc.get(child_table_fieldname)
 
-        # 转换为可序列化的格式
-        return [child.as_dict() for child in child_data]
-    except frappe.PermissionError:
-        frappe.throw(("No permission to access this data"))
-    except Exception as e:
-        frappe.log_error(f"Error in get_child_table_data: {str(e)}")
+@frappe.whitelist()
+def validate_doctype_table(doctype, sample_size=None):
+    """
+    Evaluate the Data Rules of a doctype over its whole table, in the database where possible
+
+    :return
+        [{"data_rule", "which_gx", "success", "evaluated", "failed", "sample"}]
+    """
+    frappe.only_for("System Manager")
+    outcome = validate_table(doctype, sample_size=sample_size)
+    return [
+        {
+            "data_rule": one.rule.name,
+            "which_gx": one.rule.which_gx,
+            "success": one.success,
+            "evaluated": one.element_count,
+            "failed": one.unexpected_count,
+            "sample": one.unexpected_index,
+        }
+        for one in outcome.results
+    ]
@@ -0,0 +1,324 @@
+"""
+Benchmarks of the validation and import hot paths.
+
+Rules and data are synthetic: plans are compiled in memory from generated Data Rules and
+installed in the per-worker plan cache for the duration of a run, over the fields of the
+core ToDo DocType, so nothing has to be configured on the site. Only the import
+benchmark writes to the database, and it deletes what it inserted.
+
+Run with `bench --site <site> dataq-benchmark`. Results are written as JSON, one entry
+per benchmark with the median and minimum time of one call, and compared against a
+baseline stored per site. A benchmark whose median is slower than the baseline by more
+than the tolerance is reported as a regression.
+"""
+
+import copy
+import json
+import os
+import platform
+import statistics
+from contextlib import contextmanager
+from time import perf_counter
+
+import frappe
+import numpy as np
+import pandas as pd
+from frappe.utils import now
+
+BENCHMARK_DOCTYPE = "ToDo"
+# a core DocType whose documents have numeric fields and child tables
+COERCION_DOCTYPE = "DocType"
+BASELINE_FILE = "dataq_benchmark_baseline.json"
+DEFAULT_SIZES = (1, 1000, 100000, 1000000)
+DEFAULT_RULE_COUNTS = (1, 10, 50)
+
+STATUSES = ["Open", "Closed", "Cancelled"]
+PRIORITIES = ["High", "Medium", "Low"]
+
+# (which_gx, args) cycled through to build N rules over the ToDo fields
+RULE_TEMPLATES = [
+    ("ExpectColumnValuesToNotBeNull", {"column": "description"}),
+    ("ExpectColumnValuesToBeInSet", {"column": "status", "value_set": STATUSES}),
+    ("ExpectColumnValuesToBeInSet", {"column": "priority", "value_set": PRIORITIES}),
+    ("ExpectColumnValueLengthsToBeBetween", {"column": "description", "min_value": 1, "max_value": 140}),
+    ("ExpectColumnValuesToMatchRegex", {"column": "description", "regex": r"^dataq-bench"}),
+    ("ExpectColumnValuesToNotBeInSet", {"column": "status", "value_set": ["Draft"]}),
+]
+
+
+def synthetic_rules(count):
+    """`count` CompiledRules that every row built by `synthetic_frame` passes"""
+    from .plan import CompiledRule
+
+    rules = []
+    for i in range(count):
+        which_gx, args = RULE_TEMPLATES[i % len(RULE_TEMPLATES)]
+        rules.append(CompiledRule(f"dataq-bench-{i}", which_gx, copy.deepcopy(args)))
+    return rules
+
+
+def synthetic_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "name": [f"dataq-bench-{i}" for i in range(rows)],
+            "description": [f"dataq-bench task {i}" for i in range(rows)],
+            "status": np.array(STATUSES)[rng.integers(0, len(STATUSES), rows)],
+            "priority": np.array(PRIORITIES)[rng.integers(0, len(PRIORITIES), rows)],
+        }
+    )
+
+
+def synthetic_string_doc(doctype, name):
+    """An existing document as a dict with every value a string, like a spreadsheet row"""
+
+    def stringified(value):
+        if isinstance(value, dict):
+            return {key: stringified(one) for key, one in value.items()}
+        if isinstance(value, list):
+            return [stringified(one) for one in value]
+        return value if value is None else str(value)
+
+    return stringified(frappe.get_doc(doctype, name).as_dict(no_default_fields=True))
+
+
+@contextmanager
+def synthetic_plan(doctype, rules, engine):
+    """Install a compiled plan for `doctype` in the per-worker cache, restore the cache afterwards"""
+    from .gx_runtime import drop_validation_definition
+    from .plan import ValidationPlan, _doctypes_with_rules, _plans, get_doctypes_with_rules, get_rules_version
+
+    site = frappe.local.site
+    version = get_rules_version()
+    doctypes = get_doctypes_with_rules()
+    saved_plan = _plans.get((site, doctype))
+    saved_doctypes = _doctypes_with_rules.get(site)
+
+    # the synthetic plan has the version of the real one, so their GX suites must not mix
+    drop_validation_definition(doctype)
+    _plans[(site, doctype)] = ValidationPlan(doctype, version, rules, engine=engine)
+    _doctypes_with_rules[site] = (
+        version,
+        doctypes | {doctype} if rules else doctypes - {doctype},
+    )
+    try:
+        yield
+    finally:
+        drop_validation_definition(doctype)
+        _plans.pop((site, doctype), None)
+        if saved_plan is not None:
+            _plans[(site, doctype)] = saved_plan
+        _doctypes_with_rules.pop(site, None)
+        if saved_doctypes is not None:
+            _doctypes_with_rules[site] = saved_doctypes
+
+
+@contextmanager
+def quiet_conf():
+    """Keep the benchmarks from recording results and timings, and from spawning pools"""
+    overrides = {"dataq_results_enabled": 0, "dataq_timing": 0, "dataq_validation_workers": 1}
+    saved = {key: frappe.local.conf.get(key) for key in overrides}
+    frappe.local.conf.update(overrides)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                frappe.local.conf.pop(key, None)
+            else:
+                frappe.local.conf[key] = value
+
+
+def measure(fn, repeat=5, number=1, setup=None):
+    """
+    Time `fn` called `number` times in each of `repeat` rounds
+
+    :param
+        setup: called before each round, outside of the timing, its return value is
+            passed to `fn`
+
+    :return
+        {"median", "min", "max"} seconds per call, with "repeat" and "number"
+    """
+    fn(setup() if setup else None)  # warm caches and imports
+    timings = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = perf_counter()
+        for _ in range(number):
+            fn(arg)
+        timings.append((perf_counter() - start) / number)
+    return {
+        "median": statistics.median(timings),
+        "min": min(timings),
+        "max": max(timings),
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def bench_doctype_validate(rule_counts):
+    from .api import doctype_validate
+
+    results = {}
+    doc = frappe.get_doc(
+        {
+            "doctype": BENCHMARK_DOCTYPE,
+            "description": "dataq-bench task",
+            "status": "Open",
+            "priority": "Medium",
+        }
+    )
+    for count in (0, *rule_counts):
+        for engine in ("native", "gx") if count else ("native",):
+            with synthetic_plan(BENCHMARK_DOCTYPE, synthetic_rules(count), engine):
+                results[f"doctype_validate[rules={count},engine={engine}]"] = measure(
+                    lambda _: doctype_validate(doc, "write"), repeat=5, number=200 if count else 10000
+                )
+    return results
+
+
+def bench_gx_validate(sizes, engines, rules=None):
+    from .api import gx_validate
+
+    if rules is None:
+        rules = len(RULE_TEMPLATES)
+    results = {}
+    for engine in engines:
+        with synthetic_plan(BENCHMARK_DOCTYPE, synthetic_rules(rules), engine):
+            for rows in sizes:
+                df = synthetic_frame(rows)
+                timing = measure(
+                    lambda _: gx_validate(BENCHMARK_DOCTYPE, df, workers=1),
+                    repeat=3 if rows >= 100000 else 5,
+                    number=1 if rows >= 1000 else 20,
+                )
+                timing["rows_per_second"] = rows / timing["median"]
+                results[f"gx_validate[rows={rows},engine={engine}]"] = timing
+    return results
+
+
+def bench_coercion(rows=1000):
+    """Frame building of `doctype_validate` and `gx_validate`, over documents with child tables"""
+    from .coercion import coerce_frame, records_to_frame
+
+    doc = synthetic_string_doc(COERCION_DOCTYPE, BENCHMARK_DOCTYPE)
+    columns = list(doc)
+    records = [doc] * rows
+    # `coerce_frame` works in place, so every call gets a fresh frame made outside the timing
+    return {
+        f"records_to_frame[doctype={COERCION_DOCTYPE},rows=1]": measure(
+            lambda _: records_to_frame(COERCION_DOCTYPE, records[:1], columns), repeat=5, number=200
+        ),
+        f"coerce_frame[doctype={COERCION_DOCTYPE},rows={rows}]": measure(
+            lambda df: coerce_frame(COERCION_DOCTYPE, df),
+            repeat=5,
+            setup=lambda: pd.DataFrame.from_records(records),
+        ),
+    }
+
+
+def bench_import(rows):
+    from ..util import import_from_dataframe_to_document
+
+    started = now()
+    df = synthetic_frame(rows).drop(columns=["name"])
+    try:
+        with synthetic_plan(BENCHMARK_DOCTYPE, synthetic_rules(len(RULE_TEMPLATES)), "native"):
+            timing = measure(
+                lambda _: import_from_dataframe_to_document(BENCHMARK_DOCTYPE, df), repeat=3
+            )
+    finally:
+        cleanup_import(started)
+    timing["rows_per_second"] = rows / timing["median"]
+    return {f"import_from_dataframe_to_document[rows={rows}]": timing}
+
+
+def cleanup_import(started):
+    """Delete the ToDos and Data Imports the import benchmark created"""
+    frappe.db.delete(BENCHMARK_DOCTYPE, {"description": ("like", "dataq-bench%")})
+    data_imports = frappe.get_all(
+        "Data Import",
+        filters={"reference_doctype": BENCHMARK_DOCTYPE, "creation": (">=", started)},
+        pluck="name",
+    )
+    if data_imports:
+        frappe.db.delete("Data Import Log", {"data_import": ("in", data_imports)})
+        frappe.db.delete("Data Import", {"name": ("in", data_imports)})
+    frappe.db.commit()
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, rule_counts=DEFAULT_RULE_COUNTS, engines=("native", "gx"), import_rows=500):
+    """
+    Run the whole suite on the current site
+
+    :param
+        import_rows: rows per import run, 0 skips the import benchmark
+
+    :return
+        {"meta": {...}, "results": {benchmark: timing}}
+    """
+    from .gx_runtime import import_gx
+
+    import_gx()
+    results = {}
+    with quiet_conf():
+        results.update(bench_doctype_validate(rule_counts))
+        results.update(bench_gx_validate(sizes, engines))
+        results.update(bench_coercion())
+        if import_rows:
+            results.update(bench_import(import_rows))
+
+    return {
+        "meta": {
+            "timestamp": now(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "pandas": pd.__version__,
+            "frappe": frappe.__version__,
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance=0.2):
+    """
+    Benchmarks whose median got slower than the baseline by more than `tolerance`
+
+    :return
+        [{"benchmark", "baseline", "current", "ratio"}]
+    """
+    regressions = []
+    for benchmark, timing in report["results"].items():
+        previous = baseline.get("results", {}).get(benchmark)
+        if not previous:
+            continue
+        ratio = timing["median"] / previous["median"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                {
+                    "benchmark": benchmark,
+                    "baseline": previous["median"],
+                    "current": timing["median"],
+                    "ratio": round(ratio, 3),
+                }
+            )
+    return regressions
+
+
+def get_baseline_path():
+    return frappe.get_site_path(BASELINE_FILE)
+
+
+def load_baseline(path=None):
+    path = path or get_baseline_path()
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(report, path=None):
+    with open(path or get_baseline_path(), "w") as f:
+        json.dump(report, f, indent=1)
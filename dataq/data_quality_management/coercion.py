@@ -0,0 +1,181 @@
+"""
+Schema-directed type coercion.
+
+Document values are converted according to the DocType field meta and rule args
+according to the `python_type` declared on GX Args / GX Args Type. Only fields whose
+type calls for a conversion are touched, so free text that happens to look like a
+Python literal is left alone. Converters are compiled once per DocType and cached per
+worker, keyed by the meta `modified` timestamp.
+"""
+
+import ast
+
+import frappe
+import pandas as pd
+from frappe import _
+from frappe.model import table_fields
+
+INT_FIELDTYPES = {"Int", "Check"}
+FLOAT_FIELDTYPES = {"Float", "Currency", "Percent"}
+
+# {(site, doctype): (meta modified, {fieldname: converter}, {fieldname: child doctype})}
+_field_converters = {}
+
+
+def _to_int(value):
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return _to_float(value)
+    return value
+
+
+def _to_float(value):
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y", "on")
+    return bool(value)
+
+
+def _literal(value):
+    if isinstance(value, str):
+        return ast.literal_eval(value)
+    return value
+
+
+def _as_is(value):
+    return value
+
+
+ARG_CONVERTERS = {
+    "int": _to_int,
+    "float": _to_float,
+    "bool": _to_bool,
+    "str": _as_is,
+    "string": _as_is,
+    "list": _literal,
+    "tuple": _literal,
+    "set": _literal,
+    "dict": _literal,
+}
+
+
+def coerce_arg(value, python_type=None):
+    """
+    Convert a Data Rules Args value to the python type declared for it
+
+    Args without a known type keep the old best-effort literal evaluation.
+    """
+    converter = ARG_CONVERTERS.get((python_type or "").strip().lower())
+    if converter is None:
+        from ..util import convert_str_to_standard
+
+        return convert_str_to_standard(value)
+    try:
+        return converter(value)
+    except (ValueError, SyntaxError):
+        frappe.throw(_("Value {0} is not a valid {1}").format(frappe.bold(value), python_type))
+
+
+def get_field_converters(doctype):
+    """
+    Compiled converters of the fields of a doctype that need one
+
+    :return
+        ({fieldname: converter}, {table fieldname: child doctype})
+    """
+    meta = frappe.get_meta(doctype)
+    key = (frappe.local.site, doctype)
+    cached = _field_converters.get(key)
+    if cached is None or cached[0] != meta.modified:
+        converters = {}
+        tables = {}
+        for df in meta.fields:
+            if df.fieldtype in INT_FIELDTYPES:
+                converters[df.fieldname] = _to_int
+            elif df.fieldtype in FLOAT_FIELDTYPES:
+                converters[df.fieldname] = _to_float
+            elif df.fieldtype in table_fields:
+                tables[df.fieldname] = df.options
+        cached = (meta.modified, converters, tables)
+        _field_converters[key] = cached
+    return cached[1], cached[2]
+
+
+def records_to_frame(doctype, records, columns=None):
+    """
+    Build a DataFrame straight from documents, coerced by the field meta
+
+    :param
+        records: Documents or dicts, read without being copied or mutated
+        columns: fieldnames to take, every field of the records when None
+
+    :return
+        pd.DataFrame, one row per record
+    """
+    if columns is None:
+        frame = pd.DataFrame.from_records(
+            [record if isinstance(record, dict) else record.as_dict() for record in records]
+        )
+        return coerce_frame(doctype, frame)
+
+    converters, tables = get_field_converters(doctype)
+    data = {}
+    for column in columns:
+        values = [record.get(column) for record in records]
+        converter = converters.get(column)
+        if converter:
+            values = [value if value is None else converter(value) for value in values]
+        elif column in tables:
+            values = [coerce_child_rows(tables[column], value) for value in values]
+        data[column] = values
+    return pd.DataFrame(data, index=range(len(records)))
+
+
+def coerce_child_rows(doctype, rows):
+    """Converted copies of child table rows (Documents or dicts), their own child tables included"""
+    if not rows or not isinstance(rows, (list, tuple)):
+        return rows
+    converters, tables = get_field_converters(doctype)
+    coerced = []
+    for row in rows:
+        row = dict(row) if isinstance(row, dict) else row.as_dict()
+        for fieldname, converter in converters.items():
+            if row.get(fieldname) is not None:
+                row[fieldname] = converter(row[fieldname])
+        for fieldname, child_doctype in tables.items():
+            if row.get(fieldname):
+                row[fieldname] = coerce_child_rows(child_doctype, row[fieldname])
+        coerced.append(row)
+    return coerced
+
+
+def coerce_frame(doctype, df):
+    """
+    Convert the numeric columns of a DataFrame of fieldnames, a whole column at a time,
+    and the rows of its child table columns.
+
+    Values that do not parse as numbers are kept as they are, like `_to_int` and `_to_float` do.
+    """
+    converters, tables = get_field_converters(doctype)
+    for fieldname in tables.keys() & set(df.columns):
+        df[fieldname] = [coerce_child_rows(tables[fieldname], rows) for rows in df[fieldname]]
+    for fieldname in converters.keys() & set(df.columns):
+        series = df[fieldname]
+        if series.dtype.kind in "iufb":
+            continue
+        converted = pd.to_numeric(series, errors="coerce")
+        if converted.notna().sum() == series.notna().sum():
+            df[fieldname] = converted
+        else:
+            df[fieldname] = converted.astype(object).where(converted.notna(), series)
+    return df
@@ -0,0 +1,531 @@
+"""
+Incrementally maintained column statistics.
+
+Aggregate expectations (row count, null ratio, mean, stdev, min, max, median, distinct
+count) are about the whole table, so evaluating them against the one-row frame of a save
+means nothing. For every column read by such a rule dataq keeps running statistics in
+Redis instead:
+
+- row count and non-null count, sum and sum of squares, as atomic counters
+- min and max, updated by a Lua script; removing the current extreme marks it stale
+- a HyperLogLog (PFADD / PFCOUNT) of the values for the distinct count
+- a t-digest of the numeric values for the median, fed through a short pending list
+
+They are updated after commit from the `on_update` / `on_trash` doc events, and rebuilt
+from the table by a daily reconciliation, which also fixes what cannot be maintained
+incrementally: stale extremes, and deleted values still counted by the HyperLogLog and
+t-digest. On save an aggregate rule is checked in O(1) against the statistics projected
+with the change of the document. Rules whose statistics are missing or stale pass and
+leave the check to the scans until the next reconciliation.
+"""
+
+import math
+import pickle
+from bisect import bisect_left
+
+import frappe
+import numpy as np
+from frappe.utils import cint, flt
+
+from .engine import RuleOutcome, ValidationOutcome
+from .pushdown import _within
+
+STATS_KEY = "dataq:stats:{doctype}"
+COLUMN_STATS_KEY = "dataq:stats:{doctype}:{column}"
+
+TDIGEST_PENDING_LIMIT = 256
+
+NUMERIC_FIELDTYPES = {"Int", "Float", "Currency", "Percent", "Check", "Duration", "Rating"}
+
+# expectation -> statistic its bounds apply to
+STATS_EXPECTATIONS = {
+    "ExpectTableRowCountToBeBetween": "rows",
+    "ExpectTableRowCountToEqual": "rows",
+    "ExpectColumnMeanToBeBetween": "mean",
+    "ExpectColumnStdevToBeBetween": "stdev",
+    "ExpectColumnMinToBeBetween": "min",
+    "ExpectColumnMaxToBeBetween": "max",
+    "ExpectColumnMedianToBeBetween": "median",
+    "ExpectColumnUniqueValueCountToBeBetween": "distinct",
+}
+
+# atomic min / max maintenance, ARGV: value, 1 to add it or 0 to remove it
+_EXTREMES_SCRIPT = """
+local value = tonumber(ARGV[1])
+local low = tonumber(redis.call('HGET', KEYS[1], 'min'))
+local high = tonumber(redis.call('HGET', KEYS[1], 'max'))
+if ARGV[2] == '1' then
+    if not low or value < low then redis.call('HSET', KEYS[1], 'min', ARGV[1]) end
+    if not high or value > high then redis.call('HSET', KEYS[1], 'max', ARGV[1]) end
+else
+    if low and value <= low then redis.call('HSET', KEYS[1], 'min_stale', 1) end
+    if high and value >= high then redis.call('HSET', KEYS[1], 'max_stale', 1) end
+end
+"""
+
+_scripts = {}
+
+
+class TDigest:
+    """Merging t-digest: a few hundred weighted centroids summarising a distribution"""
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.means = []
+        self.weights = []
+
+    @property
+    def count(self):
+        return sum(self.weights)
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0), 1) - 1)
+
+    def add_many(self, values):
+        values = [float(value) for value in values]
+        if not values:
+            return
+        points = sorted(zip(self.means + values, self.weights + [1.0] * len(values), strict=True))
+        total = sum(weight for _, weight in points)
+        means, weights = [], []
+        seen = 0.0
+        limit = self._k(0) + 1
+        for mean, weight in points:
+            if weights and self._k((seen + weight) / total) <= limit:
+                merged = weights[-1] + weight
+                means[-1] += (mean - means[-1]) * weight / merged
+                weights[-1] = merged
+            else:
+                if weights:
+                    limit = self._k(seen / total) + 1
+                means.append(mean)
+                weights.append(weight)
+            seen += weight
+        self.means, self.weights = means, weights
+
+    def quantile(self, q):
+        if not self.weights:
+            return None
+        if len(self.means) == 1:
+            return self.means[0]
+        total = self.count
+        centers = np.cumsum(self.weights) - np.asarray(self.weights) / 2
+        target = q * total
+        i = bisect_left(centers.tolist(), target)
+        if i == 0:
+            return self.means[0]
+        if i == len(self.means):
+            return self.means[-1]
+        share = (target - centers[i - 1]) / (centers[i] - centers[i - 1])
+        return self.means[i - 1] + share * (self.means[i] - self.means[i - 1])
+
+    def copy(self):
+        digest = TDigest(self.compression)
+        digest.means, digest.weights = list(self.means), list(self.weights)
+        return digest
+
+
+def is_stats_rule(rule):
+    if rule.which_gx in STATS_EXPECTATIONS:
+        return True
+    # a null ratio over the whole table
+    return rule.which_gx == "ExpectColumnValuesToNotBeNull" and rule.args.get("mostly") is not None
+
+
+def get_stats_columns(doctype):
+    """Columns of the doctype table read by aggregate rules, None when there are no such rules"""
+    from .plan import get_plan, has_rules
+
+    if not has_rules(doctype):
+        return None
+    plan = get_plan(doctype)
+    rules = [rule for rule in plan.rules if is_stats_rule(rule)]
+    if not rules:
+        return None
+    return sorted({rule.column for rule in rules if rule.column})
+
+
+def _key(doctype, column=None):
+    if column is None:
+        return frappe.cache.make_key(STATS_KEY.format(doctype=doctype))
+    return frappe.cache.make_key(COLUMN_STATS_KEY.format(doctype=doctype, column=column))
+
+
+def _extremes_script():
+    site = frappe.local.site
+    if site not in _scripts:
+        _scripts[site] = frappe.cache.register_script(_EXTREMES_SCRIPT)
+    return _scripts[site]
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return None if isinstance(value, float) and math.isnan(value) else value
+    return None
+
+
+def _is_null(value):
+    return value is None or value == ""
+
+
+def on_change(doc, method=None):
+    """`on_update` / `on_trash` doc event of every doctype, queue the change for after commit"""
+    if doc.doctype == "DocType":
+        return
+    columns = get_stats_columns(doc.doctype)
+    if columns is None:
+        return
+
+    if method == "on_trash":
+        old, new, rows = doc, None, -1
+    elif doc.flags.in_insert or not doc.get_doc_before_save():
+        old, new, rows = None, doc, 1
+    else:
+        old, new, rows = doc.get_doc_before_save(), doc, 0
+        if not any(doc.has_value_changed(column) for column in columns):
+            return
+
+    change = (
+        doc.doctype,
+        rows,
+        {
+            column: (None if old is None else old.get(column), None if new is None else new.get(column))
+            for column in columns
+        },
+    )
+    frappe.db.after_commit.add(lambda: apply_change(*change))
+
+
+def apply_change(doctype, rows, values):
+    """
+    Add one document change to the statistics
+
+    :param
+        rows: +1 for an insert, -1 for a delete, 0 for an update
+        values: {column: (old value, new value)}
+    """
+    from redis import Redis
+
+    keys = [_key(doctype)] + [_key(doctype, column) for column in values]
+    pipeline = frappe.cache.pipeline()
+    for key in keys:
+        pipeline.exists(key)
+    exists = pipeline.execute()
+    if not all(exists):
+        # never reconciled, or a rule on a new column, there is nothing to update incrementally
+        enqueue_reconciliation(doctype)
+        if not exists[0]:
+            return
+        values = {column: change for (column, change), found in zip(values.items(), exists[1:], strict=True) if found}
+
+    script = _extremes_script()
+    pipeline = frappe.cache.pipeline()
+    pipeline.hincrby(_key(doctype), "rows", rows)
+    digests = []
+    for column, (old, new) in values.items():
+        if old == new:
+            continue
+        key = _key(doctype, column)
+        for value, sign in ((old, -1), (new, 1)):
+            if _is_null(value):
+                continue
+            pipeline.hincrby(key, "count", sign)
+            number = _number(value)
+            if number is not None:
+                pipeline.hincrbyfloat(key, "sum", sign * number)
+                pipeline.hincrbyfloat(key, "sumsq", sign * number * number)
+                script(keys=[key], args=[number, 1 if sign > 0 else 0], client=pipeline)
+            if sign > 0:
+                pipeline.pfadd(f"{key.decode()}:hll", str(value))
+                if number is not None:
+                    pipeline.rpush(f"{key.decode()}:pending", number)
+                    digests.append(column)
+    pipeline.execute()
+
+    for column in digests:
+        key = f"{_key(doctype, column).decode()}:pending"
+        if Redis.llen(frappe.cache, key) > TDIGEST_PENDING_LIMIT:
+            merge_pending(doctype, column)
+
+
+def merge_pending(doctype, column):
+    """Fold the pending values of a column into its stored t-digest"""
+    from redis import Redis
+
+    key = _key(doctype, column)
+    pending_key = f"{key.decode()}:pending"
+    with frappe.cache.lock(f"{pending_key}:lock", timeout=10):
+        values = Redis.lrange(frappe.cache, pending_key, 0, -1)
+        digest = load_digest(key)
+        digest.add_many(float(value) for value in values)
+        pipeline = frappe.cache.pipeline()
+        pipeline.hset(key, "tdigest", pickle.dumps((digest.means, digest.weights)))
+        pipeline.ltrim(pending_key, len(values), -1)
+        pipeline.execute()
+
+
+def load_digest(key, raw=None):
+    from redis import Redis
+
+    raw = Redis.hget(frappe.cache, key, "tdigest") if raw is None else raw
+    digest = TDigest()
+    if raw:
+        digest.means, digest.weights = pickle.loads(raw)
+    return digest
+
+
+def read_stats(doctype, column):
+    """The stored statistics of a column, None when they were never reconciled"""
+    key = _key(doctype, column) if column else None
+    pipeline = frappe.cache.pipeline()
+    pipeline.hgetall(_key(doctype))
+    if key:
+        pipeline.hgetall(key)
+        pipeline.lrange(f"{key.decode()}:pending", 0, -1)
+    replies = pipeline.execute()
+    table = {frappe.safe_decode(field): value for field, value in replies[0].items()}
+    fields = {frappe.safe_decode(field): value for field, value in replies[1].items()} if key else {}
+    if not table or (key and not fields):
+        return None
+    stats = frappe._dict(rows=cint(table.get("rows")))
+    if key:
+        stats.update(
+            count=cint(fields.get("count")),
+            sum=flt(fields.get("sum")),
+            sumsq=flt(fields.get("sumsq")),
+            min=None if fields.get("min") is None else float(fields["min"]),
+            max=None if fields.get("max") is None else float(fields["max"]),
+            min_stale=bool(cint(fields.get("min_stale"))),
+            max_stale=bool(cint(fields.get("max_stale"))),
+            digest=load_digest(key, fields.get("tdigest") or b""),
+            pending=[float(value) for value in replies[2]],
+            hll=f"{key.decode()}:hll",
+        )
+        stats.digest.add_many(stats.pending)
+    return stats
+
+
+def projected_distinct(hll_key, value):
+    """PFCOUNT of the HyperLogLog as if `value` were added, without adding it"""
+    scratch = frappe.cache.make_key(f"dataq:stats:scratch:{frappe.generate_hash(length=10)}")
+    pipeline = frappe.cache.pipeline()
+    pipeline.pfmerge(scratch, hll_key)
+    if not _is_null(value):
+        pipeline.pfadd(scratch, str(value))
+    pipeline.pfcount(scratch)
+    pipeline.delete(scratch)
+    return pipeline.execute()[-2]
+
+
+def project(stats, old, new, rows):
+    """The statistics after replacing `old` by `new`, either may be None"""
+    projected = frappe._dict(stats)
+    projected.rows = stats.rows + rows
+    if "count" not in stats:
+        return projected
+    for value, sign in ((old, -1), (new, 1)):
+        if _is_null(value):
+            continue
+        projected.count += sign
+        number = _number(value)
+        if number is None:
+            continue
+        projected.sum += sign * number
+        projected.sumsq += sign * number * number
+        if sign > 0:
+            projected.min = number if projected.min is None else min(projected.min, number)
+            projected.max = number if projected.max is None else max(projected.max, number)
+        else:
+            # the removed value may have been the extreme, its successor is unknown
+            projected.min_stale |= projected.min is not None and number <= projected.min
+            projected.max_stale |= projected.max is not None and number >= projected.max
+    return projected
+
+
+def statistic(projected, name, new=None):
+    """Value of a statistic, None when it is unknown"""
+    if name == "rows":
+        return projected.rows
+    count = projected.get("count") or 0
+    if name == "mean":
+        return projected.sum / count if count else None
+    if name == "stdev":
+        if count < 2:
+            return None
+        variance = (projected.sumsq - projected.sum * projected.sum / count) / (count - 1)
+        return math.sqrt(max(variance, 0))
+    if name in ("min", "max"):
+        return None if projected[f"{name}_stale"] else projected[name]
+    if name == "median":
+        digest = projected.digest.copy()
+        if _number(new) is not None:
+            digest.add_many([_number(new)])
+        return digest.quantile(0.5)
+    if name == "distinct":
+        return projected_distinct(projected.hll, new)
+    return None
+
+
+def check_projected(doctype, rules, records):
+    """
+    Evaluate aggregate rules for documents about to be saved, against the statistics
+    projected with their changes
+
+    :return
+        ValidationOutcome, a failing rule lists every record position
+    """
+    results = []
+    for rule in rules:
+        stats = read_stats(doctype, rule.column)
+        if stats is None:
+            enqueue_reconciliation(doctype)
+            results.append(RuleOutcome(rule, success=True))
+            continue
+
+        unexpected = []
+        for i, record in enumerate(records):
+            before = None
+            if hasattr(record, "get_doc_before_save") and not record.is_new():
+                before = record.get_doc_before_save()
+            rows = 0 if before else 1
+            old = before.get(rule.column) if before and rule.column else None
+            new = record.get(rule.column) if rule.column else None
+            if not passes(rule, project(stats, old, new, rows), new):
+                unexpected.append(i)
+        # `mostly` already applied to the whole table
+        results.append(RuleOutcome(rule, unexpected, len(records), success=not unexpected))
+    return ValidationOutcome(results)
+
+
+def check_stats(doctype, rules):
+    """
+    Evaluate aggregate rules against the current statistics of the table, without
+    reading it
+
+    :return
+        ValidationOutcome, rules whose statistics are missing pass
+    """
+    results = []
+    for rule in rules:
+        stats = read_stats(doctype, rule.column)
+        if stats is None:
+            enqueue_reconciliation(doctype)
+            results.append(RuleOutcome(rule, success=True))
+            continue
+        results.append(RuleOutcome(rule, element_count=stats.rows, success=passes(rule, stats)))
+    return ValidationOutcome(results)
+
+
+def passes(rule, stats, new=None):
+    """Whether an aggregate rule holds for the statistics, unknown statistics pass"""
+    if rule.which_gx == "ExpectColumnValuesToNotBeNull":
+        return not stats.rows or stats.count / stats.rows >= rule.args["mostly"]
+    value = statistic(stats, STATS_EXPECTATIONS[rule.which_gx], new=new)
+    if value is None:
+        return True
+    if "value" in rule.args:
+        return value == cint(rule.args["value"])
+    return _within(value, rule.args)
+
+
+def enqueue_reconciliation(doctype=None):
+    frappe.enqueue(
+        "dataq.data_quality_management.column_stats.reconcile_column_stats",
+        doctype=doctype,
+        queue="long",
+        job_id=f"dataq_stats::{frappe.local.site}::{doctype or '*'}",
+        deduplicate=True,
+    )
+
+
+def reconcile_column_stats(doctype=None, chunk_size=10000):
+    """
+    Scheduler event, rebuild the statistics of one or every doctype from its table
+
+    Counters and extremes come from one aggregate query, the HyperLogLog and the t-digest
+    from the column read in keyset chunks.
+    """
+    from frappe.query_builder.functions import Count, Max, Min, Sum
+
+    from .plan import get_doctypes_with_rules
+
+    for one in [doctype] if doctype else sorted(get_doctypes_with_rules()):
+        columns = get_stats_columns(one)
+        if columns is None:
+            continue
+        meta = frappe.get_meta(one)
+        table = frappe.qb.DocType(one)
+        table_columns = set(frappe.db.get_table_columns(one))
+        columns = [column for column in columns if column in table_columns]
+        numeric = {
+            column
+            for column in columns
+            if column == "idx" or (meta.get_field(column) and meta.get_field(column).fieldtype in NUMERIC_FIELDTYPES)
+        }
+
+        terms = [Count("*").as_("rows")]
+        for i, column in enumerate(columns):
+            terms.append(Count(table[column]).as_(f"count_{i}"))
+            if column in numeric:
+                terms.extend(
+                    [
+                        Sum(table[column]).as_(f"sum_{i}"),
+                        Sum(table[column] * table[column]).as_(f"sumsq_{i}"),
+                        Min(table[column]).as_(f"min_{i}"),
+                        Max(table[column]).as_(f"max_{i}"),
+                    ]
+                )
+        totals = frappe.qb.from_(table).select(*terms).run(as_dict=True)[0]
+
+        pipeline = frappe.cache.pipeline()
+        pipeline.delete(_key(one))
+        pipeline.hset(_key(one), "rows", cint(totals.rows))
+        for i, column in enumerate(columns):
+            key = _key(one, column)
+            pipeline.delete(key, f"{key.decode()}:hll", f"{key.decode()}:pending")
+            fields = {"count": cint(totals[f"count_{i}"])}
+            if column in numeric:
+                fields.update(sum=flt(totals[f"sum_{i}"]), sumsq=flt(totals[f"sumsq_{i}"]))
+                if totals[f"min_{i}"] is not None:
+                    fields.update(min=flt(totals[f"min_{i}"]), max=flt(totals[f"max_{i}"]))
+            pipeline.hset(key, mapping=fields)
+        pipeline.execute()
+
+        for column in columns:
+            rebuild_sketches(one, column, column in numeric, chunk_size)
+        frappe.logger("dataq").info(f"reconciled column statistics of {one}: {columns}")
+
+
+def rebuild_sketches(doctype, column, numeric, chunk_size=10000):
+    """Refill the HyperLogLog and t-digest of a column, reading it in keyset chunks"""
+    from redis import Redis
+
+    table = frappe.qb.DocType(doctype)
+    key = _key(doctype, column)
+    digest = TDigest()
+    last = None
+    while True:
+        query = (
+            frappe.qb.from_(table)
+            .select(table.name, table[column])
+            .where(table[column].notnull())
+            .orderby(table.name)
+            .limit(chunk_size)
+        )
+        if last is not None:
+            query = query.where(table.name > last)
+        rows = query.run()
+        if not rows:
+            break
+        values = [value for _, value in rows if not _is_null(value)]
+        if values:
+            frappe.cache.pfadd(f"{key.decode()}:hll", *(str(value) for value in values))
+            if numeric:
+                digest.add_many(values)
+        last = rows[-1][0]
+        if len(rows) < chunk_size:
+            break
+    if numeric:
+        Redis.hset(frappe.cache, key, "tdigest", pickle.dumps((digest.means, digest.weights)))
@@ -0,0 +1,96 @@
+"""
+Column header resolution.
+
+One precomputed map per DocType and language turns any header a user may write, the
+fieldname, the label or the translated label, into the fieldname. Child table fields
+are qualified the way the Data Import template writes them, "Label (Table Label)", and
+map to "table_fieldname.fieldname". The maps live in a Redis hash and are dropped
+whenever DocType meta changes.
+
+Rule columns are resolved once for every user of a worker, so compiled plans use the
+union of the maps of the site default language, English and the languages listed in
+`dataq_rule_languages` (site config) rather than the language of the request that
+happened to compile them.
+"""
+
+import frappe
+from frappe import _
+from frappe.model import no_value_fields, table_fields
+
+COLUMN_MAP_KEY = "dataq:column_map"
+
+
+def get_column_map(doctype, lang=None):
+    """{header: fieldname} of a doctype, read once per request"""
+    lang = lang or frappe.local.lang
+    return frappe.cache.hget(
+        COLUMN_MAP_KEY, f"{doctype}:{lang}", generator=lambda: build_column_map(doctype, lang)
+    )
+
+
+def get_multilingual_column_map(doctype):
+    """
+    {header: fieldname} in the languages rules may be written in, the site default
+    language winning clashes
+
+    Not every enabled Language: a standard site enables nearly all of them, and each
+    costs a meta walk and a translation load per DocType.
+    """
+    languages = [
+        frappe.db.get_default("lang") or "en",
+        "en",
+        *(frappe.conf.get("dataq_rule_languages") or ()),
+    ]
+    column_map = {}
+    for lang in dict.fromkeys(languages):
+        for header, fieldname in get_column_map(doctype, lang).items():
+            column_map.setdefault(header, fieldname)
+    return column_map
+
+
+def build_column_map(doctype, lang=None):
+    meta = frappe.get_meta(doctype)
+    fields = [df for df in meta.fields if df.fieldtype not in no_value_fields or df.fieldtype in table_fields]
+
+    # exact fieldnames win over labels that happen to look like another field's name
+    column_map = {"name": "name", "ID": "name", _("ID", lang=lang): "name"}
+    column_map.update({df.fieldname: df.fieldname for df in fields})
+    for df in fields:
+        for header in _labels(df, lang):
+            column_map.setdefault(header, df.fieldname)
+
+    for table in fields:
+        if table.fieldtype not in table_fields:
+            continue
+        table_labels = _labels(table, lang) or [table.fieldname]
+        for df in frappe.get_meta(table.options).fields:
+            if df.fieldtype in no_value_fields:
+                continue
+            qualified = f"{table.fieldname}.{df.fieldname}"
+            column_map.setdefault(qualified, qualified)
+            for header in _labels(df, lang) or [df.fieldname]:
+                for table_label in table_labels:
+                    column_map.setdefault(f"{header} ({table_label})", qualified)
+
+    return column_map
+
+
+def _labels(df, lang):
+    if not df.label:
+        return []
+    return list(dict.fromkeys([df.label, _(df.label, lang=lang)]))
+
+
+def rename_columns_to_fieldnames(doctype, df):
+    """Rename every column of a DataFrame to its fieldname in one step"""
+    return df.rename(columns=get_column_map(doctype))
+
+
+def clear_column_maps(doc=None, method=None):
+    """Doc event of DocType, Custom Field, Property Setter and Translation, and `clear_cache` hook"""
+    frappe.cache.delete_key(COLUMN_MAP_KEY)
+    if doc:
+        # compiled plans hold columns resolved through the old map
+        from .plan import invalidate_plans
+
+        invalidate_plans()
@@ -0,0 +1,127 @@
+"""
+Deferred enforcement of Data Rules.
+
+Rules whose enforcement is "Deferred" do not run in `before_save`. The saved document
+is remembered for the transaction and, once it commits, added to a Redis set per
+DocType, so repeated saves of the same record before the worker gets to it are
+validated once. A background job drains the sets in batches: it reads the current
+rows of a batch in one query, evaluates the deferred rules over them as one frame and
+records the failures in the results store under the "Deferred" source, where the Data
+Quality Failure report lists them. Nothing is queued for a transaction that rolls back.
+
+A scheduler event picks up documents queued while a drain was already running.
+
+Settings (site config):
+    dataq_deferred_batch_size: documents evaluated per batch, default 500
+"""
+
+import frappe
+import pandas as pd
+from frappe.utils import cint
+
+# set of the doctypes with queued documents
+DEFERRED_DOCTYPES_KEY = "dataq:deferred"
+
+# set of the queued document names of one doctype
+DEFERRED_NAMES_KEY = "dataq:deferred:{doctype}"
+
+
+def defer_validation(doctype, name):
+    """Queue a document for its deferred rules once the current transaction commits"""
+    pending = frappe.flags.dataq_deferred
+    if pending is None:
+        pending = frappe.flags.dataq_deferred = {}
+        frappe.db.after_commit.add(_push_deferred)
+        frappe.db.after_rollback.add(_discard_deferred)
+    pending.setdefault(doctype, set()).add(name)
+
+
+def _discard_deferred():
+    frappe.flags.dataq_deferred = None
+
+
+def _push_deferred():
+    pending = frappe.flags.dataq_deferred
+    frappe.flags.dataq_deferred = None
+    if not pending:
+        return
+
+    pipeline = frappe.cache.pipeline()
+    for doctype, names in pending.items():
+        pipeline.sadd(frappe.cache.make_key(DEFERRED_NAMES_KEY.format(doctype=doctype)), *names)
+        pipeline.sadd(frappe.cache.make_key(DEFERRED_DOCTYPES_KEY), doctype)
+    pipeline.execute()
+    enqueue_deferred_validations()
+
+
+def enqueue_deferred_validations():
+    """Scheduler event, and called after each commit that queued documents"""
+    from redis import Redis
+
+    if not Redis.scard(frappe.cache, frappe.cache.make_key(DEFERRED_DOCTYPES_KEY)):
+        # nothing queued, no job for this tick
+        return
+    frappe.enqueue(
+        "dataq.data_quality_management.deferred.run_deferred_validations",
+        queue="default",
+        job_id=f"dataq_deferred::{frappe.local.site}",
+        deduplicate=True,
+    )
+
+
+def run_deferred_validations():
+    """Drain the queued documents of every doctype, one batch at a time"""
+    from redis import Redis
+
+    batch_size = cint(frappe.conf.get("dataq_deferred_batch_size")) or 500
+    doctypes_key = frappe.cache.make_key(DEFERRED_DOCTYPES_KEY)
+
+    for doctype in Redis.smembers(frappe.cache, doctypes_key):
+        doctype = frappe.safe_decode(doctype)
+        names_key = frappe.cache.make_key(DEFERRED_NAMES_KEY.format(doctype=doctype))
+        while True:
+            names = Redis.spop(frappe.cache, names_key, batch_size)
+            if not names:
+                Redis.srem(frappe.cache, doctypes_key, doctype)
+                break
+            try:
+                validate_deferred(doctype, [frappe.safe_decode(name) for name in names])
+            except Exception:
+                frappe.db.rollback()
+                frappe.log_error(title=f"Deferred data rules of {doctype} failed")
+            frappe.db.commit()
+
+
+def validate_deferred(doctype, names):
+    """
+    Evaluate the deferred rules of a doctype over the current rows of `names`
+
+    :return
+        ValidationOutcome, or None when the doctype has no deferred rules anymore
+    """
+    from .api import validate_dataframe
+    from .scan import get_scan_fields
+
+    plan = get_plan_if_exists(doctype)
+    rules = plan.deferred_rules if plan else []
+    if not rules:
+        return None
+
+    rows = frappe.get_all(
+        doctype, filters={"name": ("in", names)}, fields=get_scan_fields(doctype, plan) or ["*"]
+    )
+    if not rows:
+        # deleted since they were saved
+        return None
+
+    df = pd.DataFrame.from_records(rows)
+    df.index = df["name"]
+    return validate_dataframe(doctype, df, source="Deferred", rules=rules)
+
+
+def get_plan_if_exists(doctype):
+    from .plan import get_plan, has_rules
+
+    if not frappe.db.exists("DocType", doctype) or not has_rules(doctype):
+        return None
+    return get_plan(doctype)
@@ -0,0 +1,15 @@
+# Copyright (c) 2026, Tiger and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.query_builder import Interval
+from frappe.query_builder.functions import Now
+
+
+class DataQualityFailure(Document):
+	@staticmethod
+	def clear_old_logs(days=30):
+		# raw failures are pruned, the daily rollups in Data Quality Metric are kept
+		table = frappe.qb.DocType("Data Quality Failure")
+		frappe.db.delete(table, filters=(table.creation < (Now() - Interval(days=days))))
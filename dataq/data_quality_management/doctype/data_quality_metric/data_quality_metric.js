@@ -0,0 +1,8 @@
+// Copyright (c) 2026, Tiger and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Data Quality Metric", {
+// 	refresh(frm) {
+
+// 	},
+// });
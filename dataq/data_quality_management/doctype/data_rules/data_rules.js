@@ -12,25 +12,35 @@
 frappe.ui.form.on('Data Rules', {
     which_gx(frm, ab, cd, ef) {
         let which = frm.doc.which_gx;
-        frm.call({
+        cur_frm.set_value('args', null)
+        if (!which) {
+            return;
+        }
+        // fetch the args page by page and render each page as it arrives
+        let load_page = (after_idx) => frm.call({
             method: "dataq.data_quality_management.api.get_child_table_data",
             args: {
                 parent_doctype: "GX Function",
                 parent_name: which,
-                child_table_fieldname: "args"
+                child_table_fieldname: "args",
+                fields: ["args_name", "python_type"],
+                after_idx: after_idx,
+                page_length: 500
             }
         }).then(res=>{
-            if (res.message) {
-                cur_frm.set_value('args', null) 
-                message = res.message
-                message.forEach(one => {
-                    let args = frm.add_child('args')
-                    args.args_name = one.args_name
-                    args.args_type = one.python_type
-                })
-                frm.refresh_field('args');
+            if (!res.message || frm.doc.which_gx !== which) {
+                return;
+            }
+            res.message.rows.forEach(one => {
+                let args = frm.add_child('args')
+                args.args_name = one.args_name
+                args.args_type = one.python_type
+            })
+            frm.refresh_field('args');
+            if (res.message.next_idx) {
+                return load_page(res.message.next_idx);
             }
         })
+        load_page(null);
     }
 })
-
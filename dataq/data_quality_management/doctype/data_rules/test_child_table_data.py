@@ -0,0 +1,55 @@
+# Copyright (c) 2024, Tiger and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from dataq.data_quality_management.api import get_child_table_data
+
+
+class TestGetChildTableData(FrappeTestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		cls.gx_function = frappe.get_doc(
+			{
+				"doctype": "GX Function",
+				"function_name": f"_Test GX Function {frappe.generate_hash(length=6)}",
+				"args": [{"args_name": f"arg_{i}", "python_type": "str"} for i in range(1, 8)],
+			}
+		).insert()
+
+	def get(self, **kwargs):
+		return get_child_table_data("GX Function", self.gx_function.name, "args", **kwargs)
+
+	def test_unpaged_calls_get_every_row(self):
+		rows = self.get(fields=["args_name"])
+		self.assertIsInstance(rows, list)
+		self.assertEqual([(row.idx, row.args_name) for row in rows], [(i, f"arg_{i}") for i in range(1, 8)])
+
+	def test_keyset_pages(self):
+		names = []
+		after_idx = None
+		pages = 0
+		while True:
+			page = self.get(fields=["args_name"], after_idx=after_idx, page_length=3)
+			names.extend(row.args_name for row in page["rows"])
+			pages += 1
+			after_idx = page["next_idx"]
+			if not after_idx:
+				break
+		self.assertEqual(pages, 3)
+		self.assertEqual(names, [f"arg_{i}" for i in range(1, 8)])
+
+	def test_offset_page(self):
+		page = self.get(start=3, page_length=3)
+		self.assertEqual([row.idx for row in page["rows"]], [4, 5, 6])
+		self.assertEqual(page["next_idx"], 6)
+
+	def test_unknown_fields_are_dropped(self):
+		rows = self.get(fields=["args_name", "no_such_field"])
+		self.assertEqual(set(rows[0]), {"idx", "args_name"})
+
+	def test_not_a_table(self):
+		with self.assertRaises(frappe.ValidationError):
+			get_child_table_data("GX Function", self.gx_function.name, "description")
@@ -0,0 +1,81 @@
+# Copyright (c) 2024, Tiger and Contributors
+# See license.txt
+
+import frappe
+import pandas as pd
+from frappe.tests.utils import FrappeTestCase
+
+from dataq.data_quality_management.coercion import coerce_arg, coerce_frame, records_to_frame
+
+
+class TestCoerceArg(FrappeTestCase):
+	def test_declared_types(self):
+		for value, python_type, expected in (
+			("3", "int", 3),
+			("2.5", "int", 2.5),
+			("0.5", "float", 0.5),
+			("Yes", "bool", True),
+			("0", "bool", False),
+			("['Open', 'Closed']", "list", ["Open", "Closed"]),
+			("{'a': 1}", "dict", {"a": 1}),
+		):
+			with self.subTest(value=value, python_type=python_type):
+				self.assertEqual(coerce_arg(value, python_type), expected)
+
+	def test_strings_are_kept(self):
+		# free text that looks like a literal stays text when declared as one
+		self.assertEqual(coerce_arg("[1, 2]", "str"), "[1, 2]")
+		self.assertEqual(coerce_arg("1e3", "String"), "1e3")
+
+	def test_invalid_literal_throws(self):
+		with self.assertRaises(frappe.ValidationError):
+			coerce_arg("['Open'", "list")
+
+
+class TestCoerceFrame(FrappeTestCase):
+	def test_numeric_fields_are_converted(self):
+		df = coerce_frame(
+			"DocType",
+			pd.DataFrame({"max_attachments": ["1", "2", None], "istable": ["0", "1", "1"], "module": ["1", "2", "3"]}),
+		)
+
+		self.assertEqual(df["max_attachments"].dtype.kind, "f")
+		self.assertEqual(df["max_attachments"].tolist()[:2], [1, 2])
+		self.assertEqual(df["istable"].tolist(), [0, 1, 1])
+		# not a numeric field, left alone
+		self.assertEqual(df["module"].tolist(), ["1", "2", "3"])
+
+	def test_unparsable_values_are_kept(self):
+		df = coerce_frame("DocType", pd.DataFrame({"max_attachments": ["1", "many", None]}))
+		self.assertEqual(df["max_attachments"].tolist()[:2], [1, "many"])
+		self.assertIsNone(df["max_attachments"][2])
+
+
+class TestRecordsToFrame(FrappeTestCase):
+	def setUp(self):
+		self.record = {
+			"name": "Test DocType",
+			"max_attachments": "3",
+			"module": "10",
+			"fields": [{"fieldname": "qty", "reqd": "1", "length": "20"}],
+		}
+
+	def test_projected_columns_are_coerced(self):
+		df = records_to_frame("DocType", [self.record], ["max_attachments", "module", "fields"])
+
+		self.assertEqual(df.columns.tolist(), ["max_attachments", "module", "fields"])
+		self.assertEqual(df["max_attachments"][0], 3)
+		self.assertEqual(df["module"][0], "10")
+		child = df["fields"][0][0]
+		self.assertEqual((child["reqd"], child["length"]), (1, 20))
+		# the record itself is neither copied into nor changed
+		self.assertEqual(self.record["max_attachments"], "3")
+		self.assertEqual(self.record["fields"][0]["length"], "20")
+
+	def test_documents_and_every_column(self):
+		doc = frappe.get_doc({"doctype": "DocType", **self.record})
+		df = records_to_frame("DocType", [doc, self.record])
+
+		self.assertEqual(len(df), 2)
+		self.assertEqual(df["max_attachments"].tolist(), [3, 3])
+		self.assertEqual([rows[0]["length"] for rows in df["fields"]], [20, 20])
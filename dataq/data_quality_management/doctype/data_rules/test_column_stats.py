@@ -0,0 +1,49 @@
+# Copyright (c) 2024, Tiger and Contributors
+# See license.txt
+
+import numpy as np
+from frappe.tests.utils import FrappeTestCase
+
+from dataq.data_quality_management.column_stats import TDigest
+
+
+class TestTDigest(FrappeTestCase):
+	def test_quantiles(self):
+		values = np.random.default_rng(0).normal(100, 15, 50000)
+		digest = TDigest()
+		digest.add_many(values)
+
+		self.assertEqual(digest.count, len(values))
+		self.assertLess(len(digest.means), 500)
+		for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+			with self.subTest(q=q):
+				self.assertAlmostEqual(digest.quantile(q), np.quantile(values, q), delta=0.5)
+
+	def test_batches_match_one_pass(self):
+		values = np.random.default_rng(1).exponential(10, 20000)
+		digest = TDigest()
+		for start in range(0, len(values), 256):
+			digest.add_many(values[start : start + 256])
+
+		self.assertEqual(digest.count, len(values))
+		self.assertAlmostEqual(digest.quantile(0.5), np.median(values), delta=0.2)
+
+	def test_small_and_empty(self):
+		digest = TDigest()
+		self.assertIsNone(digest.quantile(0.5))
+		digest.add_many([])
+		self.assertIsNone(digest.quantile(0.5))
+		digest.add_many([7])
+		self.assertEqual(digest.quantile(0.5), 7)
+		digest.add_many([1, 3])
+		self.assertEqual(digest.quantile(0.5), 3)
+
+	def test_copy_is_independent(self):
+		digest = TDigest()
+		digest.add_many(range(100))
+		copied = digest.copy()
+		copied.add_many(range(1000, 1100))
+
+		self.assertEqual(digest.count, 100)
+		self.assertEqual(copied.count, 200)
+		self.assertAlmostEqual(digest.quantile(0.5), 49.5, delta=1)
@@ -0,0 +1,56 @@
+# Copyright (c) 2024, Tiger and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+import pandas as pd
+from frappe.tests.utils import FrappeTestCase
+
+from dataq.data_quality_management.columns import (
+	build_column_map,
+	get_multilingual_column_map,
+	rename_columns_to_fieldnames,
+)
+from dataq.data_quality_management.doctype.data_rules.test_data_rules import clear_rules, make_rule
+from dataq.data_quality_management.plan import compile_plan
+
+
+class TestColumnMap(FrappeTestCase):
+	def test_labels_and_fieldnames(self):
+		column_map = build_column_map("ToDo", "en")
+		self.assertEqual(column_map["Status"], "status")
+		self.assertEqual(column_map["status"], "status")
+		self.assertEqual(column_map["ID"], "name")
+
+	def test_child_table_headers(self):
+		column_map = build_column_map("DocType", "en")
+		# "Label (Table Label)", the way the Data Import template writes them
+		self.assertEqual(column_map["Label (Fields)"], "fields.label")
+		self.assertEqual(column_map["fields.label"], "fields.label")
+
+	def test_rename_columns_to_fieldnames(self):
+		df = rename_columns_to_fieldnames("ToDo", pd.DataFrame(columns=["Status", "priority", "Unknown"]))
+		self.assertEqual(df.columns.tolist(), ["status", "priority", "Unknown"])
+
+	def test_rule_languages(self):
+		default = frappe.db.get_default("lang") or "en"
+		with (
+			patch.dict(frappe.conf, {"dataq_rule_languages": ["de"]}),
+			patch(
+				"dataq.data_quality_management.columns.get_column_map",
+				side_effect=lambda doctype, lang: {"Header": lang},
+			) as get_column_map,
+		):
+			column_map = get_multilingual_column_map("ToDo")
+
+		self.assertEqual(
+			[call.args[1] for call in get_column_map.call_args_list], list(dict.fromkeys([default, "en", "de"]))
+		)
+		# the site default language wins clashes
+		self.assertEqual(column_map["Header"], default)
+
+	def test_rules_may_name_columns_by_label(self):
+		clear_rules()
+		make_rule("ExpectColumnValuesToNotBeNull", {"column": "Status"})
+		self.assertEqual(compile_plan("ToDo").columns, ["status"])
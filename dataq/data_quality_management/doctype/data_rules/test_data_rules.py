@@ -1,9 +1,98 @@
 # Copyright (c) 2024, Tiger and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from dataq.data_quality_management.plan import compile_plan, get_plan, has_rules, invalidate_plans
+
+
+def make_rule(which_gx, args, which_doctype="ToDo", enforcement="Blocking", is_enabled=1):
+	"""Insert a Data Rule and, when missing, its GX Function. Args are stored the way the form writes them"""
+	if not frappe.db.exists("GX Function", which_gx):
+		frappe.get_doc({"doctype": "GX Function", "function_name": which_gx}).insert()
+	return frappe.get_doc(
+		{
+			"doctype": "Data Rules",
+			"which_doctype": which_doctype,
+			"which_gx": which_gx,
+			"enforcement": enforcement,
+			"is_enabled": is_enabled,
+			"args": [
+				{
+					"args_name": name,
+					"args_type": type(value).__name__,
+					"args_value": value if isinstance(value, str) else repr(value),
+				}
+				for name, value in args.items()
+			],
+		}
+	).insert()
+
+
+def clear_rules(doctype="ToDo"):
+	"""Drop the rules a site may already have on `doctype`, rolled back with the test class"""
+	frappe.db.delete("Data Rules", {"which_doctype": doctype})
+	invalidate_plans()
+
 
 class TestDataRules(FrappeTestCase):
-	pass
+	def setUp(self):
+		clear_rules()
+
+	def test_compile_plan_coerces_args(self):
+		rule = make_rule(
+			"ExpectColumnValuesToBeInSet", {"column": "status", "value_set": ["Open", "Closed"], "mostly": 0.9}
+		)
+		plan = compile_plan("ToDo")
+
+		self.assertEqual([one.name for one in plan.rules], [rule.name])
+		compiled = plan.rules_by_name[rule.name]
+		self.assertEqual(compiled.which_gx, "ExpectColumnValuesToBeInSet")
+		self.assertEqual(compiled.args, {"column": "status", "value_set": ["Open", "Closed"], "mostly": 0.9})
+		self.assertEqual(plan.columns, ["status"])
+
+	def test_disabled_rules_are_left_out(self):
+		make_rule("ExpectColumnValuesToNotBeNull", {"column": "description"}, is_enabled=0)
+		self.assertFalse(compile_plan("ToDo"))
+
+	def test_get_plan_is_cached(self):
+		make_rule("ExpectColumnValuesToNotBeNull", {"column": "description"})
+		self.assertIs(get_plan("ToDo"), get_plan("ToDo"))
+
+	def test_rule_changes_invalidate_the_plan(self):
+		rule = make_rule("ExpectColumnValuesToBeInSet", {"column": "status", "value_set": ["Open"]})
+		plan = get_plan("ToDo")
+
+		rule.get("args", {"args_name": "value_set"})[0].args_value = repr(["Open", "Closed"])
+		rule.save()
+		changed = get_plan("ToDo")
+		self.assertIsNot(changed, plan)
+		self.assertEqual(changed.rules_by_name[rule.name].args["value_set"], ["Open", "Closed"])
+
+		rule.is_enabled = 0
+		rule.save()
+		self.assertFalse(get_plan("ToDo"))
+
+
+
+class TestHasRules(FrappeTestCase):
+	def setUp(self):
+		clear_rules()
+
+	def test_follows_rule_changes(self):
+		self.assertFalse(has_rules("ToDo"))
+
+		rule = make_rule("ExpectColumnValuesToNotBeNull", {"column": "description"})
+		self.assertTrue(has_rules("ToDo"))
+
+		rule.is_enabled = 0
+		rule.save()
+		self.assertFalse(has_rules("ToDo"))
+
+	def test_saves_without_rules_skip_the_plan(self):
+		with patch("dataq.data_quality_management.api.get_plan") as plan:
+			frappe.get_doc({"doctype": "ToDo", "description": "no rules"}).insert()
+		plan.assert_not_called()
@@ -0,0 +1,53 @@
+# Copyright (c) 2024, Tiger and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from dataq.data_quality_management import deferred, results
+from dataq.data_quality_management.doctype.data_rules.test_data_rules import clear_rules, make_rule
+
+
+class TestDeferred(FrappeTestCase):
+	def setUp(self):
+		clear_rules()
+		self.rule = make_rule(
+			"ExpectColumnValuesToBeInSet", {"column": "status", "value_set": ["Closed"]}, enforcement="Deferred"
+		)
+		frappe.flags.dataq_deferred = None
+		self.addCleanup(setattr, frappe.flags, "dataq_deferred", None)
+
+	def test_deferred_rules_do_not_block(self):
+		todo = frappe.get_doc({"doctype": "ToDo", "description": "deferred", "status": "Open"}).insert()
+		# queued for after the commit
+		self.assertEqual(frappe.flags.dataq_deferred, {"ToDo": {todo.name}})
+
+	def test_blocking_rules_still_block(self):
+		make_rule("ExpectColumnValuesToBeInSet", {"column": "priority", "value_set": ["High"]})
+		with self.assertRaises(frappe.ValidationError):
+			frappe.get_doc({"doctype": "ToDo", "description": "deferred", "priority": "Low"}).insert()
+
+	def test_queued_documents_are_validated_after_commit(self):
+		todo = frappe.get_doc({"doctype": "ToDo", "description": "deferred", "status": "Open"}).insert()
+		with patch("frappe.enqueue") as enqueue:
+			# what the commit of the save runs
+			deferred._push_deferred()
+		enqueue.assert_called_once()
+
+		# keep what the drain records out of the results store
+		for buffer in (results._metrics, results._failures):
+			buffer.pop(frappe.local.site, None)
+			self.addCleanup(buffer.pop, frappe.local.site, None)
+		with patch.object(frappe.db, "commit"):
+			deferred.run_deferred_validations()
+		self.assertIn(
+			("ToDo", todo.name, self.rule.name, "ExpectColumnValuesToBeInSet", "Deferred"),
+			results._failures.get(frappe.local.site, []),
+		)
+
+		# drained, the scheduler has nothing to enqueue
+		with patch("frappe.enqueue") as enqueue:
+			deferred.enqueue_deferred_validations()
+		enqueue.assert_not_called()
@@ -0,0 +1,105 @@
+# Copyright (c) 2024, Tiger and Contributors
+# See license.txt
+
+import pandas as pd
+from frappe.tests.utils import FrappeTestCase
+
+from dataq.data_quality_management.engine import (
+	RuleOutcome,
+	ValidationOutcome,
+	merge_outcomes,
+	run_native,
+)
+from dataq.data_quality_management.gx_runtime import run_gx_rules
+from dataq.data_quality_management.plan import CompiledRule
+
+FRAME = pd.DataFrame(
+	{
+		"code": ["A-1", "A-2", None, "B-1", "A-2", "a-3"],
+		"status": ["Open", "Closed", "Open", "Draft", None, "Open"],
+		"qty": [1, 5, 10, None, 50, -1],
+		"note": ["ok", "", "a longer note", None, "x", "ok"],
+	}
+)
+
+# (which_gx, args) evaluated by both engines over FRAME
+FIXTURES = [
+	("ExpectColumnValuesToNotBeNull", {"column": "code"}),
+	("ExpectColumnValuesToNotBeNull", {"column": "code", "mostly": 0.8}),
+	("ExpectColumnValuesToBeNull", {"column": "note"}),
+	("ExpectColumnValuesToBeInSet", {"column": "status", "value_set": ["Open", "Closed"]}),
+	("ExpectColumnValuesToBeInSet", {"column": "status", "value_set": ["Open", "Closed"], "mostly": 0.7}),
+	("ExpectColumnValuesToNotBeInSet", {"column": "status", "value_set": ["Draft"]}),
+	("ExpectColumnValuesToBeBetween", {"column": "qty", "min_value": 0, "max_value": 10}),
+	("ExpectColumnValuesToBeBetween", {"column": "qty", "min_value": 1, "strict_min": True}),
+	("ExpectColumnValuesToMatchRegex", {"column": "code", "regex": r"^[A-Z]-\d$"}),
+	("ExpectColumnValuesToNotMatchRegex", {"column": "code", "regex": r"^B"}),
+	("ExpectColumnValueLengthsToBeBetween", {"column": "note", "min_value": 1, "max_value": 5}),
+	("ExpectColumnValueLengthsToEqual", {"column": "code", "value": 3}),
+	("ExpectColumnValuesToBeUnique", {"column": "code"}),
+]
+
+
+def compile_rules(fixtures):
+	return [CompiledRule(f"test-rule-{i}", which_gx, dict(args)) for i, (which_gx, args) in enumerate(fixtures)]
+
+
+class TestRunNative(FrappeTestCase):
+	def test_matches_gx(self):
+		rules = compile_rules(FIXTURES)
+		native = {one.rule.name: one for one in run_native(rules, FRAME).results}
+		gx = {one.rule.name: one for one in run_gx_rules(rules, FRAME).results}
+
+		for rule in rules:
+			with self.subTest(rule=rule.which_gx, args=rule.args):
+				self.assertIsNone(native[rule.name].exception)
+				self.assertEqual(native[rule.name].success, gx[rule.name].success)
+				self.assertEqual(
+					sorted(native[rule.name].unexpected_index), sorted(gx[rule.name].unexpected_index)
+				)
+
+	def test_missing_column_fails(self):
+		rule = compile_rules([("ExpectColumnValuesToNotBeNull", {"column": "missing"})])[0]
+		one = run_native([rule], FRAME).results[0]
+		self.assertIsInstance(one.exception, KeyError)
+		self.assertFalse(one.success)
+
+
+class TestMergeOutcomes(FrappeTestCase):
+	def test_row_local_rules_add_up(self):
+		rule = compile_rules([("ExpectColumnValuesToNotBeNull", {"column": "code"})])[0]
+		first, second = FRAME.iloc[:3], FRAME.iloc[3:]
+		merged = merge_outcomes([run_native([rule], first), run_native([rule], second)])
+		whole = run_native([rule], FRAME)
+
+		self.assertEqual(merged.results[0].unexpected_index, whole.results[0].unexpected_index)
+		self.assertEqual(merged.results[0].element_count, whole.results[0].element_count)
+		self.assertEqual(merged.success, whole.success)
+
+	def test_mostly_is_applied_to_the_merged_counts(self):
+		rule = compile_rules([("ExpectColumnValuesToNotBeNull", {"column": "code", "mostly": 0.8})])[0]
+		# the chunk holding the null fails on its own, the whole frame passes
+		merged = merge_outcomes([run_native([rule], FRAME.iloc[:3]), run_native([rule], FRAME.iloc[3:])])
+		self.assertTrue(merged.success)
+
+	def test_failure_without_rows_stays_a_failure(self):
+		rule = compile_rules([("ExpectColumnValuesToBeInSet", {"column": "status", "value_set": ["Open"]})])[0]
+		merged = merge_outcomes(
+			[
+				ValidationOutcome([RuleOutcome(rule, [], 3)]),
+				ValidationOutcome([RuleOutcome(rule, exception=TypeError("unhashable"))]),
+			]
+		)
+		self.assertFalse(merged.success)
+		self.assertIsInstance(merged.results[0].exception, TypeError)
+
+	def test_whole_column_rules_are_not_merged(self):
+		rule = compile_rules([("ExpectColumnValuesToBeUnique", {"column": "code"})])[0]
+		# each half is unique on its own, the frame is not
+		outcomes = [run_native([rule], FRAME.iloc[:3]), run_native([rule], FRAME.iloc[3:])]
+		with self.assertRaises(ValueError):
+			merge_outcomes(outcomes)
+
+		merged = merge_outcomes([run_native([rule], FRAME)])
+		self.assertFalse(merged.success)
+		self.assertEqual(sorted(merged.results[0].unexpected_index), [1, 4])
@@ -0,0 +1,112 @@
+# Copyright (c) 2024, Tiger and Contributors
+# See license.txt
+
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+import frappe
+import pandas as pd
+from frappe.tests.utils import FrappeTestCase
+
+from dataq.data_quality_management.api import prevalidated, unresolved_rules, validate_dataframe
+from dataq.data_quality_management.doctype.data_rules.test_data_rules import clear_rules, make_rule
+from dataq.util import import_from_dataframe_to_document, stream_import_file_to_document
+
+
+class TestValidateDataFrame(FrappeTestCase):
+	def setUp(self):
+		clear_rules()
+		self.rule = make_rule("ExpectColumnValuesToBeInSet", {"column": "status", "value_set": ["Closed"]})
+
+	def test_failing_rows_by_label(self):
+		df = pd.DataFrame({"Description": ["a", "b", "c"], "Status": ["Closed", "Open", "Closed"]})
+		outcome = validate_dataframe("ToDo", df)
+
+		self.assertFalse(outcome.success)
+		self.assertEqual(outcome.failures_by_row(), {1: [self.rule.name]})
+		self.assertEqual(unresolved_rules(outcome), set())
+
+	def test_missing_column_is_unresolved(self):
+		outcome = validate_dataframe("ToDo", pd.DataFrame({"Description": ["a"]}))
+
+		self.assertFalse(outcome.success)
+		self.assertEqual(outcome.failures_by_row(), {})
+		self.assertEqual(unresolved_rules(outcome), {self.rule.name})
+
+	def test_prevalidated_skips_resolved_rules_on_save(self):
+		outcome = validate_dataframe("ToDo", pd.DataFrame({"Description": ["a"], "Status": ["Closed"]}))
+		with prevalidated("ToDo", outcome):
+			# only the frame was checked, the document itself is not validated again
+			frappe.get_doc({"doctype": "ToDo", "description": "a", "status": "Open"}).insert()
+
+	def test_prevalidated_keeps_unresolved_rules_on_save(self):
+		outcome = validate_dataframe("ToDo", pd.DataFrame({"Description": ["a"]}))
+		with prevalidated("ToDo", outcome), self.assertRaises(frappe.ValidationError):
+			frappe.get_doc({"doctype": "ToDo", "description": "a", "status": "Open"}).insert()
+
+
+class TestImportFromDataFrame(FrappeTestCase):
+	def setUp(self):
+		clear_rules()
+		self.rule = make_rule("ExpectColumnValuesToBeInSet", {"column": "status", "value_set": ["Open", "Closed"]})
+
+	def test_failing_rows_are_skipped_and_logged(self):
+		# a repeated index label must not drop or log the wrong rows
+		df = pd.DataFrame(
+			{"Description": ["a", "b", "c"], "Status": ["Open", "Draft", "Closed"]}, index=[0, 0, 1]
+		)
+		with patch("frappe.core.doctype.data_import.importer.Importer") as importer:
+			import_from_dataframe_to_document("ToDo", df)
+
+		parse = importer.return_value.parse_data_from_template
+		self.assertEqual(parse.call_args.kwargs["raw_data"]["data"], [["a", "Open"], ["c", "Closed"]])
+
+		logs = frappe.get_all(
+			"Data Import Log",
+			filters={"data_import": parse.call_args.kwargs["data_import"].name},
+			fields=["row_indexes", "messages"],
+		)
+		self.assertEqual(len(logs), 1)
+		self.assertEqual(json.loads(logs[0].row_indexes), [3])
+		self.assertIn(self.rule.name, logs[0].messages)
+
+
+class TestStreamImport(FrappeTestCase):
+	def setUp(self):
+		clear_rules()
+		make_rule("ExpectColumnValuesToBeInSet", {"column": "status", "value_set": ["Open", "Closed"]})
+		self.prefix = frappe.generate_hash(length=10)
+
+	def write_csv(self, statuses):
+		with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+			pd.DataFrame(
+				{"Description": [f"{self.prefix}-{i}" for i in range(len(statuses))], "Status": statuses}
+			).to_csv(f, index=False)
+		self.addCleanup(os.remove, f.name)
+		return f.name
+
+	def imported(self):
+		return frappe.get_all(
+			"ToDo", filters={"description": ("like", f"{self.prefix}-%")}, pluck="description", order_by="description"
+		)
+
+	def test_failing_rows_are_skipped(self):
+		path = self.write_csv(["Open", "Draft", "Closed", "Draft", "Open"])
+		# each chunk is committed, keep the rows inside the test transaction
+		with patch.object(frappe.db, "commit"):
+			result = stream_import_file_to_document("ToDo", path, chunk_size=2)
+
+		self.assertEqual(result, {"imported": 3, "failed": 2})
+		self.assertEqual(self.imported(), [f"{self.prefix}-{i}" for i in (0, 2, 4)])
+
+	def test_unresolved_rules_run_on_save(self):
+		# no Priority column in the file, the rule is checked on each insert instead
+		make_rule("ExpectColumnValuesToBeInSet", {"column": "priority", "value_set": ["High"]})
+		path = self.write_csv(["Open", "Closed"])
+		with patch.object(frappe.db, "commit"):
+			result = stream_import_file_to_document("ToDo", path, chunk_size=2)
+
+		self.assertEqual(result, {"imported": 0, "failed": 2})
+		self.assertEqual(self.imported(), [])
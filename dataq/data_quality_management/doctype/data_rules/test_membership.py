@@ -0,0 +1,31 @@
+# Copyright (c) 2024, Tiger and Contributors
+# See license.txt
+
+from frappe.tests.utils import FrappeTestCase
+
+from dataq.data_quality_management.membership import BloomFilter
+
+
+class TestBloomFilter(FrappeTestCase):
+	def test_no_false_negatives(self):
+		values = [f"CUST-{i:06d}" for i in range(20000)] + list(range(5000))
+		bloom = BloomFilter(len(values), error_rate=0.001)
+		bloom.add_many(values)
+
+		self.assertTrue(bloom.contains_many(values).all())
+		self.assertIn("CUST-000042", bloom)
+		self.assertIn(42, bloom)
+
+	def test_false_positive_rate(self):
+		bloom = BloomFilter(10000, error_rate=0.01)
+		bloom.add_many([f"member-{i}" for i in range(10000)])
+
+		found = bloom.contains_many([f"outsider-{i}" for i in range(20000)])
+		# the expected rate is 1%, allow for chance
+		self.assertLess(found.mean(), 0.02)
+
+	def test_empty(self):
+		bloom = BloomFilter(0)
+		bloom.add_many([])
+		self.assertEqual(len(bloom.contains_many([])), 0)
+		self.assertNotIn("anything", bloom)
@@ -0,0 +1,63 @@
+# Copyright (c) 2024, Tiger and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from dataq.data_quality_management.doctype.data_rules.test_data_rules import clear_rules, make_rule
+from dataq.data_quality_management.pushdown import validate_table
+
+# (which_gx, args) the SQL and the in-memory paths must agree on
+FIXTURES = [
+	("ExpectColumnValuesToNotBeNull", {"column": "allocated_to"}),
+	("ExpectColumnValuesToBeInSet", {"column": "status", "value_set": ["Open", "Closed"]}),
+	("ExpectColumnValuesToNotBeInSet", {"column": "priority", "value_set": ["Low"]}),
+	("ExpectColumnValueLengthsToBeBetween", {"column": "description", "min_value": 1, "max_value": 20}),
+	("ExpectColumnValuesToMatchRegex", {"column": "description", "regex": "^[0-9]"}),
+	("ExpectColumnValuesToBeUnique", {"column": "description"}),
+]
+
+
+class TestPushdown(FrappeTestCase):
+	def setUp(self):
+		clear_rules()
+		prefix = frappe.generate_hash(length=8)
+		self.todos = [
+			frappe.get_doc({"doctype": "ToDo", "description": description, "status": status}).insert()
+			for description, status in (
+				(f"{prefix}-twice", "Open"),
+				(f"{prefix}-twice", "Closed"),
+				(f"1-{prefix}-a description longer than the rule allows", "Cancelled"),
+			)
+		]
+		self.rules = [make_rule(which_gx, args) for which_gx, args in FIXTURES]
+
+	def validate(self, pushdown, chunk_size=None):
+		with patch.dict(frappe.conf, {"dataq_pushdown": pushdown}):
+			outcome = validate_table("ToDo", sample_size=1000, chunk_size=chunk_size)
+		return {one.rule.name: one for one in outcome.results}
+
+	def test_matches_in_memory(self):
+		with patch("dataq.data_quality_management.pushdown.validate_in_chunks") as in_memory:
+			pushed = self.validate(1)
+		in_memory.assert_not_called()
+		memory = self.validate(0)
+
+		for rule in self.rules:
+			with self.subTest(rule=rule.which_gx):
+				self.assertEqual(pushed[rule.name].success, memory[rule.name].success)
+				self.assertEqual(pushed[rule.name].unexpected_count, memory[rule.name].unexpected_count)
+				self.assertEqual(pushed[rule.name].element_count, memory[rule.name].element_count)
+				# the SQL path keeps a sample of the failing names
+				self.assertLessEqual(
+					set(pushed[rule.name].unexpected_index), set(memory[rule.name].unexpected_index)
+				)
+
+	def test_whole_column_rules_span_chunks(self):
+		unique = self.rules[-1].name
+		# one row per chunk, the duplicates are still found
+		memory = self.validate(0, chunk_size=1)
+		self.assertLessEqual({todo.name for todo in self.todos[:2]}, set(memory[unique].unexpected_index))
+		self.assertNotIn(self.todos[2].name, memory[unique].unexpected_index)
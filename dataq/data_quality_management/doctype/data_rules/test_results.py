@@ -0,0 +1,64 @@
+# Copyright (c) 2024, Tiger and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from dataq.data_quality_management import results
+from dataq.data_quality_management.doctype.data_rules.test_data_rules import clear_rules, make_rule
+from dataq.data_quality_management.engine import RuleOutcome, ValidationOutcome
+from dataq.data_quality_management.plan import get_plan
+
+
+def drain():
+	# the drain commits after each batch, keep its writes inside the test transaction
+	with patch.object(frappe.db, "commit"):
+		results.drain_results()
+
+
+class TestResults(FrappeTestCase):
+	def setUp(self):
+		clear_rules()
+		self.rule = make_rule("ExpectColumnValuesToBeInSet", {"column": "status", "value_set": ["Closed"]})
+		self.outcome = ValidationOutcome([RuleOutcome(get_plan("ToDo").rules[0], [1], 3)])
+		# whatever earlier runs left in Redis
+		results.flush_results()
+		drain()
+
+	def get_metric(self):
+		return frappe.get_all(
+			"Data Quality Metric",
+			filters={"data_rule": self.rule.name, "source": "Batch"},
+			fields=["evaluated", "failed", "failed_runs"],
+		)
+
+	def test_drain_writes_failures_and_rollups(self):
+		results.record_outcome("ToDo", self.outcome, "Batch", names=["a", "b", "c"])
+		results.record_outcome("ToDo", self.outcome, "Batch", names=["d", "e", "f"])
+		# nothing is written before the drain
+		results.flush_results()
+		self.assertFalse(frappe.db.exists("Data Quality Failure", {"data_rule": self.rule.name}))
+
+		drain()
+		failures = frappe.get_all(
+			"Data Quality Failure",
+			filters={"data_rule": self.rule.name},
+			pluck="document_name",
+			order_by="document_name",
+		)
+		self.assertEqual(failures, ["b", "e"])
+		self.assertEqual(self.get_metric(), [{"evaluated": 6, "failed": 2, "failed_runs": 2}])
+
+	def test_rollups_add_up_across_drains(self):
+		for _ in range(2):
+			results.record_outcome("ToDo", self.outcome, "Batch", names=["a", "b", "c"])
+			results.flush_results()
+			drain()
+		self.assertEqual(self.get_metric(), [{"evaluated": 6, "failed": 2, "failed_runs": 2}])
+
+	def test_disabled(self):
+		with patch.dict(frappe.conf, {"dataq_results_enabled": 0}):
+			results.record_outcome("ToDo", self.outcome, "Batch")
+		self.assertNotIn(frappe.local.site, results._metrics)
@@ -0,0 +1,61 @@
+# Copyright (c) 2024, Tiger and Contributors
+# See license.txt
+
+from frappe.tests.utils import FrappeTestCase
+
+from dataq.data_quality_management.plan import CompiledRule
+from dataq.data_quality_management.sampling import (
+	allocate,
+	estimate_rate,
+	sample_size,
+	tolerance,
+	wilson_interval,
+)
+
+
+class TestSampling(FrappeTestCase):
+	def test_sample_size(self):
+		# Cochran's 9604 rows at 95% and 1%, less the finite population correction
+		self.assertEqual(sample_size(1000000), 9513)
+		self.assertEqual(sample_size(1000), 906)
+		self.assertEqual(sample_size(100), 99)
+		self.assertEqual(sample_size(1000000, confidence=0.99, margin=0.02), 4130)
+		self.assertEqual(sample_size(0), 0)
+
+	def test_allocate(self):
+		allocation = allocate({"a": 9900, "b": 90, "c": 10}, 1000, minimum=30)
+		self.assertEqual(allocation, {"a": 990, "b": 30, "c": 10})
+
+	def test_wilson_interval(self):
+		low, high = wilson_interval(10, 100)
+		self.assertAlmostEqual(low, 0.0552, places=4)
+		self.assertAlmostEqual(high, 0.1744, places=4)
+
+		low, high = wilson_interval(0, 1000)
+		self.assertAlmostEqual(low, 0.0)
+		self.assertAlmostEqual(high, 0.0038, places=4)
+
+		self.assertEqual(wilson_interval(0, 0), (0.0, 1.0))
+
+	def test_estimate_rate(self):
+		# one stratum is a plain Wilson interval
+		rate, low, high = estimate_rate([(100000, 100, 10)])
+		self.assertEqual(rate, 0.1)
+		self.assertEqual((low, high), wilson_interval(10, 100))
+
+		# strata weigh by their share of the rows, not of the sample
+		rate, low, high = estimate_rate([(9000, 100, 0), (1000, 100, 50)])
+		self.assertAlmostEqual(rate, 0.05)
+		self.assertLess(low, rate)
+		self.assertGreater(high, rate)
+
+		# every row of every stratum sampled: no uncertainty left
+		rate, low, high = estimate_rate([(10, 10, 1), (20, 20, 4)])
+		self.assertAlmostEqual(rate, 5 / 30)
+		self.assertEqual((low, high), (rate, rate))
+
+		self.assertEqual(estimate_rate([]), (0.0, 0.0, 1.0))
+
+	def test_tolerance(self):
+		rule = CompiledRule("test-rule", "ExpectColumnValuesToNotBeNull", {"column": "code", "mostly": 0.95})
+		self.assertAlmostEqual(tolerance(rule), 0.05)
@@ -0,0 +1,49 @@
+# Copyright (c) 2024, Tiger and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from dataq.data_quality_management.doctype.data_rules.test_data_rules import clear_rules, make_rule
+from dataq.data_quality_management.plan import get_plan
+from dataq.data_quality_management.table_checks import probe_rules
+
+
+class TestTableChecks(FrappeTestCase):
+	def setUp(self):
+		clear_rules()
+		self.description = f"unique {frappe.generate_hash(length=10)}"
+
+	def insert_todo(self, **kwargs):
+		return frappe.get_doc({"doctype": "ToDo", "description": self.description, **kwargs}).insert()
+
+	def test_duplicate_blocks_the_save(self):
+		make_rule("ExpectColumnValuesToBeUnique", {"column": "description"})
+		with patch.dict(frappe.conf, {"dataq_probe_unindexed": 1}):
+			todo = self.insert_todo()
+			with self.assertRaises(frappe.ValidationError):
+				self.insert_todo()
+
+			# the stored row of the document itself is not a duplicate
+			outcome = probe_rules("ToDo", get_plan("ToDo").rules, [todo])
+			self.assertTrue(outcome.success)
+
+	def test_unindexed_columns_are_not_probed(self):
+		make_rule("ExpectColumnValuesToBeUnique", {"column": "description"})
+		with patch.dict(frappe.conf, {"dataq_probe_unindexed": 0}):
+			self.insert_todo()
+			# left to the scans, a save never reads an unindexed column of the whole table
+			self.insert_todo()
+
+	def test_membership_in_a_source_doctype(self):
+		make_rule("ExpectColumnValuesToBeInSet", {"column": "allocated_to", "value_set_source": "User"})
+		outcome = probe_rules(
+			"ToDo",
+			get_plan("ToDo").rules,
+			[{"allocated_to": "Administrator"}, {"allocated_to": None}, {"allocated_to": "nobody@example.com"}],
+		)
+		self.assertFalse(outcome.success)
+		self.assertEqual(outcome.results[0].unexpected_index, [2])
+		self.assertEqual(outcome.results[0].element_count, 2)
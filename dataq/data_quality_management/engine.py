@@ -0,0 +1,349 @@
+"""
+Native expectation engine.
+
+Evaluates the common GX column expectations directly with vectorized pandas / NumPy
+operations, following GX semantics: nulls are outside the domain of every expectation
+except the null checks themselves, `mostly` is the minimum passing ratio of that
+domain, and an expectation that raises is reported as failed.
+
+This module does not import frappe, so it can run inside plain worker processes.
+"""
+
+import re
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+_COLUMN_ARGS = {"column", "mostly"}
+
+_TYPES = {
+    "int": (int, np.integer),
+    "int32": (np.int32,),
+    "int64": (int, np.int64),
+    "integer": (int, np.integer),
+    "float": (float, np.floating),
+    "float32": (np.float32,),
+    "float64": (float, np.float64),
+    "str": (str,),
+    "string": (str,),
+    "object": (object,),
+    "bool": (bool, np.bool_),
+    "boolean": (bool, np.bool_),
+    "dict": (dict,),
+    "list": (list,),
+    "datetime": (pd.Timestamp, np.datetime64),
+    "datetime64": (pd.Timestamp, np.datetime64),
+    "date": (pd.Timestamp, np.datetime64),
+}
+
+_DTYPE_KINDS = {
+    "int": "iu",
+    "int32": "iu",
+    "int64": "iu",
+    "integer": "iu",
+    "float": "f",
+    "float32": "f",
+    "float64": "f",
+    "bool": "b",
+    "boolean": "b",
+    "datetime": "M",
+    "datetime64": "M",
+    "date": "M",
+}
+
+
+def _not_null(series, rule):
+    return series.isna().to_numpy()
+
+
+def _null(series, rule):
+    return series.notna().to_numpy()
+
+
+def _in_set(series, rule):
+    members = rule.cache.get("members")
+    if members is not None:
+        # sourced from a DocType field, see `membership.py`
+        return ~members.contains_many(series.to_numpy(dtype=object))
+    value_set = rule.args["value_set"]
+    if len(series) <= 8:
+        # a handful of rows, e.g. a single document: hash lookups beat building a pandas hashtable
+        lookup = rule.cache.get("value_set")
+        if lookup is None:
+            try:
+                lookup = rule.cache["value_set"] = frozenset(value_set)
+            except TypeError:
+                lookup = rule.cache["value_set"] = False
+        if lookup is not False:
+            return np.fromiter((value not in lookup for value in series), bool, len(series))
+    return ~series.isin(value_set).to_numpy()
+
+
+def _not_in_set(series, rule):
+    return ~_in_set(series, rule)
+
+
+def _bounds(values, args):
+    min_value = args.get("min_value")
+    max_value = args.get("max_value")
+    if min_value is None and max_value is None:
+        raise ValueError("min_value and max_value cannot both be None")
+    unexpected = np.zeros(len(values), dtype=bool)
+    if min_value is not None:
+        unexpected |= (values <= min_value) if args.get("strict_min") else (values < min_value)
+    if max_value is not None:
+        unexpected |= (values >= max_value) if args.get("strict_max") else (values > max_value)
+    return np.asarray(unexpected, dtype=bool)
+
+
+def _between(series, rule):
+    return _bounds(series.to_numpy(), rule.args)
+
+
+def _match_regex(series, rule):
+    return ~series.astype(str).str.contains(rule.args["regex"], regex=True).to_numpy(dtype=bool)
+
+
+def _not_match_regex(series, rule):
+    return series.astype(str).str.contains(rule.args["regex"], regex=True).to_numpy(dtype=bool)
+
+
+def _lengths_between(series, rule):
+    return _bounds(series.astype(str).str.len().to_numpy(), rule.args)
+
+
+def _lengths_equal(series, rule):
+    return series.astype(str).str.len().to_numpy() != rule.args["value"]
+
+
+def _of_type(series, rule):
+    type_ = rule.args["type_"]
+    kinds = _DTYPE_KINDS.get(type_)
+    if series.dtype.kind != "O":
+        return np.full(len(series), series.dtype.kind not in (kinds or ""), dtype=bool)
+    types = _TYPES[type_]
+    unexpected = np.fromiter((not isinstance(value, types) for value in series), bool, len(series))
+    if type_ in ("int", "int64", "integer"):
+        # bool is a subclass of int, GX does not treat it as one
+        unexpected |= np.fromiter((isinstance(value, bool) for value in series), bool, len(series))
+    return unexpected
+
+
+def _unique(series, rule):
+    return series.duplicated(keep=False).to_numpy()
+
+
+# expectation -> (evaluator, accepted args, whether nulls are part of the domain)
+NATIVE_EXPECTATIONS = {
+    "ExpectColumnValuesToNotBeNull": (_not_null, set(), True),
+    "ExpectColumnValuesToBeNull": (_null, set(), True),
+    "ExpectColumnValuesToBeInSet": (_in_set, {"value_set"}, False),
+    "ExpectColumnValuesToNotBeInSet": (_not_in_set, {"value_set"}, False),
+    "ExpectColumnValuesToBeBetween": (
+        _between,
+        {"min_value", "max_value", "strict_min", "strict_max"},
+        False,
+    ),
+    "ExpectColumnValuesToMatchRegex": (_match_regex, {"regex"}, False),
+    "ExpectColumnValuesToNotMatchRegex": (_not_match_regex, {"regex"}, False),
+    "ExpectColumnValueLengthsToBeBetween": (
+        _lengths_between,
+        {"min_value", "max_value", "strict_min", "strict_max"},
+        False,
+    ),
+    "ExpectColumnValueLengthsToEqual": (_lengths_equal, {"value"}, False),
+    "ExpectColumnValuesToBeOfType": (_of_type, {"type_"}, False),
+    "ExpectColumnValuesToBeUnique": (_unique, set(), False),
+}
+
+
+# expectations GX also evaluates row by row, so a frame can be split by rows for them
+ROW_LOCAL_EXPECTATIONS = {
+    name for name in NATIVE_EXPECTATIONS if name != "ExpectColumnValuesToBeUnique"
+} | {
+    "ExpectColumnValuesToBeInTypeList",
+    "ExpectColumnValuesToBeDateutilParseable",
+    "ExpectColumnValuesToBeJsonParseable",
+    "ExpectColumnValuesToMatchJsonSchema",
+    "ExpectColumnValuesToMatchLikePattern",
+    "ExpectColumnValuesToMatchLikePatternList",
+    "ExpectColumnValuesToMatchRegexList",
+    "ExpectColumnValuesToMatchStrftimeFormat",
+    "ExpectColumnValuesToNotMatchLikePattern",
+    "ExpectColumnValuesToNotMatchLikePatternList",
+    "ExpectColumnValuesToNotMatchRegexList",
+    "ExpectColumnPairValuesToBeEqual",
+    "ExpectColumnPairValuesToBeInSet",
+    "ExpectColumnPairValuesAToBeGreaterThanB",
+    "ExpectMulticolumnSumToEqual",
+}
+
+
+def is_row_local(rule):
+    """Whether a rule looks at each row on its own, as opposed to the whole column or table"""
+    return rule.which_gx in ROW_LOCAL_EXPECTATIONS
+
+
+def is_supported(rule):
+    """Whether the native engine can evaluate a rule with GX semantics"""
+    spec = NATIVE_EXPECTATIONS.get(rule.which_gx)
+    if spec is None or "column" not in rule.args:
+        return False
+    _, accepted, _ = spec
+    if not set(rule.args) <= _COLUMN_ARGS | accepted:
+        return False
+    if rule.which_gx == "ExpectColumnValuesToBeOfType" and rule.args.get("type_") not in _TYPES:
+        return False
+    if "regex" in rule.args:
+        try:
+            re.compile(rule.args["regex"])
+        except (re.error, TypeError):
+            return False
+    return True
+
+
+class RuleOutcome:
+    """Result of one rule over one frame"""
+
+    def __init__(
+        self, rule, unexpected_index=None, element_count=0, exception=None, success=None, unexpected_count=None
+    ):
+        self.rule = rule
+        # seconds spent evaluating, set by `run_native`
+        self.duration = None
+        self.unexpected_index = [] if unexpected_index is None else unexpected_index
+        self.element_count = element_count
+        self.exception = exception
+        # given when `unexpected_index` is only a sample of the unexpected rows
+        self._unexpected_count = unexpected_count
+        if success is None:
+            success = exception is None and _mostly_passes(
+                element_count, self.unexpected_count, rule.args.get("mostly")
+            )
+        self.success = success
+
+    @property
+    def unexpected_count(self):
+        if self._unexpected_count is not None:
+            return self._unexpected_count
+        return len(self.unexpected_index)
+
+    def __repr__(self):
+        return f"<RuleOutcome {self.rule.name} success={self.success} unexpected={self.unexpected_count}>"
+
+
+class ValidationOutcome:
+    """Result of a rule set over one frame, with failures traceable to their Data Rules"""
+
+    def __init__(self, results):
+        self.results = results
+        self.success = all(one.success for one in results)
+
+    def failed_rules(self):
+        """list of (data rule name, gx function name), the shape `throw_failures` expects"""
+        return [(one.rule.name, one.rule.which_gx) for one in self.results if not one.success]
+
+    def failures_by_row(self):
+        """{row index: [data rule names]} of the failing rows"""
+        rows = {}
+        for one in self.results:
+            if one.success:
+                continue
+            for index in one.unexpected_index:
+                rows.setdefault(index, []).append(one.rule.name)
+        return rows
+
+
+def _mostly_passes(element_count, unexpected_count, mostly=None):
+    if not element_count:
+        return True
+    if mostly is None:
+        return unexpected_count == 0
+    return (element_count - unexpected_count) / element_count >= mostly
+
+
+def evaluate_rule(rule, df):
+    """
+    Evaluate one supported rule against a DataFrame
+
+    :return
+        RuleOutcome with the index labels of the unexpected rows
+    """
+    evaluator, _, nulls_in_domain = NATIVE_EXPECTATIONS[rule.which_gx]
+    column = rule.args["column"]
+    if column not in df:
+        return RuleOutcome(rule, exception=KeyError(column))
+
+    series = df[column]
+    if not nulls_in_domain:
+        series = series[series.notna().to_numpy()]
+    try:
+        unexpected = evaluator(series, rule)
+    except (TypeError, ValueError, re.error) as e:
+        return RuleOutcome(rule, exception=e)
+
+    return RuleOutcome(rule, series.index[unexpected].tolist(), len(series))
+
+
+def run_native(rules, df):
+    """
+    Evaluate supported rules against a DataFrame
+
+    :param
+        rules: CompiledRule list, every rule must pass `is_supported`
+        df: pd.DataFrame
+
+    :return
+        ValidationOutcome
+    """
+    results = []
+    for rule in rules:
+        start = perf_counter()
+        one = evaluate_rule(rule, df)
+        one.duration = perf_counter() - start
+        results.append(one)
+    return ValidationOutcome(results)
+
+
+def merge_outcomes(outcomes):
+    """
+    Merge the outcomes of disjoint row chunks into one outcome per rule.
+
+    Only valid for row-local rules, or for rules each evaluated in a single outcome: a
+    rule over the whole column merged across outcomes raises a ValueError.
+    """
+    merged = {}
+    for outcome in outcomes:
+        for one in outcome.results:
+            previous = merged.get(one.rule.name)
+            if previous is None:
+                merged[one.rule.name] = one
+                continue
+            if not is_row_local(one.rule):
+                raise ValueError(f"{one.rule.which_gx} of Data Rule {one.rule.name} cannot be merged across chunks")
+            success = None
+            if any(not side.success and not side.unexpected_count for side in (previous, one)):
+                # a failure without rows to recount, e.g. an aggregate, stays a failure
+                success = False
+            combined = RuleOutcome(
+                one.rule,
+                previous.unexpected_index + one.unexpected_index,
+                previous.element_count + one.element_count,
+                previous.exception or one.exception,
+                success=success,
+                unexpected_count=previous.unexpected_count + one.unexpected_count,
+            )
+            if previous.duration is not None and one.duration is not None:
+                combined.duration = previous.duration + one.duration
+            merged[one.rule.name] = combined
+    return ValidationOutcome(list(merged.values()))
+
+
+def iter_chunks(df, chunk_size=None):
+    """Row chunks of a DataFrame, the whole frame when no chunk size is given"""
+    if not chunk_size or len(df) <= chunk_size:
+        yield df
+        return
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start : start + chunk_size]
@@ -0,0 +1,226 @@
+"""
+Great Expectations runtime used by `gx_validate`.
+
+Each worker process keeps one ephemeral Data Context, created lazily. Suites and
+validation definitions are registered once per DocType, rules version and subset of the
+rules, and reused; a run only binds a new DataFrame through batch parameters.
+"""
+
+import hashlib
+import threading
+
+import frappe
+
+DATA_SOURCE_NAME = "dataq_pandas"
+
+_gx = None
+_context = None
+_lock = threading.RLock()
+
+# {(site, doctype): (rules version, {rule subset: (validation definition, run lock)})}
+_definitions = {}
+
+# rule subsets registered per DocType, the oldest one is dropped past this
+MAX_SUBSETS = 32
+
+# {(site, doctype): batch definition}, kept across rules versions
+_batch_definitions = {}
+
+
+def import_gx():
+    """Import great_expectations once per process, with analytics disabled"""
+    global _gx
+    if _gx is None:
+        from great_expectations import analytics
+
+        analytics.config.ENV_CONFIG.gx_analytics_enabled = False
+
+        import great_expectations
+
+        _gx = great_expectations
+    return _gx
+
+
+def get_context():
+    """The worker's ephemeral GX Data Context, created on first use"""
+    global _context
+    if _context is None:
+        with _lock:
+            if _context is None:
+                gx = import_gx()
+                context = gx.get_context(mode="ephemeral")
+                context.data_sources.add_pandas(DATA_SOURCE_NAME)
+                _context = context
+    return _context
+
+
+def get_subset(plan, rules):
+    """Names of the rules of a subset that GX evaluates, None for every rule of the plan"""
+    if rules is None:
+        return None
+    names = frozenset(rule.name for rule in rules if not rule.source)
+    if names == frozenset(rule.name for rule in plan.rules if not rule.source):
+        return None
+    return names
+
+
+def get_definition_name(doctype, version, subset):
+    name = f"{frappe.local.site}:{doctype}:{version}"
+    if subset is None:
+        return name
+    return f"{name}:{hashlib.md5(','.join(sorted(subset)).encode()).hexdigest()[:12]}"
+
+
+def get_validation_definition(plan, rules=None):
+    """
+    Get the validation definition of a plan, registering its suite on first use.
+
+    Suites and validation definitions are named after the site, DocType, rules version
+    and subset of the rules, so each subset is registered once per worker and reused by
+    every later run. Registrations of older versions of the same DocType are dropped.
+
+    :param
+        rules: subset of the compiled rules the suite holds, all of them by default
+
+    :return
+        (validation definition, lock to hold while running it)
+    """
+    key = (frappe.local.site, plan.doctype)
+    subset = get_subset(plan, rules)
+    registered = _definitions.get(key)
+    if registered and registered[0] == plan.version and subset in registered[1]:
+        return registered[1][subset]
+
+    with _lock:
+        registered = _definitions.get(key)
+        if registered and registered[0] == plan.version and subset in registered[1]:
+            return registered[1][subset]
+
+        gx = import_gx()
+        context = get_context()
+        base_name = f"{frappe.local.site}:{plan.doctype}"
+        name = get_definition_name(plan.doctype, plan.version, subset)
+
+        batch_definition = _batch_definitions.get(key)
+        if batch_definition is None:
+            data_asset = context.data_sources.get(DATA_SOURCE_NAME).add_dataframe_asset(name=base_name)
+            batch_definition = data_asset.add_batch_definition_whole_dataframe(base_name)
+            _batch_definitions[key] = batch_definition
+
+        suite = context.suites.add(gx.ExpectationSuite(name=name))
+        for rule in plan.rules:
+            if rule.source:
+                # evaluated natively against the cached member set, see `membership.py`
+                continue
+            if subset is None or rule.name in subset:
+                suite.add_expectation(rule.build_expectation())
+
+        validation_definition = context.validation_definitions.add(
+            gx.ValidationDefinition(data=batch_definition, suite=suite, name=name)
+        )
+
+        if registered and registered[0] != plan.version:
+            unregister(context, plan.doctype, registered)
+            registered = None
+        if registered is None:
+            registered = _definitions[key] = (plan.version, {})
+        subsets = registered[1]
+        if len(subsets) >= MAX_SUBSETS:
+            oldest = next(one for one in subsets if one is not None)
+            unregister(context, plan.doctype, (plan.version, {oldest: subsets.pop(oldest)}))
+
+        subsets[subset] = (validation_definition, threading.Lock())
+        return subsets[subset]
+
+
+def unregister(context, doctype, registered):
+    version, subsets = registered
+    for subset in subsets:
+        name = get_definition_name(doctype, version, subset)
+        context.validation_definitions.delete(name)
+        context.suites.delete(name)
+
+
+def drop_validation_definition(doctype):
+    """Unregister the suites of a doctype, the next run registers them again from its plan"""
+    key = (frappe.local.site, doctype)
+    with _lock:
+        registered = _definitions.pop(key, None)
+        if registered:
+            unregister(get_context(), doctype, registered)
+
+
+def run_gx(plan, df, result_format="SUMMARY", rules=None):
+    """
+    Run the expectations of a compiled plan against a DataFrame
+
+    :param
+        plan: ValidationPlan of the doctype
+        df: pd.DataFrame to validate, bound to the batch definition through batch parameters
+        result_format: GX result format, "COMPLETE" to get the unexpected row indexes
+        rules: subset of the compiled rules to run, all of them by default
+
+    :return
+        GX validation results
+    """
+    validation_definition, lock = get_validation_definition(plan, rules)
+    with lock:
+        return validation_definition.run(
+            batch_parameters={"dataframe": df}, result_format=result_format
+        )
+
+
+def run_gx_rules(rules, df):
+    """
+    Run rules against a DataFrame on a throwaway context.
+
+    For processes that have no site to key the shared registrations on, such as the
+    workers of a validation pool.
+
+    :return
+        ValidationOutcome
+    """
+    from .plan import ValidationPlan
+
+    gx = import_gx()
+    context = gx.get_context(mode="ephemeral")
+
+    suite = context.suites.add(gx.ExpectationSuite(name="dataq"))
+    for rule in rules:
+        if not rule.source:
+            suite.add_expectation(rule.build_expectation())
+
+    data_asset = context.data_sources.add_pandas(DATA_SOURCE_NAME).add_dataframe_asset(name="dataq")
+    validation_definition = context.validation_definitions.add(
+        gx.ValidationDefinition(
+            data=data_asset.add_batch_definition_whole_dataframe("dataq"), suite=suite, name="dataq"
+        )
+    )
+    validation_results = validation_definition.run(
+        batch_parameters={"dataframe": df}, result_format="COMPLETE"
+    )
+    return gx_outcome(ValidationPlan(None, None, rules), validation_results)
+
+
+def gx_outcome(plan, validation_results):
+    """
+    Convert GX validation results run with the "COMPLETE" result format into a
+    ValidationOutcome, so both engines report failing rows the same way.
+    """
+    from .engine import RuleOutcome, ValidationOutcome
+
+    results = []
+    for one in validation_results.results:
+        rule = plan.rules_by_name.get((one.expectation_config.meta or {}).get("data_rule"))
+        if rule is None:
+            continue
+        result = one.result or {}
+        results.append(
+            RuleOutcome(
+                rule,
+                list(result.get("unexpected_index_list") or []),
+                result.get("element_count") or 0,
+                success=one.success,
+            )
+        )
+    return ValidationOutcome(results)
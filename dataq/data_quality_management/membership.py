@@ -0,0 +1,199 @@
+"""
+Cached membership sets of value-set rules sourced from a DocType field.
+
+An `ExpectColumnValuesToBeInSet` rule with a `value_set_source` arg ("Customer" or
+"Customer.customer_name") checks values against the current values of that field rather
+than a literal list. The values are read once per worker into a `MemberSet`: a frozenset,
+or a Bloom filter once the source holds more than `dataq_bloom_threshold` values (200000
+by default) to bound worker memory, at the price of a `dataq_bloom_error_rate` (0.001)
+chance of accepting a value that is not in the source.
+
+Each source DocType has a version token in Redis, bumped after commit whenever a
+document of it is inserted, deleted, renamed or has a source field changed. A worker
+whose set is behind rebuilds it, at most once every `dataq_membership_refresh_interval`
+seconds (60). In between, values missing from the stale set are confirmed with one
+indexed query per batch, so records created since the last build are never rejected.
+"""
+
+import hashlib
+import math
+import threading
+from time import monotonic
+
+import frappe
+import numpy as np
+from frappe.utils import cint, flt
+
+MEMBERSHIP_VERSION_KEY = "dataq:membership_version"
+
+# {(site, doctype, fieldname): MemberSet}
+_sets = {}
+
+# {site: (rules version, {source doctype: {fieldnames}})}
+_sources = {}
+
+_lock = threading.Lock()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over the string form of values, filled and probed a batch at a time"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, values):
+        """(len(values), hashes) bit positions, by double hashing of one 128-bit digest"""
+        digests = b"".join(hashlib.blake2b(str(value).encode(), digest_size=16).digest() for value in values)
+        pairs = np.frombuffer(digests, dtype="<u8").reshape(-1, 2)
+        first, second = pairs[:, :1], pairs[:, 1:] | np.uint64(1)
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        return (first + steps * second) % np.uint64(self.size)
+
+    def add_many(self, values):
+        if not len(values):
+            return
+        positions = self._positions(values).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), (1 << (positions & np.uint64(7))).astype(np.uint8))
+
+    def contains_many(self, values):
+        if not len(values):
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(values)
+        masks = (1 << (positions & np.uint64(7))).astype(np.uint8)
+        return ((self.bits[positions >> np.uint64(3)] & masks) != 0).all(axis=1)
+
+    def __contains__(self, value):
+        return bool(self.contains_many([value])[0])
+
+
+class MemberSet:
+    """The values of a source field as of one source version"""
+
+    def __init__(self, doctype, fieldname, version, values):
+        self.doctype = doctype
+        self.fieldname = fieldname
+        self.version = version
+        self.built_at = monotonic()
+        threshold = cint(frappe.conf.get("dataq_bloom_threshold")) or 200000
+        if len(values) > threshold:
+            self.members = BloomFilter(len(values), flt(frappe.conf.get("dataq_bloom_error_rate")) or 0.001)
+            self.members.add_many(values)
+        else:
+            self.members = frozenset(values)
+
+    @property
+    def is_current(self):
+        return self.version == get_source_version(self.doctype)
+
+    def contains_many(self, values):
+        """Boolean array, whether each value is in the source"""
+        if isinstance(self.members, BloomFilter):
+            found = self.members.contains_many(values)
+        else:
+            found = np.fromiter((value in self.members for value in values), bool, len(values))
+        if not found.all() and not self.is_current:
+            # the source changed since the build, missing values may have been added since
+            missing = {values[i] for i in np.flatnonzero(~found)}
+            added = set(query_members(self.doctype, self.fieldname, missing))
+            if added:
+                found |= np.fromiter((value in added for value in values), bool, len(values))
+        return found
+
+    def __contains__(self, value):
+        return bool(self.contains_many([value])[0])
+
+
+def get_member_set(doctype, fieldname):
+    """The MemberSet of a source field, rebuilt when the source changed and the set is old enough"""
+    key = (frappe.local.site, doctype, fieldname)
+    version = get_source_version(doctype)
+    member_set = _sets.get(key)
+    interval = flt(frappe.conf.get("dataq_membership_refresh_interval", 60))
+    if member_set is None or (
+        member_set.version != version and monotonic() - member_set.built_at >= interval
+    ):
+        with _lock:
+            member_set = _sets.get(key)
+            if member_set is None or member_set.version != version:
+                member_set = MemberSet(doctype, fieldname, version, load_values(doctype, fieldname))
+                _sets[key] = member_set
+    return member_set
+
+
+def bind_member_sets(rules):
+    """Hand the current member sets of sourced rules to the evaluators, see `engine._in_set`"""
+    for rule in rules:
+        if rule.source:
+            rule.cache["members"] = get_member_set(*rule.source)
+
+
+def load_values(doctype, fieldname):
+    table = frappe.qb.DocType(doctype)
+    return (
+        frappe.qb.from_(table).select(table[fieldname]).distinct().where(table[fieldname].notnull())
+    ).run(pluck=True)
+
+
+def query_members(doctype, fieldname, values, batch_size=1000):
+    """Which of `values` the source field holds, one indexed query per batch"""
+    table = frappe.qb.DocType(doctype)
+    values = list(values)
+    found = []
+    for start in range(0, len(values), batch_size):
+        found.extend(
+            frappe.qb.from_(table)
+            .select(table[fieldname])
+            .distinct()
+            .where(table[fieldname].isin(values[start : start + batch_size]))
+            .run(pluck=True)
+        )
+    return found
+
+
+def get_source_version(doctype):
+    return frappe.cache.hget(MEMBERSHIP_VERSION_KEY, doctype, generator=lambda: frappe.generate_hash(length=10))
+
+
+def get_sources():
+    """{source doctype: {fieldnames}} of the enabled sourced rules of the site"""
+    from .plan import get_rules_version
+    from .table_checks import parse_source
+
+    version = get_rules_version()
+    site = frappe.local.site
+    cached = _sources.get(site)
+    if cached is None or cached[0] != version:
+        try:
+            values = frappe.get_all(
+                "Data Rules",
+                filters={"is_enabled": True, "args.args_name": "value_set_source"},
+                fields=["args.args_value"],
+            )
+        except Exception as e:
+            if frappe.db.is_table_missing(e):
+                return {}
+            raise
+        sources = {}
+        for row in values:
+            if row.args_value:
+                doctype, fieldname = parse_source(row.args_value)
+                sources.setdefault(doctype, set()).add(fieldname)
+        cached = (version, sources)
+        _sources[site] = cached
+    return cached[1]
+
+
+def on_source_change(doc, method=None):
+    """Doc event of every doctype, marks the member sets of a source doctype as stale"""
+    fieldnames = get_sources().get(doc.doctype)
+    if not fieldnames:
+        return
+    if method == "on_update" and not any(doc.has_value_changed(field) for field in fieldnames):
+        return
+    doctype = doc.doctype
+    frappe.db.after_commit.add(
+        lambda: frappe.cache.hset(MEMBERSHIP_VERSION_KEY, doctype, frappe.generate_hash(length=10))
+    )
@@ -0,0 +1,104 @@
+"""
+Process-pool validation of large DataFrames.
+
+The frame is split by rows into one partition per worker process. Row-local rules run
+on every partition, and their outcomes are merged back by index label, so the failing
+row indexes refer to the original frame. Rules that need the whole column or table
+(uniqueness, aggregate bounds, row counts) are not split: they run once over the whole
+frame in the parent process while the pool works.
+
+The pool is created on first use and kept for the life of the worker, so its processes
+import pandas and GX once rather than on every call.
+"""
+
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import pairwise
+from multiprocessing import get_context
+
+import numpy as np
+
+from .engine import ValidationOutcome, is_row_local, merge_outcomes, run_native
+
+
+def run_partition(engine, rules, df):
+    """Evaluate rules over one frame, in a worker process that has no site initialised"""
+    if not rules:
+        return ValidationOutcome([])
+    if engine == "native":
+        return run_native(rules, df)
+
+    from .gx_runtime import run_gx_rules
+
+    # sourced value sets are not part of GX suites, see `membership.py`
+    sourced = [rule for rule in rules if rule.source]
+    others = [rule for rule in rules if not rule.source]
+    outcome = run_native(sourced, df)
+    if others:
+        outcome = ValidationOutcome(outcome.results + run_gx_rules(others, df).results)
+    return outcome
+
+
+# (workers, ProcessPoolExecutor) of this process
+_pool = None
+
+_lock = threading.Lock()
+
+
+def get_pool(workers):
+    """The process pool of this worker, recreated when the size changes or a process died"""
+    global _pool
+    with _lock:
+        if _pool is None or _pool[0] != workers:
+            if _pool is not None:
+                _pool[1].shutdown(wait=False, cancel_futures=True)
+            # spawn, not fork: the parent holds database and Redis connections
+            _pool = (workers, ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")))
+        return _pool[1]
+
+
+def shutdown_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool[1].shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def validate_in_parallel(plan, df, workers, rules=None):
+    """
+    Validate a DataFrame against a compiled plan on a pool of `workers` processes
+
+    :param
+        rules: subset of the compiled rules to evaluate, all of them by default
+
+    :return
+        ValidationOutcome over the whole frame
+    """
+    if rules is None:
+        rules = plan.rules
+    # sourced value sets live in this process, see `membership.py`
+    row_local = [rule for rule in rules if is_row_local(rule) and not rule.source]
+    whole_column = [rule for rule in rules if not is_row_local(rule) or rule.source]
+
+    bounds = np.linspace(0, len(df), num=workers + 1, dtype=int)
+    partitions = [df.iloc[start:end] for start, end in pairwise(bounds) if end > start]
+
+    futures = []
+    if row_local:
+        pool = get_pool(workers)
+        futures = [pool.submit(run_partition, plan.engine, row_local, part) for part in partitions]
+    outcomes = [run_partition(plan.engine, whole_column, df)]
+    try:
+        outcomes.extend(future.result() for future in futures)
+    except BrokenProcessPool:
+        # a worker process died, start a fresh pool next time
+        shutdown_pool()
+        raise
+
+    return merge_outcomes(outcomes)
@@ -0,0 +1,238 @@
+"""
+Compiled validation plans.
+
+A plan holds everything `gx_validate` needs for one DocType: the enabled Data Rules,
+their coerced args, the resolved column fieldnames and the expectation factories.
+Plans live in a per-worker cache keyed by the site-wide rules version, which is bumped
+through the Data Rules / Data Rules Args / GX Function doc events, so every gunicorn
+and RQ worker picks up the change on its next lookup.
+"""
+
+import frappe
+
+RULES_VERSION_KEY = "dataq:rules_version"
+
+# expectation args that name columns of the validated doctype
+COLUMN_ARGS = ("column", "column_A", "column_B", "column_list")
+
+# {(site, doctype): ValidationPlan}
+_plans = {}
+
+# {site: (version, frozenset of doctypes with enabled rules)}
+_doctypes_with_rules = {}
+
+
+class CompiledRule:
+    """One enabled Data Rule, ready to be turned into an expectation"""
+
+    def __init__(self, name, which_gx, args, enforcement="Blocking"):
+        self.name = name
+        self.which_gx = which_gx
+        self.args = args
+        # "Deferred" rules are evaluated after commit in the background and never block a save
+        self.deferred = enforcement == "Deferred"
+        self.column = args.get("column")
+        self.columns = []
+        for arg in COLUMN_ARGS:
+            value = args.get(arg)
+            if isinstance(value, (list, tuple)):
+                self.columns.extend(value)
+            elif value:
+                self.columns.append(value)
+        # (doctype, fieldname) the value set of a membership rule is read from
+        self.source = None
+        # per-rule precomputations of the native engine, e.g. the hashed value set
+        self.cache = {}
+
+    def build_expectation(self):
+        """Instantiate the GX expectation, tagged with the Data Rule it came from"""
+        from .gx_runtime import import_gx
+
+        gx = import_gx()
+        gx_function = getattr(gx.expectations, self.which_gx)
+        return gx_function(**self.args, meta={"data_rule": self.name})
+
+    def __repr__(self):
+        return f"<CompiledRule {self.name} {self.which_gx}>"
+
+
+class ValidationPlan:
+    """The compiled rule set of a DocType for one rules version"""
+
+    def __init__(self, doctype, version, rules, engine="gx"):
+        self.doctype = doctype
+        self.version = version
+        self.rules = rules
+        self.rules_by_name = {rule.name: rule for rule in rules}
+        # "native" when every rule is supported by the native engine, "gx" otherwise
+        self.engine = engine
+        # fieldnames the rules read, so documents are projected onto them instead of copied
+        self.columns = list(dict.fromkeys(column for rule in rules for column in rule.columns))
+        # table-level rules, e.g. on the set of columns, need every field of the document
+        self.needs_all_columns = any(not rule.columns for rule in rules)
+        # {fieldname: rules reading it}, to re-run only the rules touched by a change
+        self.rules_by_column = {}
+        for rule in rules:
+            for column in rule.columns:
+                self.rules_by_column.setdefault(column, []).append(rule)
+
+    def rules_for_changes(self, doc):
+        """
+        Rules to evaluate on save of `doc`: all of them for new documents, otherwise only
+        the rules reading a changed field plus the rules that read the whole document.
+        """
+        if doc.is_new() or not doc.get_doc_before_save():
+            return self.rules
+        selected = set()
+        for column, rules in self.rules_by_column.items():
+            if doc.has_value_changed(column):
+                selected.update(rule.name for rule in rules)
+        return [rule for rule in self.rules if not rule.columns or rule.name in selected]
+
+    @property
+    def deferred_rules(self):
+        return [rule for rule in self.rules if rule.deferred]
+
+    @property
+    def blocking_rules(self):
+        """Rules that run when a document is saved, the others are deferred"""
+        return [rule for rule in self.rules if not rule.deferred]
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def __repr__(self):
+        return f"<ValidationPlan {self.doctype} v{self.version} rules={len(self.rules)} engine={self.engine}>"
+
+
+def get_rules_version():
+    """Site-wide token that changes whenever Data Rules, their args or GX Functions change"""
+    return frappe.cache.get_value(RULES_VERSION_KEY, generator=_new_version)
+
+
+def _new_version():
+    return frappe.generate_hash(length=10)
+
+
+def _set_new_version():
+    frappe.cache.set_value(RULES_VERSION_KEY, _new_version())
+
+
+def invalidate_plans(doc=None, method=None):
+    """
+    Doc event handler for Data Rules, Data Rules Args and GX Function.
+
+    The version is bumped after commit, so other workers never compile a plan from data
+    that is about to be rolled back.
+    """
+    _plans.clear()
+    _doctypes_with_rules.clear()
+    frappe.db.after_commit.add(_set_new_version)
+
+
+def get_doctypes_with_rules():
+    """
+    DocTypes of the current site that have at least one enabled Data Rule.
+
+    Built once per rules version and held per worker, so the only cost on a save is the
+    version lookup, which frappe memoizes for the rest of the request.
+    """
+    version = get_rules_version()
+    site = frappe.local.site
+    cached = _doctypes_with_rules.get(site)
+    if cached is None or cached[0] != version:
+        try:
+            doctypes = frappe.get_all(
+                "Data Rules",
+                filters={"is_enabled": True},
+                pluck="which_doctype",
+                distinct=True,
+            )
+        except Exception as e:
+            # saves that happen while dataq itself is being installed
+            if frappe.db.is_table_missing(e):
+                return frozenset()
+            raise
+        cached = (version, frozenset(doctypes))
+        _doctypes_with_rules[site] = cached
+    return cached[1]
+
+
+def has_rules(doctype):
+    return doctype in get_doctypes_with_rules()
+
+
+def get_plan(doctype):
+    """
+    Get the compiled plan of a DocType from the per-worker cache, compiling it when the
+    rules version has moved on.
+    """
+    version = get_rules_version()
+    key = (frappe.local.site, doctype)
+    plan = _plans.get(key)
+    if plan is None or plan.version != version:
+        plan = compile_plan(doctype, version)
+        _plans[key] = plan
+    return plan
+
+
+def compile_plan(doctype, version=None):
+    from .coercion import coerce_arg
+    from .columns import get_multilingual_column_map
+    from .table_checks import parse_source
+
+    if version is None:
+        version = get_rules_version()
+
+    # `get_all` rather than `get_list`: plans are shared by every user of the worker, so
+    # they must not depend on whether the saving user can read Data Rules
+    data = frappe.get_all(
+        "Data Rules",
+        fields=["name", "which_gx", "enforcement", "args.args_name", "args.args_type", "args.args_value"],
+        filters={"which_doctype": doctype, "is_enabled": True},
+        order_by="name asc",
+    )
+
+    rules_args = {}
+    which_gx = {}
+    enforcement = {}
+    for item in data:
+        which_gx[item["name"]] = item["which_gx"]
+        enforcement[item["name"]] = item["enforcement"]
+        args = rules_args.setdefault(item["name"], {})
+        if not item["args_name"]:
+            continue
+        if item["args_value"] is None or item["args_value"] == "":
+            continue
+        args_value = coerce_arg(item["args_value"], item["args_type"])
+        args[item["args_name"]] = args_value
+
+    column_map = get_multilingual_column_map(doctype)
+    rules = []
+    for name, args in rules_args.items():
+        for arg in COLUMN_ARGS:
+            if isinstance(args.get(arg), (list, tuple)):
+                args[arg] = [column_map.get(column, column) for column in args[arg]]
+            elif arg in args:
+                args[arg] = column_map.get(args[arg], args[arg])
+        source = args.pop("value_set_source", None)
+        rule = CompiledRule(name, which_gx[name], args, enforcement[name])
+        if source:
+            # membership in another doctype's field, see `membership.py`
+            rule.source = parse_source(source)
+        rules.append(rule)
+
+    return ValidationPlan(doctype, version, rules, engine=choose_engine(rules))
+
+
+def choose_engine(rules):
+    """
+    Pick the native engine when it supports every rule of the set, GX otherwise.
+
+    The native engine can be turned off with `"dataq_native_engine": 0` in site config.
+    """
+    from .engine import is_supported
+
+    if rules and frappe.conf.get("dataq_native_engine", True) and all(map(is_supported, rules)):
+        return "native"
+    return "gx"
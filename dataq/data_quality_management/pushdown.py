@@ -0,0 +1,314 @@
+"""
+SQL pushdown engine.
+
+Evaluates Data Rules over a whole DocType table inside the database, following the
+semantics of the native engine. Row rules (not null, in set, between, regex, value
+lengths, membership in another DocType's field) become `SUM(CASE WHEN <row fails> ...)`
+terms, aggregate rules (row count, column min / max / mean) plain aggregates, and all of
+them are computed in a single aggregate query, one scan of the table. Uniqueness needs a
+grouped subquery of its own. For every failing rule a bounded sample of the failing
+`name`s is read, so only counts and a few names ever cross the wire.
+
+Rules the database cannot evaluate, or that read columns outside the table such as child
+table fields, fall back to the in-memory path: row-local rules over keyset chunks of the
+table, the others once over every row of the columns they read.
+
+Turn it off with `"dataq_pushdown": 0` in site config.
+
+Settings (site config):
+    dataq_pushdown_sample_size: failing names sampled per rule, default 20
+"""
+
+import frappe
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Avg, Count, Max, Min, Sum
+from frappe.utils import cint
+from pypika.enums import Comparator
+from pypika.terms import BasicCriterion, Criterion, Function, ValueWrapper
+
+from .engine import RuleOutcome, ValidationOutcome, is_row_local, merge_outcomes
+
+
+class RegexMatching(Comparator):
+    mariadb = " REGEXP "
+    mariadb_not = " NOT REGEXP "
+    postgres = " ~ "
+    postgres_not = " !~ "
+
+
+def _regex(term, pattern, negate=False):
+    dialect = "postgres" if frappe.db.db_type == "postgres" else "mariadb"
+    comparator = RegexMatching[f"{dialect}_not" if negate else dialect]
+    return BasicCriterion(comparator, term, ValueWrapper(pattern))
+
+
+def _outside(term, args):
+    criteria = []
+    if args.get("min_value") is not None:
+        criteria.append(term <= args["min_value"] if args.get("strict_min") else term < args["min_value"])
+    if args.get("max_value") is not None:
+        criteria.append(term >= args["max_value"] if args.get("strict_max") else term > args["max_value"])
+    return Criterion.any(criteria)
+
+
+def _within(value, args):
+    if value is None:
+        return False
+    if args.get("min_value") is not None:
+        if value < args["min_value"] or (args.get("strict_min") and value == args["min_value"]):
+            return False
+    if args.get("max_value") is not None:
+        if value > args["max_value"] or (args.get("strict_max") and value == args["max_value"]):
+            return False
+    return True
+
+
+def _char_length(term):
+    return Function("CHAR_LENGTH", term)
+
+
+_BOUND_ARGS = {"min_value", "max_value", "strict_min", "strict_max"}
+
+# expectation -> (criterion of the unexpected rows, accepted args, whether nulls are part of the domain)
+ROW_PUSHDOWN = {
+    "ExpectColumnValuesToNotBeNull": (lambda c, a: c.isnull(), set(), True),
+    "ExpectColumnValuesToBeNull": (lambda c, a: c.notnull(), set(), True),
+    "ExpectColumnValuesToBeInSet": (lambda c, a: c.notin(list(a["value_set"])), {"value_set"}, False),
+    "ExpectColumnValuesToNotBeInSet": (lambda c, a: c.isin(list(a["value_set"])), {"value_set"}, False),
+    "ExpectColumnValuesToBeBetween": (_outside, _BOUND_ARGS, False),
+    "ExpectColumnValuesToMatchRegex": (lambda c, a: _regex(c, a["regex"], negate=True), {"regex"}, False),
+    "ExpectColumnValuesToNotMatchRegex": (lambda c, a: _regex(c, a["regex"]), {"regex"}, False),
+    "ExpectColumnValueLengthsToBeBetween": (lambda c, a: _outside(_char_length(c), a), _BOUND_ARGS, False),
+    "ExpectColumnValueLengthsToEqual": (lambda c, a: _char_length(c) != a["value"], {"value"}, False),
+}
+
+# expectation -> (aggregate of the column, accepted args), None for the row count
+AGGREGATE_PUSHDOWN = {
+    "ExpectTableRowCountToBeBetween": (None, {"min_value", "max_value"}),
+    "ExpectTableRowCountToEqual": (None, {"value"}),
+    "ExpectColumnMinToBeBetween": (Min, _BOUND_ARGS),
+    "ExpectColumnMaxToBeBetween": (Max, _BOUND_ARGS),
+    "ExpectColumnMeanToBeBetween": (Avg, _BOUND_ARGS),
+}
+
+UNIQUE = "ExpectColumnValuesToBeUnique"
+
+
+def is_pushable(rule, table_columns):
+    """Whether a rule can be evaluated in SQL against a table with these columns"""
+    if rule.which_gx in AGGREGATE_PUSHDOWN:
+        aggregate, accepted = AGGREGATE_PUSHDOWN[rule.which_gx]
+        if aggregate is not None and rule.column not in table_columns:
+            return False
+        if not set(rule.args) <= {"column"} | accepted:
+            return False
+        if rule.which_gx == "ExpectTableRowCountToEqual":
+            return rule.args.get("value") is not None
+        return rule.args.get("min_value") is not None or rule.args.get("max_value") is not None
+
+    if rule.which_gx == UNIQUE:
+        accepted = set()
+    elif rule.which_gx in ROW_PUSHDOWN:
+        _, accepted, _ = ROW_PUSHDOWN[rule.which_gx]
+    else:
+        return False
+    if rule.column not in table_columns or not set(rule.args) <= {"column", "mostly"} | accepted:
+        return False
+    if rule.source:
+        source_doctype, fieldname = rule.source
+        return (
+            rule.which_gx == "ExpectColumnValuesToBeInSet"
+            and frappe.db.table_exists(source_doctype)
+            and fieldname in frappe.db.get_table_columns(source_doctype)
+        )
+    if "value_set" in rule.args:
+        value_set = rule.args["value_set"]
+        return (
+            isinstance(value_set, (list, tuple, set))
+            and bool(value_set)
+            and all(isinstance(value, (str, int, float)) for value in value_set)
+        )
+    if "regex" in rule.args:
+        return isinstance(rule.args["regex"], str)
+    if _BOUND_ARGS & set(rule.args):
+        return rule.args.get("min_value") is not None or rule.args.get("max_value") is not None
+    return True
+
+
+def validate_table(doctype, rules=None, sample_size=None, chunk_size=None, source=None):
+    """
+    Validate every row of a doctype table, in the database where possible
+
+    :param
+        rules: subset of the compiled rules to evaluate, all of them by default
+        sample_size: failing names kept per rule
+        chunk_size: rows per chunk of the in-memory fallback
+        source: record the outcome in the results store under this source, e.g. "Scan"
+
+    :return
+        ValidationOutcome, `unexpected_index` of each rule holds a sample of the failing
+        names and `unexpected_count` their number
+    """
+    from .plan import get_plan
+
+    plan = get_plan(doctype)
+    if rules is None:
+        rules = plan.rules
+    if not rules:
+        return ValidationOutcome([])
+
+    if cint(frappe.conf.get("dataq_pushdown", 1)):
+        table_columns = set(frappe.db.get_table_columns(doctype))
+        pushed = [rule for rule in rules if is_pushable(rule, table_columns)]
+    else:
+        pushed = []
+    remaining = [rule for rule in rules if rule not in pushed]
+
+    results = []
+    if pushed:
+        sample_size = cint(sample_size or frappe.conf.get("dataq_pushdown_sample_size")) or 20
+        results.extend(run_pushdown(doctype, pushed, sample_size).results)
+    if remaining:
+        results.extend(validate_in_chunks(doctype, plan, remaining, chunk_size).results)
+    outcome = ValidationOutcome(results)
+
+    if source:
+        from .results import record_outcome
+
+        record_outcome(doctype, outcome, source)
+    return outcome
+
+
+def run_pushdown(doctype, rules, sample_size=20):
+    """Evaluate pushable rules with one aggregate query, plus one per uniqueness rule and failing rule"""
+    table = frappe.qb.DocType(doctype)
+    terms = [Count("*").as_("row_count")]
+    failing = {}
+    for i, rule in enumerate(rules):
+        if rule.which_gx in AGGREGATE_PUSHDOWN:
+            aggregate, _ = AGGREGATE_PUSHDOWN[rule.which_gx]
+            if aggregate is not None:
+                terms.append(aggregate(table[rule.column]).as_(f"value_{i}"))
+        elif rule.which_gx in ROW_PUSHDOWN:
+            criterion, _, nulls_in_domain = ROW_PUSHDOWN[rule.which_gx]
+            column = table[rule.column]
+            if rule.source:
+                unexpected = column.notin(source_values(*rule.source))
+            else:
+                unexpected = criterion(column, rule.args)
+            if not nulls_in_domain:
+                unexpected = column.notnull() & unexpected
+                terms.append(Count(column).as_(f"domain_{i}"))
+            failing[rule.name] = unexpected
+            terms.append(Sum(Case().when(unexpected, 1).else_(0)).as_(f"unexpected_{i}"))
+
+    totals = frappe.qb.from_(table).select(*terms).run(as_dict=True)[0]
+    row_count = cint(totals.row_count)
+
+    results = []
+    for i, rule in enumerate(rules):
+        if rule.which_gx in AGGREGATE_PUSHDOWN:
+            if rule.which_gx == "ExpectTableRowCountToEqual":
+                success = row_count == cint(rule.args["value"])
+            elif rule.which_gx == "ExpectTableRowCountToBeBetween":
+                success = _within(row_count, rule.args)
+            else:
+                success = _within(totals[f"value_{i}"], rule.args)
+            results.append(RuleOutcome(rule, element_count=row_count, success=success))
+            continue
+
+        if rule.which_gx == UNIQUE:
+            unexpected = unique_violations(table, table[rule.column])
+            element_count = (
+                frappe.qb.from_(table).select(Count(table[rule.column])).run()[0][0]
+            )
+            unexpected_count = (
+                frappe.qb.from_(table).select(Count("*")).where(unexpected).run()[0][0]
+            )
+        else:
+            unexpected = failing[rule.name]
+            element_count = cint(totals.get(f"domain_{i}", row_count))
+            unexpected_count = cint(totals[f"unexpected_{i}"])
+
+        sample = []
+        if unexpected_count:
+            sample = (
+                frappe.qb.from_(table).select(table.name).where(unexpected).limit(sample_size)
+            ).run(pluck=True)
+        results.append(
+            RuleOutcome(rule, sample, cint(element_count), unexpected_count=cint(unexpected_count))
+        )
+    return ValidationOutcome(results)
+
+
+def source_values(source_doctype, fieldname):
+    """Subquery of the values of a source field, for rules with a `value_set_source`"""
+    source = frappe.qb.DocType(source_doctype)
+    return frappe.qb.from_(source).select(source[fieldname]).where(source[fieldname].notnull())
+
+
+def unique_violations(table, column):
+    """Criterion of the rows whose value occurs more than once, like `duplicated(keep=False)`"""
+    duplicates = (
+        frappe.qb.from_(table)
+        .select(column)
+        .where(column.notnull())
+        .groupby(column)
+        .having(Count("*") > 1)
+    )
+    return column.isin(duplicates)
+
+
+def validate_in_chunks(doctype, plan, rules, chunk_size=None):
+    """
+    The in-memory fallback: read the table in keyset chunks and validate the row-local
+    rules on each one.
+
+    A chunk would only answer for its own rows, so rules over the whole column or table,
+    such as uniqueness, are evaluated once over the columns they read, see `read_columns`.
+    """
+    import pandas as pd
+
+    from .api import validate_dataframe
+    from .scan import fetch_chunk, get_scan_fields
+
+    row_local = [rule for rule in rules if is_row_local(rule)]
+    whole_column = [rule for rule in rules if not is_row_local(rule)]
+
+    chunk_size = cint(chunk_size or frappe.conf.get("dataq_scan_chunk_size")) or 2000
+    fields = get_scan_fields(doctype, plan)
+    watermark = None
+    outcomes = []
+    while row_local:
+        rows = fetch_chunk(doctype, fields, watermark, chunk_size)
+        if not rows:
+            break
+        df = pd.DataFrame.from_records(rows)
+        df.index = df["name"]
+        outcomes.append(validate_dataframe(doctype, df, rules=row_local))
+        watermark = (str(rows[-1]["modified"]), rows[-1]["name"])
+        if len(rows) < chunk_size:
+            break
+    outcome = merge_outcomes(outcomes)
+
+    if whole_column:
+        df = read_columns(doctype, whole_column)
+        outcome = ValidationOutcome(outcome.results + validate_dataframe(doctype, df, rules=whole_column).results)
+    return outcome
+
+
+def read_columns(doctype, rules):
+    """Every row of the table columns the rules read, all columns when one of them reads the whole row"""
+    import pandas as pd
+
+    table = frappe.qb.DocType(doctype)
+    if all(rule.columns for rule in rules):
+        table_columns = set(frappe.db.get_table_columns(doctype))
+        columns = dict.fromkeys(["name", *(c for rule in rules for c in rule.columns)])
+        fields = [table[field] for field in columns if field in table_columns]
+    else:
+        fields = [table.star]
+    df = pd.DataFrame.from_records(frappe.qb.from_(table).select(*fields).run(as_dict=True))
+    if "name" in df:
+        df.index = df["name"]
+    return df
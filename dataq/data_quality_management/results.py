@@ -0,0 +1,204 @@
+"""
+Validation results store.
+
+Rule outcomes of save-time and batch validation are buffered in the process: per-rule,
+per-DocType, per-day counters, plus one record per failing row. At the end of each
+request or job (or as soon as it grows past `FLUSH_SIZE`) the buffer is added to Redis in
+one round trip, the counters to a hash and the failing rows to a list, so the save path
+never waits on a database write or an enqueue. A scheduler event drains Redis in bulk:
+it inserts the failing rows into Data Quality Failure and adds the counters to the Data
+Quality Metric rollups that dashboards read. Raw failures are pruned through Log
+Settings, the rollups are kept.
+
+Turn it off with `"dataq_results_enabled": 0` in site config.
+"""
+
+import hashlib
+import json
+import threading
+
+import frappe
+from frappe.utils import cint, now, nowdate
+
+FLUSH_SIZE = 1000
+
+# failing rows written per batch of a drain
+DRAIN_SIZE = 10000
+
+# hash of the counters, field: [date, doctype, data rule, source, counter] as JSON
+METRICS_KEY = "dataq:results:metrics"
+
+# list of the failing rows as JSON
+FAILURES_KEY = "dataq:results:failures"
+
+COUNTERS = ("evaluated", "failed", "failed_runs")
+
+_lock = threading.Lock()
+
+# {site: {(date, doctype, data rule, source): [evaluated, failed, failed runs]}}
+_metrics = {}
+
+# {site: [(doctype, document name, data rule, gx function, source)]}
+_failures = {}
+
+
+def record_outcome(doctype, outcome, source, names=None):
+    """
+    Buffer the outcome of a validation
+
+    :param
+        outcome: ValidationOutcome
+        source: "Save", "Batch", "Import", "Scan", "Deferred" or "Sample"
+        names: document name by row index of the validated frame, the index itself by default
+    """
+    if not outcome.results or not cint(frappe.conf.get("dataq_results_enabled", 1)):
+        return
+
+    site = frappe.local.site
+    today = nowdate()
+    with _lock:
+        metrics = _metrics.setdefault(site, {})
+        failures = _failures.setdefault(site, [])
+        for one in outcome.results:
+            counts = metrics.setdefault((today, doctype, one.rule.name, source), [0, 0, 0])
+            # a rule over the whole column or table fails without unexpected rows, count it once
+            failed = max(one.unexpected_count, int(not one.success))
+            counts[0] += max(one.element_count, failed)
+            counts[1] += failed
+            counts[2] += int(not one.success)
+            for index in one.unexpected_index:
+                document_name = index if names is None else names[index]
+                failures.append((doctype, document_name, one.rule.name, one.rule.which_gx, source))
+        pending = len(failures)
+
+    if pending >= FLUSH_SIZE:
+        flush_results()
+
+
+def flush_results():
+    """`after_request` / `after_job` hook, adds the buffer of the site to Redis"""
+    site = getattr(frappe.local, "site", None)
+    with _lock:
+        metrics = _metrics.pop(site, None)
+        failures = _failures.pop(site, None)
+    if not metrics and not failures:
+        return
+
+    pipeline = frappe.cache.pipeline()
+    metrics_key = frappe.cache.make_key(METRICS_KEY)
+    for key, counts in (metrics or {}).items():
+        for counter, count in zip(COUNTERS, counts, strict=True):
+            if count:
+                pipeline.hincrby(metrics_key, json.dumps([*key, counter], default=str), count)
+    if failures:
+        pipeline.rpush(
+            frappe.cache.make_key(FAILURES_KEY), *(json.dumps(row, default=str) for row in failures)
+        )
+    pipeline.execute()
+
+
+def drain_results():
+    """
+    Scheduler event, write what the workers added to Redis since the last drain
+
+    The keys are renamed before they are read, so flushes that come in meanwhile go to
+    fresh keys. A drain that failed halfway is resumed by the next one.
+    """
+    from redis import Redis
+    from redis.exceptions import ResponseError
+
+    cache = frappe.cache
+    for key in (METRICS_KEY, FAILURES_KEY):
+        key = cache.make_key(key)
+        draining = key + b":draining"
+        if not Redis.exists(cache, draining):
+            try:
+                Redis.rename(cache, key, draining)
+            except ResponseError:
+                # nothing was flushed since the last drain
+                pass
+
+    failures_key = cache.make_key(FAILURES_KEY) + b":draining"
+    while True:
+        rows = Redis.lrange(cache, failures_key, 0, DRAIN_SIZE - 1)
+        if not rows:
+            break
+        write_results([], [json.loads(row) for row in rows])
+        frappe.db.commit()
+        Redis.ltrim(cache, failures_key, len(rows), -1)
+
+    metrics_key = cache.make_key(METRICS_KEY) + b":draining"
+    metrics = {}
+    for field, count in Redis.hgetall(cache, metrics_key).items():
+        *key, counter = json.loads(field)
+        metrics.setdefault(tuple(key), [0, 0, 0])[COUNTERS.index(counter)] += int(count)
+    if metrics:
+        write_results([[*key, *counts] for key, counts in metrics.items()], [])
+        frappe.db.commit()
+    Redis.delete(cache, metrics_key)
+
+
+def write_results(metrics, failures):
+    """
+    Bulk insert failing rows and add up the daily rollups
+
+    :param
+        metrics: [date, doctype, data rule, source, evaluated, failed, failed runs] rows
+        failures: [doctype, document name, data rule, gx function, source] rows
+    """
+    timestamp = now()
+    user = frappe.session.user
+
+    if failures:
+        frappe.db.bulk_insert(
+            "Data Quality Failure",
+            fields=[
+                "name",
+                "creation",
+                "modified",
+                "owner",
+                "modified_by",
+                "which_doctype",
+                "document_name",
+                "data_rule",
+                "which_gx",
+                "source",
+            ],
+            values=[
+                (frappe.generate_hash(length=10), timestamp, timestamp, user, user, *failure)
+                for failure in failures
+            ],
+        )
+
+    table = frappe.qb.DocType("Data Quality Metric")
+    for date, doctype, data_rule, source, evaluated, failed, failed_runs in metrics:
+        # one row per day, doctype, rule and source, named after them so it can be upserted
+        name = hashlib.sha1(f"{date}|{doctype}|{data_rule}|{source}".encode()).hexdigest()[:16]
+        if not frappe.db.exists("Data Quality Metric", name):
+            frappe.db.savepoint("dataq_metric")
+            try:
+                frappe.get_doc(
+                    {
+                        "doctype": "Data Quality Metric",
+                        "name": name,
+                        "date": date,
+                        "which_doctype": doctype,
+                        "data_rule": data_rule,
+                        "source": source,
+                        "evaluated": evaluated,
+                        "failed": failed,
+                        "failed_runs": failed_runs,
+                    }
+                ).db_insert()
+                continue
+            except frappe.DuplicateEntryError:
+                # inserted by a concurrent flush, add to it instead
+                frappe.db.rollback(save_point="dataq_metric")
+        (
+            frappe.qb.update(table)
+            .set(table.evaluated, table.evaluated + evaluated)
+            .set(table.failed, table.failed + failed)
+            .set(table.failed_runs, table.failed_runs + failed_runs)
+            .set(table.modified, timestamp)
+            .where(table.name == name)
+        ).run()
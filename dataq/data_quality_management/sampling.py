@@ -0,0 +1,330 @@
+"""
+Statistical sampling for very large tables.
+
+Instead of evaluating every row, a sampled validation draws a random sample whose size
+follows from a target confidence and error margin (Cochran's formula for a proportion,
+with the finite population correction), evaluates the row-local rules over it and
+estimates the failure rate of each Data Rule with a Wilson score interval.
+
+With `stratify_by` the sample is drawn per value of a field, in proportion to its share of
+the rows but with at least `dataq_sample_min_per_stratum` rows per value, so rare values
+are represented. The estimate then weighs each stratum by its share of the rows.
+
+A rule is escalated, i.e. evaluated over every row, when the upper bound of its interval
+exceeds the failure rate it tolerates: `1 - mostly`, or `dataq_sample_threshold` for rules
+without `mostly`. Rules over the whole column or table, such as uniqueness or row counts,
+cannot be estimated from a sample and are always evaluated in full. Rules that are not
+escalated pass, the failures found in the sample are still reported.
+
+Tables are sampled in the database with a `RAND() < rate` filter, one scan without sort,
+slightly oversampled and trimmed to size.
+
+Settings (site config):
+    dataq_sample_confidence: default 0.95
+    dataq_sample_margin: half-width of the interval at a 50% failure rate, default 0.01
+    dataq_sample_threshold: tolerated failure rate of rules without `mostly`, default 0.01
+    dataq_sample_min_per_stratum: default 30
+    dataq_sample_min_rows: full scans of tables of at least this many rows are sampled,
+        default 1000000
+"""
+
+import math
+import random
+from statistics import NormalDist
+
+import frappe
+import numpy as np
+import pandas as pd
+from frappe.utils import cint, flt
+
+from .engine import NATIVE_EXPECTATIONS, RuleOutcome, ValidationOutcome, is_row_local
+
+
+class SampledOutcome(ValidationOutcome):
+    """ValidationOutcome of a sampled validation, with the estimated failure rate of each sampled rule"""
+
+    def __init__(self, results, estimates):
+        super().__init__(results)
+        # [{"data_rule", "which_gx", "sampled", "failed", "rate", "low", "high", "tolerance", "escalated"}]
+        self.estimates = estimates
+
+    def split(self):
+        """(outcome of the rules judged from the sample, outcome of the rules evaluated in full)"""
+        sampled = {one.data_rule for one in self.estimates if not one.escalated}
+        return (
+            ValidationOutcome([one for one in self.results if one.rule.name in sampled]),
+            ValidationOutcome([one for one in self.results if one.rule.name not in sampled]),
+        )
+
+
+def z_score(confidence):
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def sample_size(population, confidence=0.95, margin=0.01):
+    """Rows to sample from `population` rows to estimate a proportion within `margin`"""
+    z = z_score(confidence)
+    size = z * z * 0.25 / (margin * margin)
+    if population:
+        size = size / (1 + (size - 1) / population)
+    return min(population, math.ceil(size))
+
+
+def allocate(populations, size, minimum=30):
+    """{stratum: rows to sample}, proportional to the populations with a floor of `minimum`"""
+    total = sum(populations.values())
+    return {
+        key: min(population, max(minimum, round(size * population / total)))
+        for key, population in populations.items()
+    }
+
+
+def wilson_interval(failed, sampled, confidence=0.95):
+    """(low, high) Wilson score interval of a failure rate"""
+    if not sampled:
+        return 0.0, 1.0
+    z = z_score(confidence)
+    rate = failed / sampled
+    denominator = 1 + z * z / sampled
+    center = (rate + z * z / (2 * sampled)) / denominator
+    half = z * math.sqrt(rate * (1 - rate) / sampled + z * z / (4 * sampled * sampled)) / denominator
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def estimate_rate(strata, confidence=0.95):
+    """
+    Failure rate of a stratified sample and its interval
+
+    :param
+        strata: [(population, sampled, failed)] of each stratum, over the domain of the rule
+
+    :return
+        (rate, low, high)
+    """
+    strata = [(population, sampled, failed) for population, sampled, failed in strata if sampled]
+    total = sum(population for population, _, _ in strata)
+    if not total:
+        return 0.0, 0.0, 1.0
+    if len(strata) == 1:
+        _, sampled, failed = strata[0]
+        return (failed / sampled, *wilson_interval(failed, sampled, confidence))
+
+    rate = variance = 0.0
+    for population, sampled, failed in strata:
+        weight = population / total
+        share = failed / sampled
+        rate += weight * share
+        correction = max(0.0, 1 - sampled / population) if population else 0.0
+        variance += weight * weight * share * (1 - share) / sampled * correction
+    if all(sampled >= population for population, sampled, _ in strata):
+        return rate, rate, rate
+    # Wilson interval at the effective sample size of the stratified design
+    sampled = rate * (1 - rate) / variance if variance else sum(sampled for _, sampled, _ in strata)
+    return (rate, *wilson_interval(rate * sampled, sampled, confidence))
+
+
+def tolerance(rule):
+    """Failure rate a rule accepts before a sampled estimate escalates it"""
+    mostly = rule.args.get("mostly")
+    if mostly is not None:
+        return 1 - flt(mostly)
+    return flt(frappe.conf.get("dataq_sample_threshold", 0.01))
+
+
+def sample_frame(doctype, df, rules=None, confidence=None, margin=None, stratify_by=None):
+    """
+    Validate a DataFrame from a sample, escalating to the whole frame rule by rule
+
+    :return
+        SampledOutcome, `unexpected_index` holds index labels of `df`
+    """
+    from .api import validate_dataframe
+
+    if stratify_by and stratify_by in df:
+        keys = df[stratify_by].fillna("").astype(str).to_numpy()
+        populations = pd.Series(keys).value_counts(sort=False).to_dict()
+    else:
+        keys = None
+        populations = {None: len(df)}
+
+    def draw(allocation):
+        if keys is None:
+            positions = np.random.choice(len(df), allocation[None], replace=False)
+        else:
+            positions = np.concatenate(
+                [
+                    np.random.choice(np.flatnonzero(keys == key), size, replace=False)
+                    for key, size in allocation.items()
+                ]
+            )
+        strata = [None] * len(positions) if keys is None else keys[positions].tolist()
+        return df.iloc[positions].reset_index(drop=True), strata, df.index[positions]
+
+    return validate_sampled(
+        doctype,
+        rules,
+        populations,
+        draw,
+        lambda full: validate_dataframe(doctype, df, rules=full),
+        confidence,
+        margin,
+    )
+
+
+def sample_table(doctype, rules=None, confidence=None, margin=None, stratify_by=None, source=None):
+    """
+    Validate a doctype table from a sample drawn in the database, escalated rules are
+    evaluated through `pushdown.validate_table`
+
+    :param
+        source: record the outcome in the results store, sampled rules under "Sample" and
+            escalated ones under this source
+
+    :return
+        SampledOutcome, `unexpected_index` holds document names
+    """
+    from frappe.query_builder.functions import Count
+    from pypika.terms import Criterion, Function
+
+    from .plan import get_plan
+    from .pushdown import validate_table
+    from .results import record_outcome
+    from .scan import get_scan_fields
+
+    plan = get_plan(doctype)
+    table = frappe.qb.DocType(doctype)
+    if stratify_by:
+        populations = dict(
+            frappe.qb.from_(table)
+            .select(table[stratify_by], Count("*"))
+            .groupby(table[stratify_by])
+            .run()
+        )
+    else:
+        populations = {None: frappe.db.count(doctype)}
+
+    fields = get_scan_fields(doctype, plan)
+    if fields and stratify_by and stratify_by not in fields:
+        fields.append(stratify_by)
+
+    def draw(allocation):
+        rand = Function("RANDOM" if frappe.db.db_type == "postgres" else "RAND")
+        criteria = []
+        for key, size in allocation.items():
+            # oversampled by three standard deviations, so the trim rarely comes up short
+            criterion = rand < min(1.0, (size + 3 * math.sqrt(size) + 10) / populations[key])
+            if stratify_by:
+                column = table[stratify_by]
+                criterion = (column.isnull() if key is None else column == key) & criterion
+            criteria.append(criterion)
+        rows = (
+            frappe.qb.from_(table)
+            .select(*([table[field] for field in fields] if fields else [table.star]))
+            .where(Criterion.any(criteria))
+        ).run(as_dict=True)
+
+        by_stratum = {}
+        for row in rows:
+            by_stratum.setdefault(row.get(stratify_by) if stratify_by else None, []).append(row)
+        rows, strata = [], []
+        for key, group in by_stratum.items():
+            group = random.sample(group, min(len(group), allocation.get(key, 0)))
+            rows.extend(group)
+            strata.extend([key] * len(group))
+        frame = pd.DataFrame.from_records(rows)
+        return frame, strata, frame["name"] if len(frame) else []
+
+    outcome = validate_sampled(
+        doctype,
+        rules,
+        populations,
+        draw,
+        lambda full: validate_table(doctype, rules=full, source=source),
+        confidence,
+        margin,
+    )
+    if source:
+        # the escalated rules were recorded under `source` by `validate_table`
+        record_outcome(doctype, outcome.split()[0], "Sample")
+    return outcome
+
+
+def validate_sampled(doctype, rules, populations, draw, validate_full, confidence=None, margin=None):
+    """
+    Evaluate the row-local rules over a sample and the others, plus the escalated ones, in full
+
+    :param
+        populations: {stratum: rows}
+        draw: callable({stratum: rows to sample}) -> (frame, stratum of each row, label of each row)
+        validate_full: callable(rules) -> ValidationOutcome over every row
+    """
+    from .api import validate_dataframe
+    from .plan import get_plan
+
+    if rules is None:
+        rules = get_plan(doctype).rules
+    confidence = flt(confidence or frappe.conf.get("dataq_sample_confidence")) or 0.95
+    margin = flt(margin or frappe.conf.get("dataq_sample_margin")) or 0.01
+
+    population = sum(populations.values())
+    sampled_rules = [rule for rule in rules if is_row_local(rule)]
+    size = sample_size(population, confidence, margin)
+    if not sampled_rules or not population or size >= population:
+        return SampledOutcome(validate_full(rules).results if rules else [], [])
+
+    minimum = cint(frappe.conf.get("dataq_sample_min_per_stratum")) or 30
+    frame, strata, labels = draw(allocate(populations, size, minimum))
+    if not len(frame):
+        return SampledOutcome(validate_full(rules).results, [])
+    outcome = validate_dataframe(doctype, frame, rules=sampled_rules)
+
+    results, estimates = [], []
+    escalated = [rule for rule in rules if rule not in sampled_rules]
+    for one in outcome.results:
+        if one.exception is not None:
+            results.append(one)
+            continue
+        estimate = estimate_rule(one, frame, strata, populations, confidence)
+        estimates.append(estimate)
+        if estimate.escalated:
+            escalated.append(one.rule)
+        else:
+            results.append(
+                RuleOutcome(one.rule, [labels[i] for i in one.unexpected_index], one.element_count, success=True)
+            )
+    if escalated:
+        results.extend(validate_full(escalated).results)
+    return SampledOutcome(results, estimates)
+
+
+def estimate_rule(one, frame, strata, populations, confidence=0.95):
+    """Estimated failure rate of a rule from its RuleOutcome over the sample"""
+    rule = one.rule
+    strata = pd.Series(["" if key is None else key for key in strata], dtype=object)
+    populations = {("" if key is None else key): count for key, count in populations.items()}
+
+    rows = strata.value_counts()
+    if rule.column in frame and not NATIVE_EXPECTATIONS.get(rule.which_gx, (None, None, False))[2]:
+        domain = strata[frame[rule.column].notna().to_numpy()].value_counts()
+    else:
+        domain = rows
+    failed = strata.iloc[list(one.unexpected_index)].value_counts()
+
+    design = []
+    for key, count in rows.items():
+        sampled = int(domain.get(key, 0))
+        # rows of the stratum in the domain of the rule, estimated from the sample
+        design.append((populations.get(key, count) * sampled / count, sampled, int(failed.get(key, 0))))
+    rate, low, high = estimate_rate(design, confidence)
+    limit = tolerance(rule)
+    return frappe._dict(
+        data_rule=rule.name,
+        which_gx=rule.which_gx,
+        sampled=sum(sampled for _, sampled, _ in design),
+        failed=one.unexpected_count,
+        rate=rate,
+        low=low,
+        high=high,
+        tolerance=limit,
+        escalated=high > limit,
+    )
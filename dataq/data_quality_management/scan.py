@@ -0,0 +1,256 @@
+"""
+Background data-quality scans of existing rows.
+
+Save-time validation never sees rows written before a rule existed or written straight
+through `frappe.db`. The scheduler enqueues one scan per DocType with rules every hour.
+A scan reads the table in keyset-paginated chunks ordered by (`modified`, `name`),
+selecting only the columns the rules read, validates each chunk with the row-local rules
+of the compiled plan and records the outcome in the results store. A per-DocType
+watermark makes the next scan pick up only rows modified since, and scanning restarts
+from the beginning when the rules change.
+
+Rules over the whole column or table cannot be judged from the modified rows. The hourly
+scan checks the aggregate ones (row count, mean, min, ...) against the running column
+statistics, see `column_stats.py`, without reading the table. The others, such as
+uniqueness, are evaluated once a day against the whole table by `scan_whole_table`. A
+full scan evaluates what it can in the database, see `pushdown.py`, and on tables of at
+least `dataq_sample_min_rows` rows validates a sample, see `sampling.py`.
+
+Settings (site config):
+    dataq_scan_enabled: 0 to turn the scheduled scans off
+    dataq_scan_chunk_size: rows per chunk, default 2000
+    dataq_scan_sleep: seconds to pause between chunks, default 0.5
+    dataq_scan_max_rows: rows scanned per DocType and run, default 100000
+"""
+
+import json
+import time
+
+import frappe
+import pandas as pd
+from frappe.utils import cint, flt
+
+
+def run_scheduled_scans():
+    """Scheduler event, enqueue one scan per DocType that has rules"""
+    from .plan import get_doctypes_with_rules
+
+    if not cint(frappe.conf.get("dataq_scan_enabled", 1)):
+        return
+    for doctype in get_doctypes_with_rules():
+        frappe.enqueue(
+            "dataq.data_quality_management.scan.scan_doctype",
+            doctype=doctype,
+            queue="long",
+            job_id=f"dataq_scan::{frappe.local.site}::{doctype}",
+            deduplicate=True,
+        )
+
+
+def run_daily_table_checks():
+    """Scheduler event, enqueue one whole-table check per DocType that has such rules"""
+    from .plan import get_doctypes_with_rules, get_plan
+
+    if not cint(frappe.conf.get("dataq_scan_enabled", 1)):
+        return
+    for doctype in get_doctypes_with_rules():
+        if not get_table_rules(get_plan(doctype)):
+            continue
+        frappe.enqueue(
+            "dataq.data_quality_management.scan.scan_whole_table",
+            doctype=doctype,
+            queue="long",
+            job_id=f"dataq_table_checks::{frappe.local.site}::{doctype}",
+            deduplicate=True,
+        )
+
+
+def get_table_rules(plan):
+    """Rules over the whole column or table that the running statistics do not cover"""
+    from .column_stats import is_stats_rule
+    from .engine import is_row_local
+
+    if not plan:
+        return []
+    return [rule for rule in plan.rules if not is_row_local(rule) and not is_stats_rule(rule)]
+
+
+def scan_whole_table(doctype):
+    """
+    Evaluate the rules over the whole column or table, in the database where possible
+
+    :return
+        {"rules": rules evaluated, "failures": failing (row, rule) pairs}
+    """
+    from .plan import get_plan
+    from .pushdown import validate_table
+
+    rules = get_table_rules(get_plan(doctype))
+    if not rules:
+        return {"rules": 0, "failures": 0}
+    outcome = validate_table(doctype, rules=rules, source="Scan")
+    frappe.db.commit()
+    return {
+        "rules": len(rules),
+        "failures": sum(max(one.unexpected_count, int(not one.success)) for one in outcome.results),
+    }
+
+
+def scan_doctype(doctype, full=False, sample=None, stratify_by=None):
+    """
+    Validate the rows of a doctype modified since the last scan
+
+    :param
+        full: ignore the watermark and scan the whole table
+        sample: with `full`, validate a sample and escalate to the whole table only the
+            rules whose estimated failure rate crosses their threshold. By default tables
+            of at least `dataq_sample_min_rows` rows are sampled
+        stratify_by: field to stratify the sample by
+
+    :return
+        {"rows": rows scanned, "failures": failing (row, rule) pairs}, plus the
+        "estimates" of the sampled rules when sampled
+    """
+    from .api import validate_dataframe
+    from .column_stats import check_stats, is_stats_rule
+    from .engine import is_row_local
+    from .plan import get_plan
+    from .results import record_outcome
+
+    plan = get_plan(doctype)
+    if not plan:
+        return {"rows": 0, "failures": 0}
+
+    chunk_size = cint(frappe.conf.get("dataq_scan_chunk_size")) or 2000
+    pause = flt(frappe.conf.get("dataq_scan_sleep", 0.5))
+    max_rows = cint(frappe.conf.get("dataq_scan_max_rows")) or 100000
+
+    if full and sample is None:
+        sample = frappe.db.estimate_count(doctype) >= (
+            cint(frappe.conf.get("dataq_sample_min_rows")) or 1000000
+        )
+    if full and sample:
+        return scan_sample(doctype, stratify_by)
+    if full and cint(frappe.conf.get("dataq_pushdown", 1)):
+        return scan_table(doctype, plan)
+
+    watermark = None if full else get_watermark(doctype, plan.version)
+    fields = get_scan_fields(doctype, plan)
+    scanned = failures = 0
+    # a chunk only holds the modified rows, aggregates are read from the running statistics
+    # and the other rules over the whole column or table are left to `scan_whole_table`
+    row_local = [rule for rule in plan.rules if is_row_local(rule)]
+    aggregates = [rule for rule in plan.rules if not is_row_local(rule) and is_stats_rule(rule)]
+
+    while scanned < max_rows:
+        rows = fetch_chunk(doctype, fields, watermark, chunk_size)
+        if not rows:
+            break
+
+        df = pd.DataFrame.from_records(rows)
+        df.index = df["name"]
+        failures_by_row = {}
+        if row_local:
+            failures_by_row = validate_dataframe(doctype, df, source="Scan", rules=row_local).failures_by_row()
+
+        watermark = (str(rows[-1]["modified"]), rows[-1]["name"])
+        set_watermark(doctype, plan.version, watermark)
+        # commit per chunk: short transactions, and the watermark survives a failed job
+        frappe.db.commit()
+
+        scanned += len(rows)
+        failures += sum(map(len, failures_by_row.values()))
+        if len(rows) < chunk_size:
+            break
+        time.sleep(pause)
+
+    if aggregates and scanned:
+        outcome = check_stats(doctype, aggregates)
+        record_outcome(doctype, outcome, "Scan")
+        failures += sum(int(not one.success) for one in outcome.results)
+
+    return {"rows": scanned, "failures": failures}
+
+
+def scan_table(doctype, plan):
+    """Full scan through the SQL pushdown engine, the watermark moves to the newest row"""
+    from .pushdown import validate_table
+
+    table = frappe.qb.DocType(doctype)
+    newest = (
+        frappe.qb.from_(table)
+        .select(table.modified, table.name)
+        .orderby(table.modified, order=frappe.qb.desc)
+        .orderby(table.name, order=frappe.qb.desc)
+        .limit(1)
+    ).run(as_dict=True)
+    outcome = validate_table(doctype, source="Scan")
+    if newest:
+        set_watermark(doctype, plan.version, (str(newest[0].modified), newest[0].name))
+        frappe.db.commit()
+
+    rows = max((one.element_count for one in outcome.results), default=0)
+    return {"rows": rows, "failures": sum(one.unexpected_count for one in outcome.results)}
+
+
+def scan_sample(doctype, stratify_by=None):
+    """Sampled full scan, the watermark stays where it is as most rows are not read"""
+    from .sampling import sample_table
+
+    outcome = sample_table(doctype, stratify_by=stratify_by, source="Scan")
+    frappe.db.commit()
+    for one in outcome.estimates:
+        frappe.logger("dataq").info(
+            f"{doctype} {one.data_rule}: failure rate {one.rate:.4%} "
+            f"[{one.low:.4%}, {one.high:.4%}] from {one.sampled} rows"
+            + (", escalated to a full check" if one.escalated else "")
+        )
+    return {
+        "rows": max((one.sampled for one in outcome.estimates), default=0),
+        "failures": sum(one.unexpected_count for one in outcome.results),
+        "estimates": outcome.estimates,
+    }
+
+
+def get_scan_fields(doctype, plan):
+    """Table columns to read: the ones the rules read, or all of them for table-level rules"""
+    if plan.needs_all_columns:
+        return None
+    table_columns = set(frappe.db.get_table_columns(doctype))
+    return list(dict.fromkeys(["name", "modified", *(c for c in plan.columns if c in table_columns)]))
+
+
+def fetch_chunk(doctype, fields, watermark, chunk_size):
+    """Next chunk after the (modified, name) watermark, in keyset order"""
+    table = frappe.qb.DocType(doctype)
+    query = (
+        frappe.qb.from_(table)
+        .select(*([table[field] for field in fields] if fields else [table.star]))
+        .orderby(table.modified)
+        .orderby(table.name)
+        .limit(chunk_size)
+    )
+    if watermark:
+        modified, name = watermark
+        query = query.where(
+            (table.modified > modified) | ((table.modified == modified) & (table.name > name))
+        )
+    return query.run(as_dict=True)
+
+
+def get_watermark(doctype, version):
+    """(modified, name) of the last scanned row, None when the rules changed since"""
+    value = frappe.db.get_global(f"dataq_scan_watermark::{doctype}")
+    if not value:
+        return None
+    value = json.loads(value)
+    if value.get("version") != version:
+        return None
+    return tuple(value["watermark"])
+
+
+def set_watermark(doctype, version, watermark):
+    frappe.db.set_global(
+        f"dataq_scan_watermark::{doctype}",
+        json.dumps({"version": version, "watermark": watermark}),
+    )
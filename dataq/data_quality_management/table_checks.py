@@ -0,0 +1,147 @@
+"""
+Save-time evaluation of table-scoped expectations.
+
+A document validated on save is a one-row frame, on which uniqueness passes trivially.
+Table-scoped rules are evaluated against the stored rows instead, with one existence
+probe per rule and document:
+
+- uniqueness (`ExpectColumnValuesToBeUnique`, `ExpectCompoundColumnsToBeUnique`): is
+  there another row with the same value(s)?
+- foreign-key-style membership (`ExpectColumnValuesToBeInSet` with a `value_set_source`
+  arg such as "Customer" or "Customer.customer_name" instead of a literal `value_set`):
+  is there a row of the source DocType with this value?
+
+A uniqueness probe is only run when the probed column has a database index, which is
+looked up once per worker and DocType meta version, so a save never scans a table. Rules
+on unindexed columns are logged and left to the scans, unless `"dataq_probe_unindexed": 1`
+is set in site config. Membership is looked up in the cached member set of the source,
+see `membership.py`, whether or not the source field is indexed.
+
+Aggregate rules (row count, mean, min, median, distinct count, ...) are table-scoped too,
+they are checked against the running column statistics instead, see `column_stats.py`.
+"""
+
+import frappe
+from frappe.utils import cint
+
+from .engine import RuleOutcome, ValidationOutcome
+
+UNIQUE_EXPECTATIONS = {"ExpectColumnValuesToBeUnique", "ExpectCompoundColumnsToBeUnique"}
+
+# {(site, doctype, column): (meta modified, whether the column leads an index)}
+_indexed = {}
+
+# {(site, data rule)} already reported as unindexed by this worker
+_warned = set()
+
+
+def parse_source(source):
+    """(doctype, fieldname) of a source written as "DocType.fieldname", or "DocType" for its names"""
+    doctype, _, fieldname = source.partition(".")
+    return doctype.strip(), (fieldname.strip() or "name")
+
+
+def is_table_scoped(rule):
+    from .column_stats import is_stats_rule
+
+    return rule.which_gx in UNIQUE_EXPECTATIONS or rule.source is not None or is_stats_rule(rule)
+
+
+def probe_columns(rule):
+    """(doctype, columns) the probe of a rule reads"""
+    if rule.source:
+        return rule.source[0], [rule.source[1]]
+    return None, rule.columns
+
+
+def has_column_index(doctype, column):
+    """Whether an index of the doctype table starts with `column`"""
+    if column == "name":
+        return True
+    modified = frappe.get_meta(doctype).modified
+    key = (frappe.local.site, doctype, column)
+    cached = _indexed.get(key)
+    if cached is None or cached[0] != modified:
+        table = f"tab{doctype}"
+        if frappe.db.db_type == "postgres":
+            found = frappe.db.sql(
+                """select 1 from pg_index i
+                join pg_attribute a on a.attrelid = i.indrelid and a.attnum = i.indkey[0]
+                where i.indrelid = %s::regclass and a.attname = %s limit 1""",
+                (f'"{table}"', column),
+            )
+        else:
+            found = frappe.db.sql(
+                f"show index from `{table}` where Column_name = %s and Seq_in_index = 1", column
+            )
+        cached = (modified, bool(found))
+        _indexed[key] = cached
+    return cached[1]
+
+
+def can_probe(doctype, rule):
+    """Whether a table-scoped rule can be checked with an indexed probe on save"""
+    source_doctype, columns = probe_columns(rule)
+    target = source_doctype or doctype
+    if not columns:
+        return False
+    if rule.source:
+        # looked up in the cached member set, the source table is not probed per save
+        return True
+    if has_column_index(target, columns[0]) or cint(frappe.conf.get("dataq_probe_unindexed")):
+        return True
+    key = (frappe.local.site, rule.name)
+    if key not in _warned:
+        _warned.add(key)
+        frappe.logger("dataq").warning(
+            f"Data Rule {rule.name} is not checked on save: {target}.{columns[0]} has no index"
+        )
+    return False
+
+
+def probe_rules(doctype, rules, records):
+    """
+    Evaluate table-scoped rules for documents about to be saved
+
+    :return
+        ValidationOutcome, `unexpected_index` holds the positions of the failing records
+    """
+    from .column_stats import check_projected, is_stats_rule
+
+    aggregates = [rule for rule in rules if is_stats_rule(rule)]
+    results = check_projected(doctype, aggregates, records).results if aggregates else []
+    for rule in rules:
+        if rule in aggregates:
+            continue
+        if not can_probe(doctype, rule):
+            results.append(RuleOutcome(rule, success=True))
+            continue
+        unexpected = []
+        element_count = 0
+        for i, record in enumerate(records):
+            values = [record.get(column) for column in rule.columns]
+            if any(value is None or value == "" for value in values):
+                # outside the domain of the expectation, like nulls in a frame
+                continue
+            element_count += 1
+            if rule.source:
+                passed = is_member(*rule.source, values[0])
+            else:
+                passed = not duplicate_exists(doctype, rule.columns, values, record.get("name"))
+            if not passed:
+                unexpected.append(i)
+        results.append(RuleOutcome(rule, unexpected, element_count))
+    return ValidationOutcome(results)
+
+
+def duplicate_exists(doctype, columns, values, name=None):
+    filters = dict(zip(columns, values, strict=True))
+    if name:
+        filters["name"] = ("!=", name)
+    return bool(frappe.db.exists(doctype, filters))
+
+
+def is_member(source_doctype, fieldname, value):
+    from .membership import get_member_set
+
+    return value in get_member_set(source_doctype, fieldname)
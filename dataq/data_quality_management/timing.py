@@ -0,0 +1,156 @@
+"""
+Timing instrumentation of save-time and batch validation.
+
+Each stage of `doctype_validate` / `gx_validate` (plan lookup, permission check, frame
+construction, rule evaluation, result recording) and each Data Rule evaluated by the
+native engine is timed into a histogram per DocType. Histograms are log-bucketed, every
+bucket 10% wider than the one below it starting from one microsecond, so a sample is a
+single counter increment and percentiles are exact to within 10%. Counters accumulate in
+the process and are added to a Redis hash at the end of each request or job, where
+`get_timings` reads the p50 / p95 / p99 of every stage and rule.
+
+GX evaluates a suite in one call, so GX plans are timed per stage only.
+
+Switch on with `"dataq_timing": 1` in site config. When off, `timed` hands back a shared
+no-op context manager after one config lookup.
+"""
+
+import math
+import threading
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+import frappe
+
+TIMING_KEY = "dataq:timing"
+
+_FIRST_BOUND = 1e-6
+_GROWTH = 1.1
+_LOG_GROWTH = math.log(_GROWTH)
+
+_off = nullcontext()
+
+_lock = threading.Lock()
+
+# {site: {(doctype, kind, name, bucket): count}}
+_samples = {}
+
+
+def is_enabled():
+    return bool(frappe.conf.get("dataq_timing"))
+
+
+def timed(doctype, stage):
+    """Context manager timing one stage of a validation of `doctype`"""
+    if not is_enabled():
+        return _off
+    return _timer(doctype, "stage", stage)
+
+
+@contextmanager
+def _timer(doctype, kind, name):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        observe(doctype, kind, name, perf_counter() - start)
+
+
+def bucket_of(seconds):
+    if seconds <= _FIRST_BOUND:
+        return 0
+    return math.ceil(math.log(seconds / _FIRST_BOUND) / _LOG_GROWTH)
+
+
+def bucket_bound(bucket):
+    """Upper bound of a bucket in seconds"""
+    return _FIRST_BOUND * _GROWTH**bucket
+
+
+def observe(doctype, kind, name, seconds):
+    key = (doctype, kind, name, bucket_of(seconds))
+    with _lock:
+        samples = _samples.setdefault(frappe.local.site, {})
+        samples[key] = samples.get(key, 0) + 1
+
+
+def observe_rules(doctype, outcome):
+    """Record the evaluation time of every rule of a ValidationOutcome that was timed"""
+    if not is_enabled():
+        return
+    for one in outcome.results:
+        if one.duration is not None:
+            observe(doctype, "rule", one.rule.name, one.duration)
+
+
+def flush_timings():
+    """`after_request` / `after_job` hook, adds the counters of the site to Redis"""
+    site = getattr(frappe.local, "site", None)
+    with _lock:
+        samples = _samples.pop(site, None)
+    if not samples:
+        return
+
+    key = frappe.cache.make_key(TIMING_KEY)
+    pipeline = frappe.cache.pipeline()
+    for (doctype, kind, name, bucket), count in samples.items():
+        pipeline.hincrby(key, f"{doctype}|{kind}|{name}|{bucket}", count)
+    pipeline.execute()
+
+
+def get_histograms(doctype=None):
+    """{(doctype, kind, name): {bucket: count}} as stored in Redis"""
+    from redis import Redis
+
+    # the counters are plain integers, not the pickled values `frappe.cache.hgetall` expects
+    raw = Redis.hgetall(frappe.cache, frappe.cache.make_key(TIMING_KEY))
+    histograms = {}
+    for field, count in raw.items():
+        field_doctype, kind, rest = frappe.safe_decode(field).split("|", 2)
+        if doctype and field_doctype != doctype:
+            continue
+        name, bucket = rest.rsplit("|", 1)
+        histogram = histograms.setdefault((field_doctype, kind, name), {})
+        histogram[int(bucket)] = int(count)
+    return histograms
+
+
+def percentile(histogram, total, q):
+    """Upper bound in seconds of the bucket holding the `q` quantile"""
+    rank = q * total
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= rank:
+            return bucket_bound(bucket)
+    return bucket_bound(max(histogram))
+
+
+def get_timings(doctype=None):
+    """
+    Call counts and percentiles of every stage and rule
+
+    :return
+        [{"doctype", "kind", "name", "calls", "p50", "p95", "p99"}], times in milliseconds,
+        slowest p95 first
+    """
+    timings = []
+    for (field_doctype, kind, name), histogram in get_histograms(doctype).items():
+        calls = sum(histogram.values())
+        timings.append(
+            frappe._dict(
+                doctype=field_doctype,
+                kind=kind,
+                name=name,
+                calls=calls,
+                **{
+                    f"p{int(q * 100)}": round(percentile(histogram, calls, q) * 1000, 3)
+                    for q in (0.5, 0.95, 0.99)
+                },
+            )
+        )
+    return sorted(timings, key=lambda row: row.p95, reverse=True)
+
+
+def reset_timings():
+    frappe.cache.delete_value(TIMING_KEY)
@@ -0,0 +1,61 @@
+"""
+Worker warm-up.
+
+Runs once per site in every gunicorn worker, through the `before_request` hook, so the
+GX import and rule compilation are paid by the first request a worker serves after a
+start or recycle, whatever it is, rather than by the first save. The spike is moved, not
+removed. Turn it off with `"dataq_warmup": 0` in site config.
+
+RQ workers are not warmed up: the default worker forks a fresh process for every job, so
+a warm-up would be lost after each job and every job, dataq or not, would pay for it.
+"""
+
+import time
+
+import frappe
+
+_warmed_sites = set()
+
+
+def warm_up_worker():
+    """`before_request` hook"""
+    if frappe.local.site in _warmed_sites or not frappe.conf.get("dataq_warmup", True):
+        return
+    _warmed_sites.add(frappe.local.site)
+    try:
+        warm_up()
+    except Exception:
+        # warm-up is an optimization, never fail the request or job because of it
+        frappe.log_error(title="dataq warm-up failed")
+
+
+def warm_up():
+    """
+    Compile the plans of the DocTypes that have rules and, only when one of them needs
+    GX, import great_expectations and register its suites.
+
+    :return
+        warm-up report, also written to the "dataq" logger
+    """
+    from .gx_runtime import get_validation_definition, import_gx
+    from .plan import get_doctypes_with_rules, get_plan
+
+    start = time.perf_counter()
+
+    plans = [get_plan(doctype) for doctype in get_doctypes_with_rules()]
+    gx_plans = [plan for plan in plans if plan and plan.engine == "gx"]
+    if gx_plans:
+        import_gx()
+        for plan in gx_plans:
+            get_validation_definition(plan)
+            # the suite of the rules that block a save, see `deferred.py`
+            get_validation_definition(plan, plan.blocking_rules)
+
+    report = {
+        "site": frappe.local.site,
+        "doctypes": len(plans),
+        "gx_imported": bool(gx_plans),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    frappe.logger("dataq").info(f"warm-up: {report}")
+    return report
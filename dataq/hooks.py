@@ -138,9 +138,71 @@ app_license = "mit"
 # Hook on document methods and events
 
 doc_events = {
-    "*": {"before_save": "dataq.data_quality_management.api.doctype_validate"}
+    "*": {
+        "before_save": "dataq.data_quality_management.api.doctype_validate",
+        "on_update": [
+            "dataq.data_quality_management.membership.on_source_change",
+            "dataq.data_quality_management.column_stats.on_change",
+        ],
+        "after_rename": "dataq.data_quality_management.membership.on_source_change",
+        "on_trash": [
+            "dataq.data_quality_management.membership.on_source_change",
+            "dataq.data_quality_management.column_stats.on_change",
+        ],
+    },
+    "Data Rules": {
+        "on_update": "dataq.data_quality_management.plan.invalidate_plans",
+        "after_rename": "dataq.data_quality_management.plan.invalidate_plans",
+        "on_trash": "dataq.data_quality_management.plan.invalidate_plans",
+    },
+    "Data Rules Args": {
+        "on_update": "dataq.data_quality_management.plan.invalidate_plans",
+        "on_trash": "dataq.data_quality_management.plan.invalidate_plans",
+    },
+    "GX Function": {
+        "on_update": "dataq.data_quality_management.plan.invalidate_plans",
+        "after_rename": "dataq.data_quality_management.plan.invalidate_plans",
+        "on_trash": "dataq.data_quality_management.plan.invalidate_plans",
+    },
+    "Translation": {
+        "on_update": [
+            "dataq.util.clear_doctype_label_index",
+            "dataq.data_quality_management.columns.clear_column_maps",
+        ],
+        "on_trash": [
+            "dataq.util.clear_doctype_label_index",
+            "dataq.data_quality_management.columns.clear_column_maps",
+        ],
+    },
+    "DocType": {
+        "on_update": [
+            "dataq.util.clear_doctype_label_index",
+            "dataq.data_quality_management.columns.clear_column_maps",
+        ],
+        "after_rename": [
+            "dataq.util.clear_doctype_label_index",
+            "dataq.data_quality_management.columns.clear_column_maps",
+        ],
+        "on_trash": [
+            "dataq.util.clear_doctype_label_index",
+            "dataq.data_quality_management.columns.clear_column_maps",
+        ],
+    },
+    "Custom Field": {
+        "on_update": "dataq.data_quality_management.columns.clear_column_maps",
+        "on_trash": "dataq.data_quality_management.columns.clear_column_maps",
+    },
+    "Property Setter": {
+        "on_update": "dataq.data_quality_management.columns.clear_column_maps",
+        "on_trash": "dataq.data_quality_management.columns.clear_column_maps",
+    },
 }
 
+clear_cache = [
+    "dataq.util.clear_doctype_label_index",
+    "dataq.data_quality_management.columns.clear_column_maps",
+]
+
 # doc_events = {
 # 	"*": {
 # 		"on_update": "method",
@@ -152,6 +214,18 @@ doc_events = {
 # Scheduled Tasks
 # ---------------
 
+scheduler_events = {
+    "all": [
+        "dataq.data_quality_management.deferred.enqueue_deferred_validations",
+        "dataq.data_quality_management.results.drain_results",
+    ],
+    "hourly": ["dataq.data_quality_management.scan.run_scheduled_scans"],
+    "daily_long": [
+        "dataq.data_quality_management.column_stats.reconcile_column_stats",
+        "dataq.data_quality_management.scan.run_daily_table_checks",
+    ],
+}
+
 # scheduler_events = {
 # 	"all": [
 # 		"dataq.tasks.all"
@@ -200,13 +274,18 @@ doc_events = {
 
 # Request Events
 # ----------------
-# before_request = ["dataq.utils.before_request"]
-# after_request = ["dataq.utils.after_request"]
+before_request = ["dataq.data_quality_management.warmup.warm_up_worker"]
+after_request = [
+    "dataq.data_quality_management.results.flush_results",
+    "dataq.data_quality_management.timing.flush_timings",
+]
 
 # Job Events
 # ----------
-# before_job = ["dataq.utils.before_job"]
-# after_job = ["dataq.utils.after_job"]
+after_job = [
+    "dataq.data_quality_management.results.flush_results",
+    "dataq.data_quality_management.timing.flush_timings",
+]
 
 # User Data Protection
 # --------------------
@@ -242,6 +321,6 @@ doc_events = {
 # Automatically update python controller files with type annotations for this app.
 # export_python_type_annotations = True
 
-# default_log_clearing_doctypes = {
-# 	"Logging DocType Name": 30  # days to retain logs
-# }
+default_log_clearing_doctypes = {
+    "Data Quality Failure": 30  # days to retain raw failures, the daily metrics are kept
+}
@@ -184,23 +184,15 @@ def update_cache_for_get(func):
                     )
                 )
             else:
-                user = kwargs.get("user", None)
-                ttl = kwargs.get("ttl", None)
-                shared = kwargs.get("shared", False)
-                func_call_key_cache = {}
-                if frappe.cache.exists(func_call_key, user=user, shared=shared):
-                    func_call_key_cache = frappe.cache.get_value(
-                        func_call_key, user=user, shared=shared
-                    )
-                else:
-                    func_call_key_cache = func(*args, **kwargs)
-                func_call_key_cache[validate_args["key"]] = ret
-                frappe.cache.set_value(
+                # the cached dict is shared with the in-process tier, so updating it in place
+                # and writing it back once is enough
+                value[validate_args["key"]] = ret
+                func.set_cache(
                     func_call_key,
-                    func_call_key_cache,
-                    expires_in_sec=ttl,
-                    user=user,
-                    shared=shared,
+                    value,
+                    ttl=kwargs.get("ttl", None),
+                    user=kwargs.get("user", None),
+                    shared=kwargs.get("shared", False),
                 )
 
         return ret
@@ -208,42 +200,159 @@ def update_cache_for_get(func):
     return wrapper
 
 
-def redis_cache_with_key(flag=""):
-    """Decorator to cache method calls and its return values in Redis
+class LocalTTLCache:
+    """Bounded, thread-safe in-process LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize=128, ttl=60):
+        from collections import OrderedDict
+        from threading import Lock
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        """:return (hit, value)"""
+        from time import monotonic
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] < monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, entry[1]
+
+    def set(self, key, value, ttl=None):
+        from time import monotonic
+
+        ttl = min(ttl or self.ttl, self.ttl)
+        with self._lock:
+            self._data[key] = (monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def redis_cache_with_key(flag="", maxsize=128, local_ttl=60, lock_timeout=30):
+    """Decorator to cache method calls and its return values in a per-process LRU in front of Redis
+
+    Entries are keyed by a version stored in Redis, so `clear_cache` reaches the in-process
+    tier of every worker. Reading that version costs one Redis GET per request, memoized by
+    frappe for the rest of it. On top of it, a hit in the process costs nothing more and a
+    hit in Redis a single GET. On a miss only one worker rebuilds the value, under a Redis
+    lock, while the others wait for it. `cache_info()` returns the hit / miss / rebuild
+    counters.
 
     :param
         key: Different caches in the same cache class can be distinguished by setting the key.
         ttl: The expiration time of redis cache, which does not expire by default
         user: `true` should cache be specific to session user.
                 shared: `true` should cache be shared across sites
+        maxsize: number of entries kept in the process
+        local_ttl: seconds an entry is kept in the process
+        lock_timeout: seconds to wait for another worker rebuilding the same value
     """
+    import pickle
 
     def wrapper(func=None):
         func_key = f"{func.__module__}.{func.__qualname__}"
+        version_key = f"{func_key}.version"
+        local = LocalTTLCache(maxsize=maxsize, ttl=local_ttl)
+        stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "rebuilds": 0}
+
+        def get_version(shared=False):
+            # memoized by frappe for the rest of the request
+            version = frappe.cache.get_value(version_key, shared=shared)
+            if version is None:
+                version = frappe.generate_hash(length=8)
+                frappe.cache.set_value(version_key, version, shared=shared)
+            return version
+
+        def get_redis(func_call_key, user=None, shared=False):
+            raw = frappe.cache.get(frappe.cache.make_key(func_call_key, user=user, shared=shared))
+            if raw is None:
+                return False, None
+            return True, pickle.loads(raw)[0]
+
+        def set_cache(func_call_key, val, ttl=None, user=None, shared=False):
+            # wrapped in a tuple so a cached `None` is told apart from a miss
+            frappe.cache.set(
+                frappe.cache.make_key(func_call_key, user=user, shared=shared),
+                pickle.dumps((val,)),
+                ex=ttl,
+            )
+            local.set((func_call_key, user, shared), val, ttl=ttl)
 
         def clear_cache():
             frappe.cache.delete_keys(func_key)
+            local.clear()
+
+        def cache_info():
+            return {**stats, "local_size": len(local)}
 
         func.clear_cache = clear_cache
 
         @wraps(func)
         def redis_cache_wrapper(*args, **kwargs):
-            func_call_key = func_key + "." + kwargs.get(flag)
-            user = kwargs.get("user", None)
-            ttl = kwargs.get("ttl", None)
-            shared = kwargs.get("shared", False)
-            if frappe.cache.exists(func_call_key, user=user, shared=shared):
-                return (
-                    frappe.cache.get_value(func_call_key, user=user, shared=shared),
-                    func_call_key,
+            user = kwargs.pop("user", None)
+            ttl = kwargs.pop("ttl", None)
+            shared = kwargs.pop("shared", False)
+            func_call_key = f"{func_key}.{get_version(shared)}.{kwargs.get(flag)}"
+            local_key = (func_call_key, user, shared)
+
+            hit, val = local.get(local_key)
+            if hit:
+                stats["local_hits"] += 1
+                return val, func_call_key
+
+            hit, val = get_redis(func_call_key, user, shared)
+            if hit:
+                stats["redis_hits"] += 1
+                local.set(local_key, val, ttl=ttl)
+            else:
+                from redis.exceptions import LockError
+
+                stats["misses"] += 1
+                lock = frappe.cache.lock(
+                    frappe.cache.make_key(f"{func_call_key}.lock", user=user, shared=shared),
+                    timeout=lock_timeout,
+                    blocking_timeout=lock_timeout,
                 )
-            val = func(*args, **kwargs)
+                # when the rebuilding worker is too slow, rather build it ourselves than fail
+                acquired = lock.acquire()
+                try:
+                    # another worker may have rebuilt it while we waited
+                    hit, val = get_redis(func_call_key, user, shared)
+                    if hit:
+                        local.set(local_key, val, ttl=ttl)
+                    else:
+                        val = func(*args, **kwargs)
+                        stats["rebuilds"] += 1
+                        # writes both tiers
+                        set_cache(func_call_key, val, ttl=ttl, user=user, shared=shared)
+                finally:
+                    if acquired:
+                        try:
+                            lock.release()
+                        except LockError:
+                            pass
 
-            frappe.cache.set_value(
-                func_call_key, val, expires_in_sec=ttl, user=user, shared=shared
-            )
             return val, func_call_key
 
+        redis_cache_wrapper.clear_cache = clear_cache
+        redis_cache_wrapper.cache_info = cache_info
+        redis_cache_wrapper.set_cache = set_cache
         return redis_cache_wrapper
 
     return wrapper
@@ -270,31 +379,82 @@ def reverse_all_translation_to_dict(lang):
     return reverse_dict
 
 
+DOCTYPE_LABEL_INDEX_KEY = "dataq:doctype_label_index"
+
+
 def get_original_doc_name(
     doctype_name=None,
     app=None,
     get_func=get_func,
-    lang=(frappe.session.data.lang or "en"),
+    lang=None,
 ):
-    original_doc_name = frappe.db.exists("DocType", doctype_name)
+    """
+    Resolve a DocType name, or its translation in `lang`, to the DocType name
+
+    Looked up as a single field of the per-language label index, see `build_doctype_label_index`.
+    `get_func` is kept for positional callers and no longer used.
+    """
+    lang = lang or frappe.local.lang or "en"
+    key = f"{DOCTYPE_LABEL_INDEX_KEY}:{lang}"
+
+    original_doc_name = frappe.cache.hget(key, doctype_name)
     if original_doc_name:
         return original_doc_name
-    try:
-        get_all_translations(lang)[doctype_name]
-        original_doc_name = doctype_name
-    except KeyError as e:
-        original_doc_name = reverse_all_translation_to_dict(
-            lang=lang,
-            func=get_func,
-            args={"key": doctype_name, "app": app},
-            ttl=None,
-            user=None,
-            shared=False,
-        )
 
+    if not frappe.cache.hget(key, "__built__"):
+        build_doctype_label_index(lang)
+        original_doc_name = frappe.cache.hget(key, doctype_name)
+        if original_doc_name:
+            return original_doc_name
+
+    # get translation in db
+    original_doc_name = frappe.get_value(
+        "Translation",
+        {"translated_text": doctype_name, "language": lang},
+        "source_text",
+    )
+    if not original_doc_name:
+        frappe.throw(
+            _(
+                "Validation failed because the doctype could not be found. You should check your files or data, such as whether your file name is correct"
+            )
+        )
+    frappe.cache.hset(key, doctype_name, original_doc_name)
     return original_doc_name
 
 
+def build_doctype_label_index(lang):
+    """
+    Build the label -> DocType name index of a language in a Redis hash
+
+    It holds the DocType names themselves and their translations, not the whole translation
+    catalogue, and is rebuilt lazily after `clear_doctype_label_index`.
+    """
+    import pickle
+
+    from redis import Redis
+
+    translations = get_all_translations(lang)
+    index = {}
+    for name in frappe.get_all("DocType", pluck="name"):
+        index[name] = name
+        if translations.get(name):
+            index.setdefault(translations[name], name)
+    index["__built__"] = 1
+
+    key = frappe.cache.make_key(f"{DOCTYPE_LABEL_INDEX_KEY}:{lang}")
+    # one round trip, pickled like `frappe.cache.hset` does so `frappe.cache.hget` can read it
+    Redis.hset(frappe.cache, key, mapping={label: pickle.dumps(name) for label, name in index.items()})
+
+
+def clear_doctype_label_index(doc=None, method=None):
+    """Doc event of Translation and DocType, and `clear_cache` hook"""
+    if doc and doc.doctype == "Translation" and doc.language:
+        frappe.cache.delete_key(f"{DOCTYPE_LABEL_INDEX_KEY}:{doc.language}")
+    else:
+        frappe.cache.delete_keys(DOCTYPE_LABEL_INDEX_KEY)
+
+
 def __generate_request_cache_key(args: tuple, kwargs: dict):
     """Generate a key for the cache."""
     if not kwargs:
@@ -381,16 +541,18 @@ def get_app_name():
 def get_rules_cache(doctype, is_enabled=True):
     from collections import defaultdict
 
+    from .data_quality_management.coercion import coerce_arg
+
     data = frappe.get_list(
         "Data Rules",
-        fields=["name", "which_gx", "args.args_name", "args.args_value"],
+        fields=["name", "which_gx", "args.args_name", "args.args_type", "args.args_value"],
         filters={"which_doctype": doctype, "is_enabled": True},
     )
     rules = defaultdict(dict)
     for item in data:
-        args_value = convert_str_to_standard(item["args_value"])
-        if isinstance(args_value, str) and not args_value:
+        if item["args_value"] is None or item["args_value"] == "":
             continue
+        args_value = coerce_arg(item["args_value"], item["args_type"])
         rules[item["which_gx"]][item["args_name"]] = args_value
         rules[item["which_gx"]]["from"] = item["name"]
     # {'label':{'column': xxx, 'value':xxx, 'from': xxx}}
@@ -437,22 +599,175 @@ def import_excel_file_from_server_to_document(
         return data_import.start_import()
 
 
-def background_import(doctype, file_path):
+def background_import(doctype, file_path, chunk_size=1000):
+    """
+    Stream a server file into a doctype on the `long` queue.
+
+    Enqueuing the same file again resumes from the last committed chunk.
+    """
     frappe.enqueue(
-        "import_excel_from_server",
+        "dataq.util.stream_import_file_to_document",
         doctype=doctype,
         file_path=file_path,
+        chunk_size=chunk_size,
         queue="long",
         timeout=3000,
+        job_id=f"dataq_import::{doctype}::{file_path}",
+        deduplicate=True,
     )
 
 
+def stream_import_file_to_document(doctype, file_path, chunk_size=1000, validate=True):
+    """
+    Import a large Excel/CSV file that already exists on the server, chunk by chunk
+
+    Rows are read with a read-only Excel reader or a chunked CSV reader, so peak memory is
+    bound by `chunk_size`, not by the file size. Each chunk is validated as a frame, inserted
+    and committed together with a checkpoint, so a failed job resumes after the last
+    committed chunk.
+
+    :param
+        doctype: which doctype to import into, headers are labels or fieldnames of its fields
+        file_path: path or file url ("/files/...", "/private/files/...") of the file on the server
+        chunk_size: rows per chunk
+        validate: validate each chunk against the Data Rules, failing rows are skipped
+
+    :return
+        {"imported": number of inserted rows, "failed": number of skipped rows}
+    """
+    from contextlib import nullcontext
+
+    import pandas as pd
+
+    from .data_quality_management.api import prevalidated, validate_dataframe
+    from .data_quality_management.columns import get_column_map
+    from .data_quality_management.plan import get_plan
+
+    checkpoint = f"dataq_import_checkpoint::{doctype}::{file_path}"
+    done = frappe.utils.cint(frappe.db.get_global(checkpoint))
+    imported = failed = 0
+
+    column_map = get_column_map(doctype)
+    # deferred rules run after commit, the inserts queue them, see `doctype_validate`
+    plan = get_plan(doctype)
+    for headers, rows in iter_file_chunks(get_server_file_path(file_path), chunk_size, skip=done):
+        columns = [column_map.get(header, header) for header in headers]
+        df = pd.DataFrame.from_records(rows, columns=columns)
+        df.index += done
+
+        failures = {}
+        outcome = None
+        if validate:
+            outcome = validate_dataframe(
+                doctype, df, chunk_size=chunk_size, source="Import", rules=plan.blocking_rules
+            )
+            failures = outcome.failures_by_row()
+            df = df.drop(index=list(failures))
+
+        # without `validate` the Data Rules still run on save, row by row, and so do the
+        # rules that failed the chunk without naming rows
+        with prevalidated(doctype, outcome) if validate else nullcontext():
+            failures.update(insert_rows(doctype, df))
+
+        if failures:
+            frappe.log_error(
+                title=f"dataq import of {file_path}: rows skipped",
+                # the first row of the file is the header, rows are 1-based
+                message=frappe.as_json({index + 2: reason for index, reason in failures.items()}),
+            )
+
+        done += len(rows)
+        failed += len(failures)
+        imported += len(rows) - len(failures)
+        frappe.db.set_global(checkpoint, done)
+        frappe.db.commit()
+
+    frappe.defaults.clear_default(key=checkpoint, parent="__global")
+    frappe.db.commit()
+    return {"imported": imported, "failed": failed}
+
+
+def insert_rows(doctype, df):
+    """
+    Insert the rows of a DataFrame of fieldnames, each in its own savepoint
+
+    :return
+        {row index: error} of the rows that could not be inserted
+    """
+    errors = {}
+    for index, row in zip(df.index, df.astype(object).where(df.notna(), None).to_dict("records"), strict=True):
+        frappe.db.savepoint("dataq_import_row")
+        try:
+            frappe.get_doc({"doctype": doctype, **row}).insert()
+        except Exception as e:
+            frappe.db.rollback(save_point="dataq_import_row")
+            errors[index] = str(e)
+    return errors
+
+
+def iter_file_chunks(file_path, chunk_size, skip=0):
+    """
+    Read an Excel or CSV file in chunks of rows
+
+    :param
+        skip: number of data rows (after the header) already processed
+
+    :return
+        generator of (headers, list of row tuples)
+    """
+    import os
+
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".csv":
+        import pandas as pd
+
+        for chunk in pd.read_csv(
+            file_path, chunksize=chunk_size, skiprows=range(1, skip + 1), dtype=object
+        ):
+            yield chunk.columns.tolist(), list(chunk.itertuples(index=False, name=None))
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = list(next(rows, ()))
+        chunk = []
+        for position, row in enumerate(rows):
+            if position < skip:
+                continue
+            chunk.append(row[: len(headers)])
+            if len(chunk) >= chunk_size:
+                yield headers, chunk
+                chunk = []
+        if chunk:
+            yield headers, chunk
+    finally:
+        workbook.close()
+
+
+def get_server_file_path(file_path):
+    """Full path of a server file given as a path or as a public/private file url"""
+    import os
+
+    if os.path.exists(file_path):
+        return file_path
+    if file_path.startswith("/private/files/"):
+        return frappe.get_site_path("private", "files", file_path.split("/private/files/", 1)[1])
+    if file_path.startswith("/files/"):
+        return frappe.get_site_path("public", "files", file_path.split("/files/", 1)[1])
+    return file_path
+
+
 def import_from_dataframe_to_document(
     doctype,
     df,
     import_type="Insert New Records",
     submit_after_import=False,
     console=True,
+    validate=True,
+    chunk_size=None,
 ):
     """
     Import data to docytpe from Dataframe
@@ -461,7 +776,15 @@ def import_from_dataframe_to_document(
         doctype (str): dotype to import into
         df (pd.DataFrame): Dataframe data
         import_type (str): "Insert" or "Update"
+        validate (bool): validate the whole frame against the Data Rules before importing.
+            Failing rows are skipped and recorded in the Data Import Log, the passing rows
+            are only validated again on save against the rules that failed without naming
+            rows, e.g. on a missing column
+        chunk_size (int): validate in chunks of this many rows, the whole frame by default
     """
+    from .data_quality_management.api import prevalidated, validate_dataframe
+    from .data_quality_management.plan import get_plan
+
     data_import = frappe.new_doc("Data Import")
     data_import.reference_doctype = doctype
     data_import.import_type = import_type
@@ -470,6 +793,19 @@ def import_from_dataframe_to_document(
     data_import.insert()
     from frappe.core.doctype.data_import.importer import Importer
 
+    outcome = None
+    if validate:
+        # failures are logged by position, and labels may repeat
+        df = df.reset_index(drop=True)
+        # deferred rules run after commit, the inserts queue them, see `doctype_validate`
+        outcome = validate_dataframe(
+            doctype, df, chunk_size=chunk_size, source="Import", rules=get_plan(doctype).blocking_rules
+        )
+        failures = outcome.failures_by_row()
+        if failures:
+            log_validation_failures(data_import, list(failures), failures.values(), offset=len(df))
+            df = df.drop(index=list(failures))
+
     importer = Importer(doctype=doctype, file_path=None, data_import=data_import)
 
     headers = df.columns.tolist()
@@ -486,12 +822,53 @@ def import_from_dataframe_to_document(
         from frappe.core.doctype.data_import.importer import Importer
 
         # importer = Importer(data_import)
-        return importer.import_data()
+        if not validate:
+            return importer.import_data()
+        # rules that failed without naming rows still run on save
+        with prevalidated(doctype, outcome):
+            return importer.import_data()
     else:
         # use DataImport（like Web UI）
         return data_import.start_import()
 
 
+def log_validation_failures(data_import, positions, failed_rules, offset=0):
+    """
+    Record rows rejected by the Data Rules in the Data Import Log, like the Importer does for its own failures
+
+    :param
+        data_import: Data Import document
+        positions: 0-based positions of the failing rows in the imported frame
+        failed_rules: list of the failing Data Rules names of each row
+        offset: added to the `log_index` of the entries, the number of rows of the frame keeps
+            them clear of the Importer's own entries, numbered by position among the imported rows
+    """
+    import json
+
+    for position, rules in zip(positions, failed_rules, strict=True):
+        frappe.get_doc(
+            {
+                "doctype": "Data Import Log",
+                "data_import": data_import.name,
+                "log_index": offset + int(position),
+                "success": 0,
+                # the first row of an import file is the header, rows are 1-based
+                "row_indexes": json.dumps([int(position) + 2]),
+                "messages": json.dumps(
+                    [
+                        {
+                            "title": _("The following data rules did not pass"),
+                            "message": ", ".join(
+                                f"<a href='/app/data-rules/{rule}' target='_blank'>{rule}</a>"
+                                for rule in rules
+                            ),
+                        }
+                    ]
+                ),
+            }
+        ).db_insert()
+
+
 def get_extension(self):
     import os
 